@@ -0,0 +1,106 @@
+import os
+import shutil
+import socket
+import subprocess
+import time
+
+import pytest
+from web3 import Web3
+
+from dexsnake.utils.cassette import RpcCassette
+
+# The benchmarks run against a local anvil node that forks Ethereum mainnet at a fixed
+# block, so that the Uniswap contracts in the configs exist and the results are
+# reproducible. Set DEXSNAKE_FORK_URL to the URI of an archive node to run them.
+FORK_URL = os.getenv("DEXSNAKE_FORK_URL")
+FORK_BLOCK = int(os.getenv("DEXSNAKE_FORK_BLOCK", "19000000"))
+# If DEXSNAKE_CASSETTE is set, the responses of the node are recorded to that file, and
+# without DEXSNAKE_FORK_URL they are replayed from it, so that no node is needed
+CASSETTE = os.getenv("DEXSNAKE_CASSETTE")
+
+# A fixed swap deadline, because the default deadline is derived from the clock and
+# would change the requests, so that recorded swaps could not be replayed
+DEADLINE = 4102444800  # 2100-01-01
+
+# The first default anvil account
+ACCOUNT = "0xf39Fd6e51aad88F6F4ce6aB8827279cffFb92266"
+PRIVATE_KEY = "0xac0974bec39a17e36ba4a6b4d238ff944bacb478cbed5efcae784d7bf4f2ff80"
+
+WETH = "0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2"
+USDC = "0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48"
+WETH_USDC_V2 = "0xB4e16d0168e52d35CaCD2c6185b44281Ec28C9Dc"
+WETH_USDC_V3 = "0x88e6A0c2dDD26FEEb64F039a2c41296FcB3f5640"  # 0.05% fee
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture(scope="session")
+def web3():
+    if FORK_URL is None and CASSETTE is not None and os.path.exists(CASSETTE):
+        yield RpcCassette(CASSETTE, mode="replay").install(Web3(Web3.HTTPProvider()))
+        return
+    if FORK_URL is None:
+        pytest.skip("DEXSNAKE_FORK_URL is not set")
+    if shutil.which("anvil") is None:
+        pytest.skip("anvil is not installed")
+    port = _free_port()
+    process = subprocess.Popen(
+        [
+            "anvil",
+            "--fork-url",
+            FORK_URL,
+            "--fork-block-number",
+            str(FORK_BLOCK),
+            "--port",
+            str(port),
+            "--silent",
+        ]
+    )
+    web3 = Web3(Web3.HTTPProvider(f"http://127.0.0.1:{port}"))
+    for _ in range(100):
+        if web3.is_connected():
+            break
+        time.sleep(0.1)
+    else:
+        process.kill()
+        pytest.fail("anvil did not start")
+    cassette = None
+    if CASSETTE is not None:
+        cassette = RpcCassette(CASSETTE, mode="record")
+        cassette.install(web3)
+    yield web3
+    if cassette is not None:
+        cassette.save()
+    process.terminate()
+    process.wait()
+
+
+@pytest.fixture(scope="session")
+def funded_account(web3):
+    # Wraps ETH into WETH by sending it to the WETH contract
+    tx = {
+        "from": ACCOUNT,
+        "to": WETH,
+        "value": Web3.to_wei(1000, "ether"),
+        "nonce": web3.eth.get_transaction_count(ACCOUNT),
+        "gas": 100000,
+        "gasPrice": web3.eth.gas_price,
+        "chainId": web3.eth.chain_id,
+    }
+    signed_tx = web3.eth.account.sign_transaction(tx, private_key=PRIVATE_KEY)
+    web3.eth.wait_for_transaction_receipt(
+        web3.eth.send_raw_transaction(signed_tx.rawTransaction)
+    )
+    return ACCOUNT, PRIVATE_KEY
+
+
+@pytest.fixture
+def snapshot(web3):
+    # Reverts the chain after each benchmark so that the runs do not affect each other
+    snapshot_id = web3.manager.request_blocking("evm_snapshot", [])
+    yield
+    web3.manager.request_blocking("evm_revert", [snapshot_id])
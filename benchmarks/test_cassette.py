@@ -0,0 +1,70 @@
+import pytest
+from web3 import Web3
+from web3.providers import BaseProvider
+
+from dexsnake.utils.cassette import RpcCassette
+
+TX = {
+    "from": "0xf39Fd6e51aad88F6F4ce6aB8827279cffFb92266",
+    "to": "0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2",
+    "data": "0x" + (4102444800).to_bytes(32, "big").hex(),
+}
+
+
+class _FakeNode(BaseProvider):
+    # Answers with a new block number on every request, like a node that mines blocks
+    def __init__(self):
+        super().__init__()
+        self.requests = 0
+
+    def make_request(self, method, params):
+        self.requests += 1
+        if method == "eth_blockNumber":
+            return {"jsonrpc": "2.0", "id": 0, "result": hex(100 + self.requests)}
+        if method == "eth_estimateGas":
+            return {"jsonrpc": "2.0", "id": 0, "result": hex(21000 + self.requests)}
+        if method == "eth_chainId":
+            return {"jsonrpc": "2.0", "id": 0, "result": "0x1"}
+        raise NotImplementedError(method)
+
+
+class _NoNode(BaseProvider):
+    def make_request(self, method, params):
+        raise AssertionError(f"{method} was sent to the node")
+
+
+def test_record_and_replay(tmp_path):
+    path = str(tmp_path / "node.json.gz")
+    with RpcCassette(path, mode="record") as cassette:
+        web3 = cassette.install(Web3(_FakeNode()))
+        block_numbers = [web3.eth.block_number for _ in range(3)]
+        gas = web3.eth.estimate_gas(TX)
+    web3 = RpcCassette(path, mode="replay").install(Web3(_NoNode()))
+    assert [web3.eth.block_number for _ in range(3)] == block_numbers
+    # Requests made more often than recorded receive the last response
+    assert web3.eth.block_number == block_numbers[-1]
+    assert web3.eth.estimate_gas(TX) == gas
+
+
+def test_replay_requires_identical_params(tmp_path):
+    path = str(tmp_path / "node.json.gz")
+    with RpcCassette(path, mode="record") as cassette:
+        cassette.install(Web3(_FakeNode())).eth.estimate_gas(TX)
+    web3 = RpcCassette(path, mode="replay").install(Web3(_NoNode()))
+    # E.g., a swap deadline derived from the clock changes the calldata
+    other = {**TX, "data": "0x" + (4102444801).to_bytes(32, "big").hex()}
+    with pytest.raises(ValueError, match="No recorded response"):
+        web3.eth.estimate_gas(other)
+
+
+def test_auto_records_only_missing_requests(tmp_path):
+    path = str(tmp_path / "node.json.gz")
+    node = _FakeNode()
+    with RpcCassette(path, mode="auto") as cassette:
+        web3 = cassette.install(Web3(node))
+        block_number = web3.eth.block_number
+    web3 = RpcCassette(path, mode="auto").install(Web3(node))
+    assert web3.eth.block_number == block_number
+    assert node.requests == 1
+    web3.eth.estimate_gas(TX)
+    assert node.requests > 1
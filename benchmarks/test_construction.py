@@ -0,0 +1,29 @@
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from conftest import USDC, WETH_USDC_V2, WETH_USDC_V3  # noqa: E402
+
+from dexsnake.uniswap_v2 import UniswapV2Pair, UniswapV2Router  # noqa: E402
+from dexsnake.uniswap_v3 import UniswapV3Pool, UniswapV3Router  # noqa: E402
+from dexsnake.utils import ERC20Token  # noqa: E402
+
+
+def test_erc20_token(benchmark, web3):
+    benchmark(ERC20Token, web3, USDC)
+
+
+def test_uniswap_v2_pair(benchmark, web3):
+    benchmark(UniswapV2Pair, web3, WETH_USDC_V2)
+
+
+def test_uniswap_v3_pool(benchmark, web3):
+    benchmark(UniswapV3Pool, web3, WETH_USDC_V3)
+
+
+def test_uniswap_v2_router(benchmark, web3):
+    benchmark(UniswapV2Router, web3)
+
+
+def test_uniswap_v3_router(benchmark, web3):
+    benchmark(UniswapV3Router, web3)
@@ -0,0 +1,154 @@
+import os
+import random
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+pytest.importorskip("numpy")
+
+import eth_abi  # noqa: E402
+import numpy as np  # noqa: E402
+from hexbytes import HexBytes  # noqa: E402
+from web3 import Web3  # noqa: E402
+from web3.datastructures import AttributeDict  # noqa: E402
+
+from dexsnake.state.events import EVENTS, decode_log, decode_logs  # noqa: E402
+from dexsnake.utils.abi import load_abi  # noqa: E402
+
+N_LOGS = 10000
+
+SWAP_V3_ABI = load_abi(
+    os.path.join(
+        os.path.dirname(__import__("dexsnake").__file__),
+        "uniswap_v3",
+        "abi",
+        "UniswapV3Pool.json",
+    )
+)
+
+
+@pytest.fixture(scope="module")
+def swap_logs():
+    # Synthetic Uniswap V3 Swap logs from a few pools, so no node is needed
+    rng = random.Random(0)
+    pools = [
+        Web3.to_checksum_address(f"0x{rng.getrandbits(160):040x}") for _ in range(10)
+    ]
+    logs = []
+    for i in range(N_LOGS):
+        data = eth_abi.encode(
+            ["int256", "int256", "uint160", "uint128", "int24"],
+            [
+                rng.randrange(-(10**24), 10**24),
+                rng.randrange(-(10**24), 10**24),
+                rng.getrandbits(160),
+                rng.getrandbits(128),
+                rng.randrange(-887272, 887272),
+            ],
+        )
+        logs.append(
+            AttributeDict(
+                {
+                    "address": pools[i % len(pools)],
+                    "topics": [
+                        HexBytes(EVENTS["UniswapV3Pool.Swap"].topic),
+                        HexBytes(rng.getrandbits(160).to_bytes(32, "big")),
+                        HexBytes(rng.getrandbits(160).to_bytes(32, "big")),
+                    ],
+                    "data": HexBytes(data),
+                    "blockNumber": 19000000 + i // 10,
+                    "logIndex": i % 10,
+                    "transactionHash": HexBytes(
+                        rng.getrandbits(256).to_bytes(32, "big")
+                    ),
+                    "transactionIndex": i % 10,
+                    "blockHash": HexBytes(rng.getrandbits(256).to_bytes(32, "big")),
+                    "removed": False,
+                }
+            )
+        )
+    return logs
+
+
+def test_web3_process_log(benchmark, swap_logs):
+    # The baseline is slow, so it is run only a few times
+    event = Web3().eth.contract(abi=SWAP_V3_ABI).events.Swap()
+    benchmark.pedantic(lambda: [event.process_log(log) for log in swap_logs], rounds=3)
+
+
+def test_decode_log(benchmark, swap_logs):
+    benchmark(lambda: [decode_log(log) for log in swap_logs])
+
+
+def test_decode_logs(benchmark, swap_logs):
+    benchmark(decode_logs, swap_logs)
+
+
+def _random_value(rng: random.Random, type_: str, i: int) -> object:
+    # The first logs use the extreme values of each type
+    if type_ == "address":
+        return Web3.to_checksum_address(f"0x{rng.getrandbits(160):040x}")
+    signed = type_.startswith("int")
+    bits = int(type_[3:] if signed else type_[4:])
+    low, high = (
+        (-(2 ** (bits - 1)), 2 ** (bits - 1) - 1) if signed else (0, 2**bits - 1)
+    )
+    extremes = [low, high, -1 if signed else 1, 0]
+    return extremes[i] if i < len(extremes) else rng.randint(low, high)
+
+
+@pytest.mark.parametrize("name", list(EVENTS))
+def test_decoding_matches_process_log(name):
+    # The fixed-offset layouts and the 64-bit columns must decode exactly like web3.py,
+    # including negative values
+    layout = EVENTS[name]
+    path, event_name = name.split(".")
+    package = os.path.dirname(__import__("dexsnake").__file__)
+    version = "uniswap_v2" if path.startswith("UniswapV2") else "uniswap_v3"
+    abi = load_abi(os.path.join(package, version, "abi", f"{path}.json"))
+    entry = next(e for e in abi if e["type"] == "event" and e["name"] == event_name)
+    event = Web3().eth.contract(abi=abi).events[event_name]()
+    rng = random.Random(name)
+    logs, expected = [], []
+    for i in range(200):
+        values = [_random_value(rng, field.type, i) for field in layout.fields]
+        topics = [HexBytes(layout.topic)] + [
+            HexBytes(eth_abi.encode([field.type], [value]))
+            for field, value in zip(layout.fields, values)
+            if field.indexed
+        ]
+        data = eth_abi.encode(
+            [field.type for field in layout.fields if not field.indexed],
+            [value for field, value in zip(layout.fields, values) if not field.indexed],
+        )
+        log = AttributeDict(
+            {
+                "address": Web3.to_checksum_address(f"0x{rng.getrandbits(160):040x}"),
+                "topics": topics,
+                "data": HexBytes(data),
+                "blockNumber": 19000000 + i,
+                "logIndex": i,
+                "transactionHash": HexBytes(rng.getrandbits(256).to_bytes(32, "big")),
+                "transactionIndex": 0,
+                "blockHash": HexBytes(rng.getrandbits(256).to_bytes(32, "big")),
+                "removed": False,
+            }
+        )
+        logs.append(log)
+        processed = event.process_log(log)["args"]
+        # Unnamed arguments are named by their position by ``decode_log``
+        expected.append(
+            {
+                field.name: processed[argument["name"]]
+                for field, argument in zip(layout.fields, entry["inputs"])
+            }
+        )
+    for log, args in zip(logs, expected):
+        assert decode_log(log) == (name, args)
+    arrays = decode_logs(logs)[name]
+    for field in layout.fields:
+        assert [
+            value.item() if isinstance(value, np.generic) else value
+            for value in arrays[field.name]
+        ] == [args[field.name] for args in expected]
+    assert arrays["index"].tolist() == list(range(len(logs)))
@@ -0,0 +1,28 @@
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+
+@pytest.mark.parametrize(
+    "statement",
+    [
+        "import web3",
+        "import dexsnake",
+        "from dexsnake.utils import ERC20Token",
+        "from dexsnake.uniswap_v2 import UniswapV2Pair",
+        "from dexsnake.uniswap_v3 import UniswapV3Router",
+        "from dexsnake.arbitrage import ArbitrageScanner",
+    ],
+)
+def test_cold_import(benchmark, statement):
+    # Each round starts a new interpreter, so the imports are never cached. Compare
+    # against "import web3" to see the time spent in Dexsnake itself.
+    benchmark.pedantic(
+        subprocess.run,
+        args=([sys.executable, "-c", statement],),
+        kwargs={"check": True},
+        rounds=5,
+    )
@@ -0,0 +1,110 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from web3 import Web3
+
+from dexsnake.utils.provider import LoadBalancedProvider
+
+
+class _StubNode:
+    # A local JSON-RPC server that answers every request with a fixed block number
+    # after ``delay`` seconds, or with HTTP 500 if ``fail`` is set
+    def __init__(self, block_number: int, delay: float = 0.0, fail: bool = False):
+        self.block_number = block_number
+        self.delay = delay
+        self.fail = fail
+        self.requests = 0
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                request = json.loads(
+                    self.rfile.read(int(self.headers["Content-Length"]))
+                )
+                node.requests += 1
+                time.sleep(node.delay)
+                if node.fail:
+                    self.send_response(500)
+                    self.end_headers()
+                    return
+                body = json.dumps(
+                    {"jsonrpc": "2.0", "id": request["id"], "result": hex(block_number)}
+                ).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.uri = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub_nodes():
+    nodes = []
+
+    def start(*args, **kwargs):
+        nodes.append(_StubNode(*args, **kwargs))
+        return nodes[-1]
+
+    yield start
+    for node in nodes:
+        node.close()
+
+
+def test_failover(stub_nodes):
+    failing, healthy = stub_nodes(1, fail=True), stub_nodes(2)
+    web3 = Web3(LoadBalancedProvider([failing.uri, healthy.uri], failure_threshold=1))
+    for _ in range(10):
+        assert web3.eth.block_number == 2
+    # The failing endpoint is taken out of use after its first failure
+    assert failing.requests <= 1
+
+
+def test_hedging(stub_nodes):
+    slow, fast = stub_nodes(1, delay=2.0), stub_nodes(2)
+    web3 = Web3(LoadBalancedProvider([slow.uri, fast.uri], hedge_after=0.05))
+    for _ in range(5):
+        start = time.monotonic()
+        assert web3.eth.block_number == 2
+        assert time.monotonic() - start < 1.0
+
+
+def test_hedging_single_endpoint_takes_no_token(stub_nodes):
+    node = stub_nodes(1, delay=0.2)
+    provider = LoadBalancedProvider([node.uri], rate_limit=1.0, hedge_after=0.05)
+    start = time.monotonic()
+    assert Web3(provider).eth.block_number == 1
+    # Hedging to the same endpoint would wait a second for a token
+    assert time.monotonic() - start < 0.8
+    assert node.requests == 1
+
+
+def test_rate_limit(stub_nodes):
+    node = stub_nodes(1)
+    web3 = Web3(LoadBalancedProvider([node.uri], rate_limit=10.0))
+    start = time.monotonic()
+    for _ in range(15):
+        web3.eth.block_number
+    # The first 10 requests are served from a full bucket and the rest at 10 per second
+    assert time.monotonic() - start >= 0.4
+
+
+def test_fractional_rate_limit(stub_nodes):
+    node = stub_nodes(1)
+    web3 = Web3(LoadBalancedProvider([node.uri], rate_limit=0.5))
+    start = time.monotonic()
+    assert web3.eth.block_number == 1
+    assert time.monotonic() - start < 1.0
@@ -0,0 +1,24 @@
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from dexsnake.uniswap_v2 import UniswapV2Factory, UniswapV2Pair  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def pair_addresses(web3):
+    factory = UniswapV2Factory(web3)
+    return [factory.contract.functions.allPairs(i).call() for i in range(100)]
+
+
+@pytest.mark.parametrize("n_pools", [1, 10, 100])
+def test_uniswap_v2_pairs_construct(benchmark, web3, pair_addresses, n_pools):
+    benchmark(
+        lambda: [UniswapV2Pair(web3, address) for address in pair_addresses[:n_pools]]
+    )
+
+
+@pytest.mark.parametrize("n_pools", [1, 10, 100])
+def test_uniswap_v2_pairs_sync(benchmark, web3, pair_addresses, n_pools):
+    pairs = [UniswapV2Pair(web3, address) for address in pair_addresses[:n_pools]]
+    benchmark(lambda: [pair.sync() for pair in pairs])
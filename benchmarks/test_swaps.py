@@ -0,0 +1,60 @@
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from conftest import DEADLINE, USDC, WETH  # noqa: E402
+
+from dexsnake.uniswap_v2 import UniswapV2Router  # noqa: E402
+from dexsnake.uniswap_v3 import UniswapV3Router  # noqa: E402
+from dexsnake.utils import ERC20Token  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def routers(web3, funded_account):
+    account, private_key = funded_account
+    v2_router, v3_router = UniswapV2Router(web3), UniswapV3Router(web3)
+    weth = ERC20Token(web3, WETH)
+    for router in (v2_router, v3_router):
+        weth.approve(router.contract.address, Decimal(1000), account, private_key)
+    return v2_router, v3_router
+
+
+def test_erc20_token_approve(benchmark, web3, funded_account, snapshot):
+    account, private_key = funded_account
+    token = ERC20Token(web3, USDC)
+    benchmark.pedantic(
+        token.approve,
+        args=(account, Decimal(1), account, private_key),
+        rounds=10,
+    )
+
+
+def test_uniswap_v2_router_swap(benchmark, funded_account, routers, snapshot):
+    account, private_key = funded_account
+    benchmark.pedantic(
+        routers[0].swap_exact_tokens_for_tokens,
+        args=(Decimal("0.01"), Decimal(0), [WETH, USDC], account, account, private_key),
+        kwargs={"deadline": DEADLINE},
+        rounds=10,
+    )
+
+
+def test_uniswap_v3_router_swap(benchmark, funded_account, routers, snapshot):
+    account, private_key = funded_account
+    benchmark.pedantic(
+        routers[1].exact_input_single,
+        args=(
+            Decimal("0.01"),
+            Decimal(0),
+            WETH,
+            USDC,
+            500,
+            account,
+            account,
+            private_key,
+        ),
+        kwargs={"deadline": DEADLINE},
+        rounds=10,
+    )
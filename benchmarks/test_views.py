@@ -0,0 +1,43 @@
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from conftest import ACCOUNT, USDC, WETH, WETH_USDC_V2, WETH_USDC_V3  # noqa: E402
+
+from dexsnake.uniswap_v2 import UniswapV2Factory, UniswapV2Pair  # noqa: E402
+from dexsnake.uniswap_v3 import UniswapV3Pool  # noqa: E402
+from dexsnake.utils import ERC20Token  # noqa: E402
+
+
+def test_erc20_token_balance_of(benchmark, web3):
+    token = ERC20Token(web3, USDC)
+    benchmark(token.balance_of, ACCOUNT)
+
+
+def test_erc20_token_decimals_uncached(benchmark, web3):
+    benchmark(lambda: ERC20Token(web3, USDC).decimals)
+
+
+def test_uniswap_v2_factory_get_pair(benchmark, web3):
+    factory = UniswapV2Factory(web3)
+    benchmark(factory.get_pair, WETH, USDC)
+
+
+def test_uniswap_v2_pair_get_price(benchmark, web3):
+    pair = UniswapV2Pair(web3, WETH_USDC_V2)
+    benchmark(pair.get_price)
+
+
+def test_uniswap_v2_pair_sync(benchmark, web3):
+    pair = UniswapV2Pair(web3, WETH_USDC_V2)
+    benchmark(pair.sync)
+
+
+def test_uniswap_v3_pool_get_price(benchmark, web3):
+    pool = UniswapV3Pool(web3, WETH_USDC_V3)
+    benchmark(pool.get_price)
+
+
+def test_uniswap_v3_pool_sync(benchmark, web3):
+    pool = UniswapV3Pool(web3, WETH_USDC_V3)
+    benchmark(pool.sync)
@@ -1 +1,19 @@
-from . import uniswap_v2, uniswap_v3, utils
+import importlib
+
+__all__ = [
+    "arbitrage",
+    "execution",
+    "multichain",
+    "state",
+    "uniswap_v2",
+    "uniswap_v3",
+    "utils",
+]
+
+
+def __getattr__(name):
+    # The subpackages are imported on first access so that importing one of them does
+    # not import the others
+    if name in __all__:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
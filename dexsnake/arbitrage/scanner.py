@@ -0,0 +1,328 @@
+import math
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from web3 import Web3
+from web3.types import BlockIdentifier, TxParams
+
+from ..uniswap_v2.pair import UniswapV2Pair
+from ..uniswap_v2.router import UniswapV2Router
+from ..uniswap_v3.pool import UniswapV3Pool
+from ..uniswap_v3.router import UniswapV3Router
+from ..utils.classifier import TokenClassifier
+
+Pool = Union[UniswapV2Pair, UniswapV3Pool]
+Leg = Tuple[int, bool]  # (index of the pool, whether token 0 is swapped for token 1)
+
+
+@dataclass
+class ArbitrageOpportunity:
+    """
+    A profitable cycle found by ``ArbitrageScanner``.
+
+    :ivar pools: The pools traded through, in order.
+    :ivar path: The addresses of the tokens along the cycle. The first and the last
+        token are the same.
+    :ivar amounts: The raw integer amounts of each token along the cycle.
+    :ivar amount_in: The optimal amount of the first token to trade.
+    :ivar amount_out: The amount of the first token received back.
+    :ivar profit: ``amount_out`` minus ``amount_in``.
+    :ivar block_number: The block at which the pool state was read.
+    """
+
+    pools: List[Pool]
+    path: List[str]
+    amounts: List[int]
+    amount_in: Decimal
+    amount_out: Decimal
+    profit: Decimal
+    block_number: int
+
+
+class ArbitrageScanner:
+    def __init__(
+        self,
+        web3: Web3,
+        pools: Iterable[Pool],
+        tokens: Iterable[str],
+        max_length: int = 3,
+        classifier: Optional[TokenClassifier] = None,
+    ):
+        """
+        Initializes a new instance of the ``ArbitrageScanner`` class.
+
+        The scanner enumerates all cycles of at most ``max_length`` swaps that start
+        and end in one of ``tokens`` and trade through the given Uniswap V2 pairs and
+        Uniswap V3 pools. This includes triangular cycles as well as cycles between a
+        V2 pair and a V3 pool for the same tokens. The cycles are indexed by the pools
+        they touch so that ``scan`` only re-evaluates cycles whose pools have changed.
+
+        :param web3: A ``Web3`` instance connected to a blockchain node.
+        :type web3: ``Web3``
+        :param pools: The ``UniswapV2Pair`` and ``UniswapV3Pool`` instances to track.
+        :type pools: Iterable[Union[``UniswapV2Pair``, ``UniswapV3Pool``]]
+        :param tokens: The addresses of the tokens in which the cycles start and end,
+            i.e., the tokens in which the profits are denominated.
+        :type tokens: Iterable[str]
+        :param max_length: The maximum number of swaps in a cycle.
+        :type max_length: int, optional
+        :param classifier: If provided, the tokens of the pools are classified with it
+            and the pools with a token that is not allowed, e.g., a honeypot, are
+            excluded before any cycle is indexed. ``build_transactions`` also checks
+            the tokens of an opportunity with it.
+        :type classifier: ``TokenClassifier``, optional
+        """
+        if max_length < 2:
+            raise ValueError("`max_length` must be at least 2")
+        self.web3: Web3 = web3
+        self.classifier: Optional[TokenClassifier] = classifier
+        pools = list(pools)
+        if classifier is not None:
+            classifier.classify_all(
+                {t.address for pool in pools for t in (pool.token_0, pool.token_1)}
+            )
+            pools = [
+                pool
+                for pool in pools
+                if classifier.is_allowed(pool.token_0.address)
+                and classifier.is_allowed(pool.token_1.address)
+            ]
+        self.pools: List[Pool] = pools
+        self.tokens: List[str] = [web3.to_checksum_address(t) for t in tokens]
+        self.max_length: int = max_length
+        self.block_number: Optional[int] = None
+        self._pool_indices: Dict[str, int] = {
+            pool.address: i for i, pool in enumerate(self.pools)
+        }
+        self._cycles: List[Tuple[Leg, ...]] = []
+        self._cycles_by_pool: Dict[int, List[int]] = {
+            i: [] for i in range(len(self.pools))
+        }
+        self._opportunities: Dict[int, ArbitrageOpportunity] = {}
+        self._v2_router: Optional[UniswapV2Router] = None
+        self._v3_router: Optional[UniswapV3Router] = None
+        self._index_cycles()
+
+    def _index_cycles(self) -> None:
+        edges: Dict[str, List[Tuple[int, bool, str]]] = {}
+        for i, pool in enumerate(self.pools):
+            token_0, token_1 = pool.token_0.address, pool.token_1.address
+            edges.setdefault(token_0, []).append((i, True, token_1))
+            edges.setdefault(token_1, []).append((i, False, token_0))
+
+        def extend(start: str, token: str, legs: List[Leg], visited: Set[str]):
+            for i, zero_for_one, token_out in edges.get(token, []):
+                if any(i == j for j, _ in legs):
+                    continue
+                if token_out == start and len(legs) >= 1:
+                    cycle = tuple(legs + [(i, zero_for_one)])
+                    for j, _ in cycle:
+                        self._cycles_by_pool[j].append(len(self._cycles))
+                    self._cycles.append(cycle)
+                elif token_out not in visited and len(legs) + 1 < self.max_length:
+                    extend(
+                        start,
+                        token_out,
+                        legs + [(i, zero_for_one)],
+                        visited | {token_out},
+                    )
+
+        for token in self.tokens:
+            extend(token, token, [], {token})
+
+    @property
+    def cycles(self) -> List[List[Pool]]:
+        """
+        Returns the indexed cycles as lists of pools.
+
+        :return: The cycles.
+        :rtype: List[List[Union[``UniswapV2Pair``, ``UniswapV3Pool``]]]
+        """
+        return [[self.pools[i] for i, _ in cycle] for cycle in self._cycles]
+
+    def scan(
+        self, block_identifier: BlockIdentifier = "latest"
+    ) -> List[ArbitrageOpportunity]:
+        """
+        Updates the state of the pools that have emitted events since the previous
+        scan, re-evaluates the cycles that touch them, and returns all currently
+        profitable cycles sorted by profit. On the first call, the state of every pool
+        is read and every cycle is evaluated.
+
+        The optimal input amount of a cycle is computed in closed form by composing the
+        constant product curves of its pools. Uniswap V3 pools are modeled by the
+        virtual reserves of their current tick range, so the amounts are exact only if
+        the swaps do not cross initialized ticks.
+
+        :param block_identifier: The block at which the pool state is read.
+        :type block_identifier: ``BlockIdentifier``, optional
+
+        :return: The profitable cycles, the most profitable first.
+        :rtype: List[``ArbitrageOpportunity``]
+        """
+        if block_identifier == "latest":
+            block_identifier = self.web3.eth.block_number
+        if self.block_number is None:
+            changed = set(range(len(self.pools)))
+        elif block_identifier <= self.block_number:
+            changed = set()
+        else:
+            logs = self.web3.eth.get_logs(
+                {
+                    "fromBlock": self.block_number + 1,
+                    "toBlock": block_identifier,
+                    "address": list(self._pool_indices.keys()),
+                }
+            )
+            changed = {self._pool_indices[log["address"]] for log in logs}
+        for i in changed:
+            self.pools[i].sync(block_identifier)
+        for j in {j for i in changed for j in self._cycles_by_pool[i]}:
+            opportunity = self._evaluate(j, block_identifier)
+            if opportunity is None:
+                self._opportunities.pop(j, None)
+            else:
+                self._opportunities[j] = opportunity
+        self.block_number = block_identifier
+        return sorted(
+            self._opportunities.values(),
+            key=lambda opportunity: opportunity.profit,
+            reverse=True,
+        )
+
+    def _evaluate(
+        self, cycle_index: int, block_number: int
+    ) -> Optional[ArbitrageOpportunity]:
+        cycle = self._cycles[cycle_index]
+        # Each swap maps x to a * x / (b + c * x), and so does their composition
+        a, b, c = 1.0, 1.0, 0.0
+        for i, zero_for_one in cycle:
+            pool = self.pools[i]
+            reserve_in, reserve_out = pool._virtual_reserves(zero_for_one)
+            if reserve_in == 0 or reserve_out == 0:
+                return None
+            gamma = 1 - pool.fee / 1_000_000
+            a, b, c = (
+                a * gamma * reserve_out,
+                b * reserve_in,
+                c * reserve_in + a * gamma,
+            )
+        if a <= b:
+            return None
+        amounts = [int((math.sqrt(a) * math.sqrt(b) - b) / c)]
+        for i, zero_for_one in cycle:
+            amounts.append(self.pools[i]._amount_out(amounts[-1], zero_for_one))
+        if amounts[-1] <= amounts[0]:
+            return None
+        pools = [self.pools[i] for i, _ in cycle]
+        token = pools[0].token_0 if cycle[0][1] else pools[0].token_1
+        path = [token.address]
+        for pool, (_, zero_for_one) in zip(pools, cycle):
+            path.append(pool.token_1.address if zero_for_one else pool.token_0.address)
+        scale = Decimal(10**token.decimals)
+        return ArbitrageOpportunity(
+            pools=pools,
+            path=path,
+            amounts=amounts,
+            amount_in=Decimal(amounts[0]) / scale,
+            amount_out=Decimal(amounts[-1]) / scale,
+            profit=Decimal(amounts[-1] - amounts[0]) / scale,
+            block_number=block_number,
+        )
+
+    def build_transactions(
+        self,
+        opportunity: ArbitrageOpportunity,
+        account: str,
+        slippage: int = 0,
+        deadline: Optional[int] = None,
+        gas: int = 300000,
+        gas_price: Optional[int] = None,
+    ) -> List[TxParams]:
+        """
+        Builds the unsigned transactions that execute ``opportunity``, one swap per
+        transaction through ``UniswapV2Router`` or ``UniswapV3Router``, with
+        consecutive nonces. Each swap spends the minimum output of the previous one,
+        so the transactions can be signed and sent back-to-back.
+
+        The Uniswap V2 swaps are routed by the router through the pairs created by
+        ``UniswapV2Factory``, and the router contracts must have been approved to spend
+        the tokens.
+
+        :param opportunity: The opportunity to execute.
+        :type opportunity: ``ArbitrageOpportunity``
+        :param account: The account address from which the transactions will be sent.
+        :type account: str
+        :param slippage: The tolerated slippage of each swap in basis points.
+        :type slippage: int, optional
+        :param deadline: The Unix timestamp after which the transactions will revert.
+            If not provided, it will be set to five minutes from the current time.
+        :type deadline: int, optional
+        :param gas: The gas limit of each transaction. The gas can not be estimated
+            because each swap depends on the tokens received in the previous one.
+        :type gas: int, optional
+        :param gas_price: The gas price for the transactions in wei. If not provided,
+            the current network gas price will be used.
+        :type gas_price: int, optional
+
+        :return: The unsigned transactions.
+        :rtype: List[``TxParams``]
+        """
+        if self.classifier is not None:
+            self.classifier.check(opportunity.path)
+        if gas_price is None:
+            gas_price = self.web3.eth.gas_price
+        if deadline is None:
+            deadline = int(time.time() + 300)
+        account_checksum = self.web3.to_checksum_address(account)
+        nonce = self.web3.eth.get_transaction_count(account_checksum, "pending")
+        txs = []
+        amount_in = opportunity.amounts[0]
+        for k, pool in enumerate(opportunity.pools):
+            token_in, token_out = opportunity.path[k], opportunity.path[k + 1]
+            amount_out_min = (
+                pool._amount_out(amount_in, token_in == pool.token_0.address)
+                * (10000 - slippage)
+                // 10000
+            )
+            tx_params = {
+                "from": account_checksum,
+                "nonce": nonce + k,
+                "gas": gas,
+                "gasPrice": gas_price,
+            }
+            if isinstance(pool, UniswapV2Pair):
+                if self._v2_router is None:
+                    self._v2_router = UniswapV2Router(self.web3)
+                tx = self._v2_router.contract.functions.swapExactTokensForTokens(
+                    amount_in,
+                    amount_out_min,
+                    [token_in, token_out],
+                    account_checksum,
+                    deadline,
+                ).build_transaction(tx_params)
+            else:
+                if self._v3_router is None:
+                    self._v3_router = UniswapV3Router(self.web3)
+                data = self._v3_router.contract.encodeABI(
+                    fn_name="exactInputSingle",
+                    args=[
+                        {
+                            "tokenIn": token_in,
+                            "tokenOut": token_out,
+                            "fee": pool.fee,
+                            "recipient": account_checksum,
+                            "amountIn": amount_in,
+                            "amountOutMinimum": amount_out_min,
+                            "sqrtPriceLimitX96": 0,
+                        }
+                    ],
+                )
+                tx = self._v3_router.contract.functions.multicall(
+                    deadline, [data]
+                ).build_transaction(tx_params)
+            txs.append(tx)
+            amount_in = amount_out_min
+        return txs
@@ -0,0 +1,18 @@
+import importlib
+
+_ATTRIBUTES = {
+    "AccountState": ".executor",
+    "ChildOrder": ".scheduler",
+    "OrderExecution": ".scheduler",
+    "OrderScheduler": ".scheduler",
+    "ParallelExecutor": ".executor",
+}
+
+__all__ = list(_ATTRIBUTES)
+
+
+def __getattr__(name):
+    # The modules are imported on first access
+    if name in _ATTRIBUTES:
+        return getattr(importlib.import_module(_ATTRIBUTES[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
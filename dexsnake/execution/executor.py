@@ -0,0 +1,453 @@
+import itertools
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from web3 import Web3
+from web3.contract.contract import ContractFunction
+from web3.types import BlockIdentifier, TxReceipt
+
+from ..uniswap_v2.router import UniswapV2Router
+from ..uniswap_v3.router import UniswapV3Router
+from ..utils.erc20_token import ERC20Token
+from ..utils.execution import SwapExecution, parse_swap_receipt
+from ..utils.multicall import Multicall3
+from ..utils.registry import get_chain_id
+
+MAX_UINT256 = 2**256 - 1
+
+ASSIGNMENTS = ("round_robin", "inventory")
+
+
+@dataclass
+class AccountState:
+    """
+    The local state of an account of ``ParallelExecutor``.
+
+    :ivar address: The address of the account.
+    :ivar nonce: The nonce of the next transaction, or ``None`` if it will be read from
+        the node.
+    :ivar pending: The number of transactions sent but not yet included.
+    :ivar balances: The raw integer balances of the tokens read with
+        ``ParallelExecutor.refresh``, updated with the amounts paid and received as
+        swaps are included.
+    :ivar reserved: The raw integer amounts of the tokens spent by pending swaps.
+    """
+
+    address: str
+    nonce: Optional[int] = None
+    pending: int = 0
+    balances: Dict[str, int] = field(default_factory=dict)
+    reserved: Dict[str, int] = field(default_factory=dict)
+
+    def available(self, token: str) -> int:
+        """
+        Returns the raw integer balance of ``token`` that is not spent by pending swaps.
+
+        :param token: The address of the token.
+        :type token: str
+
+        :return: The available balance.
+        :rtype: int
+        """
+        return self.balances.get(token, 0) - self.reserved.get(token, 0)
+
+
+class ParallelExecutor:
+    def __init__(
+        self,
+        web3: Web3,
+        accounts: Iterable[Tuple[str, str]],
+        assignment: str = "round_robin",
+        max_workers: Optional[int] = None,
+        gas: Optional[int] = None,
+        gas_price: Optional[int] = None,
+    ):
+        """
+        Initializes a new instance of the ``ParallelExecutor`` class.
+
+        The executor sends swaps and approvals from a pool of accounts, so that the
+        number of transactions per block is not limited by the nonces of a single
+        account. Each swap is assigned to an account either round-robin or to the
+        account with the largest available balance of the input token, and the nonces
+        of each account are assigned locally, so transactions from the same account
+        are sent without waiting for each other. Building, signing, sending, and
+        waiting for the transactions is done in a pool of threads, and every method
+        returns a ``Future`` that resolves when the transaction has been included.
+
+        If a transaction cannot be built or sent, e.g., because estimating its gas shows
+        that it would revert, its nonce is used by a 0-value transfer from the account
+        to itself, so that the later transactions of the account are not stuck behind a
+        gap. If that fails too, the nonce of the account is read again from the node
+        before its next transaction. The routers must have been approved to spend the
+        tokens of every account, e.g., with ``approve``.
+
+        :param web3: A ``Web3`` instance connected to a blockchain node.
+        :type web3: ``Web3``
+        :param accounts: The address and private key of each account.
+        :type accounts: Iterable[Tuple[str, str]]
+        :param assignment: How swaps are assigned to accounts, ``"round_robin"`` or
+            ``"inventory"``. With ``"inventory"``, the balances are read with
+            ``refresh`` on first use of each token.
+        :type assignment: str, optional
+        :param max_workers: The maximum number of threads. If not provided, four
+            threads per account are used.
+        :type max_workers: int, optional
+        :param gas: The gas limit of each transaction. If not provided, it will be
+            estimated automatically.
+        :type gas: int, optional
+        :param gas_price: The gas price for the transactions in wei. If not provided,
+            the current network gas price will be used.
+        :type gas_price: int, optional
+        """
+        if assignment not in ASSIGNMENTS:
+            raise ValueError(
+                f"Unknown assignment {assignment!r} (expected one of {ASSIGNMENTS})"
+            )
+        self.web3: Web3 = web3
+        self._keys: Dict[str, str] = {
+            self.web3.to_checksum_address(address): private_key
+            for address, private_key in accounts
+        }
+        if not self._keys:
+            raise ValueError("At least one account is required")
+        self.accounts: Dict[str, AccountState] = {
+            address: AccountState(address) for address in self._keys
+        }
+        self.assignment: str = assignment
+        self.gas: Optional[int] = gas
+        self.gas_price: Optional[int] = gas_price
+        self.multicall: Multicall3 = Multicall3(web3)
+        self._lock = threading.Lock()
+        self._cycle = itertools.cycle(list(self.accounts.values()))
+        self._refreshed: Set[str] = set()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or 4 * len(self.accounts)
+        )
+        self._v2_router: Optional[UniswapV2Router] = None
+        self._v3_router: Optional[UniswapV3Router] = None
+
+    def __enter__(self) -> "ParallelExecutor":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def refresh(
+        self, tokens: Iterable[str], block_identifier: BlockIdentifier = "latest"
+    ) -> None:
+        """
+        Reads the balances of ``tokens`` of every account with a single batched call
+        into ``AccountState.balances``.
+
+        :param tokens: The addresses of the tokens.
+        :type tokens: Iterable[str]
+        :param block_identifier: The block at which the balances are read.
+        :type block_identifier: ``BlockIdentifier``, optional
+        """
+        tokens = [ERC20Token(self.web3, token) for token in tokens]
+        accounts = list(self.accounts.values())
+        outputs = iter(
+            self.multicall.aggregate(
+                [
+                    token.contract.functions.balanceOf(account.address)
+                    for token in tokens
+                    for account in accounts
+                ],
+                block_identifier,
+            )
+        )
+        with self._lock:
+            for token in tokens:
+                for account in accounts:
+                    account.balances[token.address] = next(outputs)
+                self._refreshed.add(token.address)
+
+    def _assign(self, token: Optional[str], amount: int) -> AccountState:
+        # Must be called with the lock held
+        if self.assignment == "round_robin" or token is None:
+            account = next(self._cycle)
+        else:
+            account = max(
+                self.accounts.values(), key=lambda account: account.available(token)
+            )
+            if account.available(token) < amount:
+                raise ValueError(f"No account has enough {token} available")
+        return account
+
+    def _fill_nonce(self, state: AccountState, nonce: int) -> bool:
+        # Sends a 0-value transfer from the account to itself with ``nonce``, so that
+        # the transactions already sent with later nonces can be included
+        try:
+            tx = {
+                "from": state.address,
+                "to": state.address,
+                "value": 0,
+                "nonce": nonce,
+                "gas": 21000,
+                "gasPrice": (
+                    self.web3.eth.gas_price
+                    if self.gas_price is None
+                    else self.gas_price
+                ),
+                "chainId": get_chain_id(self.web3),
+            }
+            signed_tx = self.web3.eth.account.sign_transaction(
+                tx, private_key=self._keys[state.address]
+            )
+            self.web3.eth.send_raw_transaction(signed_tx.rawTransaction)
+        except Exception:
+            return False
+        return True
+
+    def _submit(
+        self,
+        build: Callable[[str], ContractFunction],
+        token: Optional[str] = None,
+        amount: int = 0,
+        account: Optional[str] = None,
+        parse: Optional[Callable[[str, TxReceipt], SwapExecution]] = None,
+        token_out: Optional[str] = None,
+    ) -> Future:
+        if (
+            self.assignment == "inventory"
+            and token is not None
+            and token not in self._refreshed
+        ):
+            self.refresh([token])
+        with self._lock:
+            state = (
+                self.accounts[account]
+                if account is not None
+                else self._assign(token, amount)
+            )
+            if state.nonce is None:
+                state.nonce = self.web3.eth.get_transaction_count(
+                    state.address, "pending"
+                )
+            nonce = state.nonce
+            state.nonce += 1
+            state.pending += 1
+            if token is not None:
+                state.reserved[token] = state.reserved.get(token, 0) + amount
+
+        def release(included: bool) -> None:
+            with self._lock:
+                state.pending -= 1
+                if token is not None:
+                    state.reserved[token] -= amount
+                    if included and token in state.balances:
+                        state.balances[token] -= amount
+
+        def run():
+            try:
+                tx = build(state.address).build_transaction(
+                    {
+                        "from": state.address,
+                        "nonce": nonce,
+                        "gasPrice": (
+                            self.web3.eth.gas_price
+                            if self.gas_price is None
+                            else self.gas_price
+                        ),
+                    }
+                )
+                tx["gas"] = (
+                    self.web3.eth.estimate_gas(tx) if self.gas is None else self.gas
+                )
+                signed_tx = self.web3.eth.account.sign_transaction(
+                    tx, private_key=self._keys[state.address]
+                )
+                tx_hash = self.web3.eth.send_raw_transaction(signed_tx.rawTransaction)
+            except Exception:
+                if not self._fill_nonce(state, nonce):
+                    with self._lock:
+                        state.nonce = None  # the nonce was not used
+                release(False)
+                raise
+            try:
+                receipt = self.web3.eth.wait_for_transaction_receipt(tx_hash)
+            except Exception:
+                release(False)
+                raise
+            release(receipt["status"] == 1)
+            if parse is None:
+                return receipt
+            execution = parse(state.address, receipt)
+            if token_out is not None and execution.success:
+                scale = Decimal(10 ** ERC20Token(self.web3, token_out).decimals)
+                with self._lock:
+                    if token_out in state.balances:
+                        state.balances[token_out] += int(execution.amount_out * scale)
+            return execution
+
+        return self._executor.submit(run)
+
+    def approve(
+        self, token: str, spender: str, value: Optional[Decimal] = None
+    ) -> List[Future]:
+        """
+        Approves ``spender`` to spend ``token`` on behalf of every account.
+
+        :param token: The address of the token.
+        :type token: str
+        :param spender: The address to approve, e.g., the address of a router.
+        :type spender: str
+        :param value: The amount of tokens to approve. If not provided, the maximum
+            amount is approved so that the approval never needs to be renewed.
+        :type value: ``Decimal``, optional
+
+        :return: The futures of the transaction receipts, one per account.
+        :rtype: List[``Future``]
+        """
+        token = ERC20Token(self.web3, token)
+        spender = self.web3.to_checksum_address(spender)
+        raw = (
+            MAX_UINT256
+            if value is None
+            else int(Decimal(value) * Decimal(10**token.decimals))
+        )
+        return [
+            self._submit(
+                lambda _: token.contract.functions.approve(spender, raw),
+                account=address,
+            )
+            for address in self.accounts
+        ]
+
+    def swap_exact_tokens_for_tokens(
+        self,
+        amount_in: Decimal,
+        amount_out_min: Decimal,
+        path: List[str],
+        deadline: Optional[int] = None,
+    ) -> Future:
+        """
+        Swaps an exact amount of input tokens for as many output tokens as possible
+        along ``path`` with ``UniswapV2Router`` from one of the accounts, which also
+        receives the output tokens.
+
+        :param amount_in: The amount of input tokens to send.
+        :type amount_in: ``Decimal``
+        :param amount_out_min: The minimum amount of output tokens that must be received
+            for the transaction not to revert.
+        :type amount_out_min: ``Decimal``
+        :param path: A list of token addresses. The length of ``path`` must be >= 2 and
+            Uniswap V2 pairs for each consecutive pair of addresses must exist and have
+            liquidity.
+        :type path: List[str]
+        :param deadline: The Unix timestamp after which the transaction will revert. If
+            not provided, it will be set to five minutes from the current time.
+        :type deadline: int, optional
+
+        :return: The future of the result of the swap.
+        :rtype: ``Future``
+        """
+        if self._v2_router is None:
+            self._v2_router = UniswapV2Router(self.web3)
+        router = self._v2_router
+        if deadline is None:
+            deadline = int(time.time() + 300)
+        path = [self.web3.to_checksum_address(address) for address in path]
+        raw_in = int(
+            Decimal(amount_in) * Decimal(10 ** ERC20Token(self.web3, path[0]).decimals)
+        )
+        raw_out_min = int(
+            Decimal(amount_out_min)
+            * Decimal(10 ** ERC20Token(self.web3, path[-1]).decimals)
+        )
+        return self._submit(
+            lambda account: router.contract.functions.swapExactTokensForTokens(
+                raw_in, raw_out_min, path, account, deadline
+            ),
+            token=path[0],
+            amount=raw_in,
+            parse=lambda account, receipt: parse_swap_receipt(
+                self.web3, receipt, path[0], path[-1], account, account
+            ),
+            token_out=path[-1],
+        )
+
+    def exact_input_single(
+        self,
+        amount_in: Decimal,
+        amount_out_min: Decimal,
+        token_in: str,
+        token_out: str,
+        fee: int,
+        deadline: Optional[int] = None,
+    ) -> Future:
+        """
+        Swaps an exact amount of input tokens for as many output tokens as possible in
+        a single Uniswap V3 pool with ``UniswapV3Router`` from one of the accounts,
+        which also receives the output tokens.
+
+        :param amount_in: The amount of input tokens to send.
+        :type amount_in: ``Decimal``
+        :param amount_out_min: The minimum amount of output tokens that must be received
+            for the transaction not to revert.
+        :type amount_out_min: ``Decimal``
+        :param token_in: The address of the input token.
+        :type token_in: str
+        :param token_out: The address of the output token.
+        :type token_out: str
+        :param fee: The pool's fee denominated in hundredths of a basis point (i.e.,
+            1e-6). Must be one of the following: 500, 3000, 10000.
+        :type fee: int
+        :param deadline: The Unix timestamp after which the transaction will revert. If
+            not provided, it will be set to five minutes from the current time.
+        :type deadline: int, optional
+
+        :return: The future of the result of the swap.
+        :rtype: ``Future``
+        """
+        if self._v3_router is None:
+            self._v3_router = UniswapV3Router(self.web3)
+        router = self._v3_router
+        if deadline is None:
+            deadline = int(time.time() + 300)
+        token_in = self.web3.to_checksum_address(token_in)
+        token_out = self.web3.to_checksum_address(token_out)
+        raw_in = int(
+            Decimal(amount_in) * Decimal(10 ** ERC20Token(self.web3, token_in).decimals)
+        )
+        raw_out_min = int(
+            Decimal(amount_out_min)
+            * Decimal(10 ** ERC20Token(self.web3, token_out).decimals)
+        )
+
+        def build(account: str) -> ContractFunction:
+            data = router.contract.encodeABI(
+                fn_name="exactInputSingle",
+                args=[
+                    {
+                        "tokenIn": token_in,
+                        "tokenOut": token_out,
+                        "fee": fee,
+                        "recipient": account,
+                        "amountIn": raw_in,
+                        "amountOutMinimum": raw_out_min,
+                        "sqrtPriceLimitX96": 0,
+                    }
+                ],
+            )
+            return router.contract.functions.multicall(deadline, [data])
+
+        return self._submit(
+            build,
+            token=token_in,
+            amount=raw_in,
+            parse=lambda account, receipt: parse_swap_receipt(
+                self.web3, receipt, token_in, token_out, account, account
+            ),
+            token_out=token_out,
+        )
+
+    def close(self) -> None:
+        """
+        Waits for the submitted transactions and shuts down the threads.
+        """
+        self._executor.shutdown()
@@ -0,0 +1,378 @@
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Iterable, List, Optional, Tuple, Union
+
+from web3 import Web3
+from web3.types import TxParams
+
+from ..uniswap_v2.pair import UniswapV2Pair
+from ..uniswap_v2.router import UniswapV2Router
+from ..uniswap_v3.pool import UniswapV3Pool
+from ..uniswap_v3.router import UniswapV3Router
+from ..utils.erc20_token import ERC20Token
+from ..utils.execution import SwapExecution, parse_swap_receipt
+from ..utils.metrics import timed
+from ..utils.multicall import Multicall3
+
+Pool = Union[UniswapV2Pair, UniswapV3Pool]
+
+SCHEDULES = ("twap", "participation")
+
+
+@dataclass
+class ChildOrder:
+    """
+    A slice of a parent order submitted by ``OrderScheduler``.
+
+    :ivar block_number: The block at which the pool state used to size and route the
+        slice was read.
+    :ivar pool: The pair or pool the slice was routed through.
+    :ivar amount_in: The amount of input tokens.
+    :ivar expected_amount_out: The amount of output tokens quoted from the pool state.
+    :ivar amount_out_min: The minimum amount of output tokens.
+    :ivar transaction_hash: The hash of the transaction.
+    :ivar execution: The result of the swap, or ``None`` if the order was not executed.
+    """
+
+    block_number: int
+    pool: Pool
+    amount_in: Decimal
+    expected_amount_out: Decimal
+    amount_out_min: Decimal
+    transaction_hash: str
+    execution: Optional[SwapExecution] = None
+
+
+@dataclass
+class OrderExecution:
+    """
+    The result of a parent order executed by ``OrderScheduler``.
+
+    :ivar children: The slices of the order in the order in which they were submitted.
+    :ivar amount_in: The amount of input tokens paid.
+    :ivar amount_out: The amount of output tokens received.
+    :ivar expected_amount_out: The sum of the amounts of output tokens quoted for the
+        slices when they were submitted.
+    :ivar price: The realized price, i.e., the amount of output tokens received per
+        input token, or ``None`` if nothing was paid.
+    :ivar expected_price: The price quoted for the slices when they were submitted.
+    :ivar slippage_bps: The shortfall of the realized price from the quoted price in
+        basis points, or ``None`` if nothing was paid or quoted.
+    :ivar gas_cost: The cost of the gas in the native token (e.g., ETH).
+    """
+
+    children: List[ChildOrder]
+    amount_in: Decimal
+    amount_out: Decimal
+    expected_amount_out: Decimal
+    price: Optional[Decimal]
+    expected_price: Decimal
+    slippage_bps: Optional[Decimal]
+    gas_cost: Decimal
+
+
+class OrderScheduler:
+    def __init__(
+        self,
+        web3: Web3,
+        pools: Iterable[Pool],
+        account: str,
+        private_key: str,
+        poll_interval: float = 1.0,
+    ):
+        """
+        Initializes a new instance of the ``OrderScheduler`` class.
+
+        The scheduler executes a large parent order as a sequence of smaller swaps, the
+        child orders, spread over blocks to reduce price impact. Before each child
+        order, the state of the pools is read with a single batched call using
+        ``Multicall3``, and the child order is sized from that state and routed through
+        the Uniswap V2 pair or Uniswap V3 pool that gives the most output tokens. Pools
+        whose state cannot be read are left out of that child order. The
+        child orders are signed with locally assigned nonces and sent without waiting
+        for the previous ones to be included, and the receipts are collected at the
+        end.
+
+        The Uniswap V2 swaps are routed by the router through the pairs created by
+        ``UniswapV2Factory``, and the routers must have been approved to spend the input
+        tokens of ``account``, e.g., with ``PortfolioManager.approve_missing``.
+
+        :param web3: A ``Web3`` instance connected to a blockchain node.
+        :type web3: ``Web3``
+        :param pools: The ``UniswapV2Pair`` and ``UniswapV3Pool`` instances to route
+            through. Pools that do not contain both tokens of an order are skipped.
+        :type pools: Iterable[Union[``UniswapV2Pair``, ``UniswapV3Pool``]]
+        :param account: The account address from which the transactions will be sent.
+        :type account: str
+        :param private_key: The private key of the account.
+        :type private_key: str
+        :param poll_interval: The number of seconds between polls for new blocks.
+        :type poll_interval: float, optional
+        """
+        self.web3: Web3 = web3
+        self.pools: List[Pool] = list(dict.fromkeys(pools))
+        self.account: str = self.web3.to_checksum_address(account)
+        self.private_key: str = private_key
+        self.poll_interval: float = poll_interval
+        self.multicall: Multicall3 = Multicall3(web3)
+        self._v2_router: Optional[UniswapV2Router] = None
+        self._v3_router: Optional[UniswapV3Router] = None
+
+    def _sync(self, pools: List[Pool], block_number: int) -> List[Pool]:
+        # Returns the pools whose state was read
+        calls = []
+        for pool in pools:
+            if isinstance(pool, UniswapV2Pair):
+                calls.append(pool.contract.functions.getReserves())
+            else:
+                calls.append(pool.contract.functions.slot0())
+                calls.append(pool.contract.functions.liquidity())
+        outputs = iter(self.multicall.aggregate(calls, block_number))
+        read = []
+        for pool in pools:
+            if isinstance(pool, UniswapV2Pair):
+                reserves = next(outputs)
+                if reserves is None:
+                    continue
+                pool.reserve_0, pool.reserve_1, _ = reserves
+            else:
+                slot0, liquidity = next(outputs), next(outputs)
+                if slot0 is None or liquidity is None:
+                    continue
+                pool.sqrt_price_x96, pool.tick = slot0[0], slot0[1]
+                pool.liquidity = liquidity
+            pool.block_number = block_number
+            read.append(pool)
+        return read
+
+    def _wait_for_block(self, block_number: int, dry_run: bool) -> int:
+        if dry_run:
+            # Local development nodes such as anvil and Hardhat mine blocks on demand
+            while self.web3.eth.block_number < block_number:
+                self.web3.provider.make_request("evm_mine", [])
+        while self.web3.eth.block_number < block_number:
+            time.sleep(self.poll_interval)
+        return self.web3.eth.block_number
+
+    def _build(
+        self,
+        pool: Pool,
+        token_in: str,
+        token_out: str,
+        amount_in: int,
+        amount_out_min: int,
+        deadline: int,
+        tx_params: TxParams,
+    ) -> TxParams:
+        if isinstance(pool, UniswapV2Pair):
+            if self._v2_router is None:
+                self._v2_router = UniswapV2Router(self.web3)
+            return self._v2_router.contract.functions.swapExactTokensForTokens(
+                amount_in,
+                amount_out_min,
+                [token_in, token_out],
+                self.account,
+                deadline,
+            ).build_transaction(tx_params)
+        if self._v3_router is None:
+            self._v3_router = UniswapV3Router(self.web3)
+        data = self._v3_router.contract.encodeABI(
+            fn_name="exactInputSingle",
+            args=[
+                {
+                    "tokenIn": token_in,
+                    "tokenOut": token_out,
+                    "fee": pool.fee,
+                    "recipient": self.account,
+                    "amountIn": amount_in,
+                    "amountOutMinimum": amount_out_min,
+                    "sqrtPriceLimitX96": 0,
+                }
+            ],
+        )
+        return self._v3_router.contract.functions.multicall(
+            deadline, [data]
+        ).build_transaction(tx_params)
+
+    @timed
+    def execute(
+        self,
+        amount_in: Decimal,
+        token_in: str,
+        token_out: str,
+        schedule: str = "twap",
+        n_slices: int = 10,
+        participation: float = 0.001,
+        interval: int = 1,
+        slippage_bps: int = 50,
+        deadline: Optional[int] = None,
+        gas: Optional[int] = None,
+        gas_price: Optional[int] = None,
+        dry_run: bool = False,
+    ) -> OrderExecution:
+        """
+        Executes an order to swap ``amount_in`` of ``token_in`` for ``token_out`` as
+        child orders submitted every ``interval`` blocks, and waits until all of them
+        have been included.
+
+        With the ``"twap"`` schedule, the order is split into ``n_slices`` equal child
+        orders, so that the average price approximates the time-weighted average price
+        over the execution. With the ``"participation"`` schedule, each child order
+        swaps at most ``participation`` times the total reserves of the input token in
+        the pools, measured from the current state, so that the price impact of each
+        child order stays roughly constant and the order executes faster when there is
+        more liquidity.
+
+        With ``dry_run``, the blocks are mined on demand with ``evm_mine`` instead of
+        waiting for them, which requires a local development node, e.g., an anvil fork
+        of the chain. This executes the order in seconds, and the realized and expected
+        prices in the result can be used to benchmark schedules and parameters.
+
+        :param amount_in: The amount of input tokens to send.
+        :type amount_in: ``Decimal``
+        :param token_in: The address of the input token.
+        :type token_in: str
+        :param token_out: The address of the output token.
+        :type token_out: str
+        :param schedule: The schedule, ``"twap"`` or ``"participation"``.
+        :type schedule: str, optional
+        :param n_slices: The number of child orders with the ``"twap"`` schedule.
+        :type n_slices: int, optional
+        :param participation: The maximum size of each child order relative to the
+            reserves of the input token with the ``"participation"`` schedule.
+        :type participation: float, optional
+        :param interval: The number of blocks between child orders.
+        :type interval: int, optional
+        :param slippage_bps: The tolerated slippage of each child order from its quote
+            in basis points.
+        :type slippage_bps: int, optional
+        :param deadline: The Unix timestamp after which the transactions will revert. If
+            not provided, it will be set to five minutes after each child order is
+            submitted.
+        :type deadline: int, optional
+        :param gas: The gas limit of each transaction. If not provided, it will be
+            estimated automatically.
+        :type gas: int, optional
+        :param gas_price: The gas price for the transactions in wei. If not provided,
+            the current network gas price is used for each child order.
+        :type gas_price: int, optional
+        :param dry_run: Whether to mine the blocks on demand on a local development
+            node.
+        :type dry_run: bool, optional
+
+        :return: The result of the order.
+        :rtype: ``OrderExecution``
+        """
+        if schedule not in SCHEDULES:
+            raise ValueError(
+                f"Unknown schedule {schedule!r} (expected one of {SCHEDULES})"
+            )
+        if n_slices <= 0:
+            raise ValueError("n_slices must be positive")
+        if participation <= 0:
+            raise ValueError("participation must be positive")
+        if interval < 1:
+            raise ValueError("interval must be at least 1")
+        if not 0 <= slippage_bps <= 10_000:
+            raise ValueError("slippage_bps must be between 0 and 10,000")
+        token_in = self.web3.to_checksum_address(token_in)
+        token_out = self.web3.to_checksum_address(token_out)
+        pools = [
+            pool
+            for pool in self.pools
+            if {pool.token_0.address, pool.token_1.address} == {token_in, token_out}
+        ]
+        if not pools:
+            raise ValueError(f"No pool for {token_in} and {token_out}")
+        scale_in = Decimal(10 ** ERC20Token(self.web3, token_in).decimals)
+        scale_out = Decimal(10 ** ERC20Token(self.web3, token_out).decimals)
+        total = int(Decimal(amount_in) * scale_in)
+        if total <= 0:
+            raise ValueError("amount_in must be positive")
+        remaining = total
+        nonce = self.web3.eth.get_transaction_count(self.account, "pending")
+        block_number = self.web3.eth.block_number
+        children: List[Tuple[ChildOrder, bytes]] = []
+        while remaining > 0:
+            live = self._sync(pools, block_number)
+            if not live:
+                raise ValueError("The state of the pools could not be read")
+            if schedule == "twap":
+                size = min(remaining, -(-total // n_slices))
+            else:
+                reserves = sum(
+                    pool._virtual_reserves(token_in == pool.token_0.address)[0]
+                    for pool in live
+                )
+                size = min(remaining, int(participation * reserves))
+                if size == 0:
+                    raise ValueError("The pools have no liquidity")
+            pool = max(
+                live,
+                key=lambda pool: pool._amount_out(
+                    size, token_in == pool.token_0.address
+                ),
+            )
+            expected = pool._amount_out(size, token_in == pool.token_0.address)
+            amount_out_min = expected * (10_000 - slippage_bps) // 10_000
+            tx = self._build(
+                pool,
+                token_in,
+                token_out,
+                size,
+                amount_out_min,
+                int(time.time() + 300) if deadline is None else deadline,
+                {
+                    "from": self.account,
+                    "nonce": nonce,
+                    "gasPrice": (
+                        self.web3.eth.gas_price if gas_price is None else gas_price
+                    ),
+                },
+            )
+            tx["gas"] = self.web3.eth.estimate_gas(tx) if gas is None else gas
+            signed_tx = self.web3.eth.account.sign_transaction(
+                tx, private_key=self.private_key
+            )
+            tx_hash = self.web3.eth.send_raw_transaction(signed_tx.rawTransaction)
+            child = ChildOrder(
+                block_number=block_number,
+                pool=pool,
+                amount_in=Decimal(size) / scale_in,
+                expected_amount_out=Decimal(expected) / scale_out,
+                amount_out_min=Decimal(amount_out_min) / scale_out,
+                transaction_hash="0x" + bytes(tx_hash).hex(),
+            )
+            children.append((child, tx_hash))
+            nonce += 1
+            remaining -= size
+            if remaining > 0:
+                block_number = self._wait_for_block(block_number + interval, dry_run)
+        for child, tx_hash in children:
+            receipt = self.web3.eth.wait_for_transaction_receipt(tx_hash)
+            child.execution = parse_swap_receipt(
+                self.web3, receipt, token_in, token_out, self.account, self.account
+            )
+        executions = [child.execution for child, _ in children]
+        paid = sum((execution.amount_in for execution in executions), Decimal(0))
+        received = sum((execution.amount_out for execution in executions), Decimal(0))
+        expected_out = sum(
+            (child.expected_amount_out for child, _ in children), Decimal(0)
+        )
+        expected_price = expected_out / (Decimal(total) / scale_in)
+        price = received / paid if paid > 0 else None
+        return OrderExecution(
+            children=[child for child, _ in children],
+            amount_in=paid,
+            amount_out=received,
+            expected_amount_out=expected_out,
+            price=price,
+            expected_price=expected_price,
+            slippage_bps=(
+                None
+                if price is None or expected_price == 0
+                else (1 - price / expected_price) * Decimal(10_000)
+            ),
+            gas_cost=sum((execution.gas_cost for execution in executions), Decimal(0)),
+        )
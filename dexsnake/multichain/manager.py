@@ -0,0 +1,343 @@
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar, Union
+
+from web3 import Web3
+from web3.types import BlockIdentifier, RPCEndpoint, RPCResponse
+
+from ..uniswap_v2.config import CONFIG as UNISWAP_V2_CONFIG
+from ..uniswap_v2.factory import UniswapV2Factory
+from ..uniswap_v2.pair import UniswapV2Pair
+from ..uniswap_v3.config import CONFIG as UNISWAP_V3_CONFIG
+from ..uniswap_v3.factory import UniswapV3Factory
+from ..uniswap_v3.pool import UniswapV3Pool
+from ..utils.multicall import Multicall3
+from ..utils.registry import get_chain_id
+
+T = TypeVar("T")
+Pool = Union[UniswapV2Pair, UniswapV3Pool]
+
+NULL_ADDRESS = "0x0000000000000000000000000000000000000000"
+FEES = (100, 500, 3000, 10000)
+
+
+class _RateBudget:
+    def __init__(self, rate_limit: float):
+        self.rate_limit = rate_limit
+        # The budget holds at least one token so that limits below one request per
+        # second can be met
+        self.capacity = max(1.0, rate_limit)
+        self.tokens = self.capacity
+        self.refilled_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self.refilled_at) * self.rate_limit,
+                )
+                self.refilled_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate_limit
+            time.sleep(delay)
+
+
+def _rate_limit_middleware(budget: _RateBudget):
+    def middleware(
+        make_request: Callable[[RPCEndpoint, Any], RPCResponse], web3: Web3
+    ) -> Callable[[RPCEndpoint, Any], RPCResponse]:
+        def limited(method: RPCEndpoint, params: Any) -> RPCResponse:
+            budget.acquire()
+            return make_request(method, params)
+
+        return limited
+
+    return middleware
+
+
+class MultiChainManager:
+    def __init__(
+        self,
+        providers: Dict[int, Union[str, Web3]],
+        rate_limits: Optional[Dict[int, float]] = None,
+    ):
+        """
+        Initializes a new instance of the ``MultiChainManager`` class.
+
+        The manager holds one ``Web3`` instance per chain and runs the same work on
+        every chain concurrently, one thread per chain, returning the results keyed by
+        chain ID. Because there is a single ``Web3`` instance per chain, the pairs,
+        pools, and tokens created through the manager are shared between all work on
+        the same chain together with their cached state. The RPC requests made on each
+        chain can be limited to a per-chain budget so that a busy chain does not
+        exhaust the rate limit of its node provider.
+
+        :param providers: The HTTP endpoint URI or ``Web3`` instance of each chain,
+            keyed by chain ID. The chain ID of each node is checked.
+        :type providers: Dict[int, Union[str, ``Web3``]]
+        :param rate_limits: The maximum number of RPC requests per second per chain,
+            keyed by chain ID. Chains without a limit are not rate limited.
+        :type rate_limits: Dict[int, float], optional
+        """
+        self.web3s: Dict[int, Web3] = {
+            int(chain_id): (
+                provider
+                if isinstance(provider, Web3)
+                else Web3(Web3.HTTPProvider(provider))
+            )
+            for chain_id, provider in providers.items()
+        }
+        for chain_id, limit in (rate_limits or {}).items():
+            self.web3s[int(chain_id)].middleware_onion.add(
+                _rate_limit_middleware(_RateBudget(limit)),
+                name="dexsnake_rate_limit",
+            )
+        self.pools: Dict[int, List[Pool]] = {chain_id: [] for chain_id in self.web3s}
+        # The pools whose state could not be read by the last ``sync`` on each chain
+        self.failed: Dict[int, List[Pool]] = {chain_id: [] for chain_id in self.web3s}
+        self._executor = ThreadPoolExecutor(max_workers=max(len(self.web3s), 1))
+        for chain_id, actual in self.run(get_chain_id).items():
+            if actual != chain_id:
+                raise ValueError(
+                    f"The node given for chain ID {chain_id} is on chain ID {actual}"
+                )
+
+    @property
+    def chain_ids(self) -> List[int]:
+        """
+        Returns the IDs of the chains managed by the manager.
+
+        :return: The chain IDs.
+        :rtype: List[int]
+        """
+        return list(self.web3s)
+
+    def run(
+        self,
+        func: Callable[..., T],
+        chain_ids: Optional[Iterable[int]] = None,
+        return_exceptions: bool = False,
+        **kwargs: Dict[int, Any],
+    ) -> Dict[int, T]:
+        """
+        Calls ``func`` concurrently on every chain and returns the results keyed by
+        chain ID. ``func`` is called with the ``Web3`` instance of the chain and the
+        values of ``kwargs`` for the chain as keyword arguments, e.g.,
+        ``manager.run(lambda web3, token: ERC20Token(web3, token).symbol, token=...)``.
+
+        :param func: The function to call on each chain.
+        :type func: Callable
+        :param chain_ids: The chains on which to call ``func``. If not provided, it is
+            called on every chain.
+        :type chain_ids: Iterable[int], optional
+        :param return_exceptions: Whether an exception raised on a chain is returned as
+            the result of the chain instead of being raised after all chains have
+            finished.
+        :type return_exceptions: bool, optional
+        :param kwargs: The keyword arguments of ``func`` keyed by chain ID. Chains
+            missing from any of them are skipped.
+        :type kwargs: Dict[int, Any]
+
+        :return: The results keyed by chain ID.
+        :rtype: Dict[int, Any]
+        """
+        if chain_ids is None:
+            chain_ids = self.web3s
+        chain_ids = [
+            chain_id
+            for chain_id in chain_ids
+            if all(chain_id in values for values in kwargs.values())
+        ]
+        futures = {
+            chain_id: self._executor.submit(
+                func,
+                self.web3s[chain_id],
+                **{name: values[chain_id] for name, values in kwargs.items()},
+            )
+            for chain_id in chain_ids
+        }
+        results = {}
+        for chain_id, future in futures.items():
+            error = future.exception()
+            if error is None:
+                results[chain_id] = future.result()
+            elif return_exceptions:
+                results[chain_id] = error
+            else:
+                raise error
+        return results
+
+    def discover(
+        self, tokens: Dict[int, Iterable[str]], fees: Iterable[int] = FEES
+    ) -> Dict[int, List[Pool]]:
+        """
+        Finds the Uniswap V2 pairs and Uniswap V3 pools between every two of the given
+        tokens on each chain and adds them to ``pools``. The factories are queried in
+        one batched call per chain using ``Multicall3``. Uniswap versions that are not
+        deployed on a chain are skipped.
+
+        :param tokens: The addresses of the tokens keyed by chain ID.
+        :type tokens: Dict[int, Iterable[str]]
+        :param fees: The fee tiers of the Uniswap V3 pools to look for.
+        :type fees: Iterable[int], optional
+
+        :return: The pairs and pools found on each chain, keyed by chain ID.
+        :rtype: Dict[int, List[Union[``UniswapV2Pair``, ``UniswapV3Pool``]]]
+        """
+        fees = list(fees)
+
+        def discover(web3: Web3, tokens: Iterable[str]) -> List[Pool]:
+            chain_id = str(get_chain_id(web3))
+            tokens = [web3.to_checksum_address(token) for token in tokens]
+            v2_factory = (
+                UniswapV2Factory(web3) if chain_id in UNISWAP_V2_CONFIG else None
+            )
+            v3_factory = (
+                UniswapV3Factory(web3) if chain_id in UNISWAP_V3_CONFIG else None
+            )
+            calls, classes = [], []
+            for token_a, token_b in itertools.combinations(tokens, 2):
+                if v2_factory is not None:
+                    calls.append(
+                        v2_factory.contract.functions.getPair(token_a, token_b)
+                    )
+                    classes.append(UniswapV2Pair)
+                if v3_factory is not None:
+                    for fee in fees:
+                        calls.append(
+                            v3_factory.contract.functions.getPool(token_a, token_b, fee)
+                        )
+                        classes.append(UniswapV3Pool)
+            addresses = Multicall3(web3).aggregate(calls)
+            return [
+                cls(web3, address)
+                for cls, address in zip(classes, addresses)
+                if address not in (None, NULL_ADDRESS)
+            ]
+
+        results = self.run(discover, tokens=tokens)
+        for chain_id, pools in results.items():
+            known = set(self.pools[chain_id])
+            self.pools[chain_id] += [pool for pool in pools if pool not in known]
+        return results
+
+    def sync(
+        self, block_identifiers: Optional[Dict[int, BlockIdentifier]] = None
+    ) -> Dict[int, int]:
+        """
+        Reads the state of the pools in ``pools`` on every chain concurrently, in one
+        batched call per chain using ``Multicall3``, and caches it in the pair and pool
+        instances as if ``sync`` had been called for each of them. The pools whose state
+        cannot be read are stored in ``failed`` and keep their previous state.
+
+        :param block_identifiers: The block at which the state is read, keyed by chain
+            ID. By default, the latest block of each chain is used.
+        :type block_identifiers: Dict[int, ``BlockIdentifier``], optional
+
+        :return: The block at which the state was read, keyed by chain ID.
+        :rtype: Dict[int, int]
+        """
+        if block_identifiers is None:
+            block_identifiers = {chain_id: "latest" for chain_id in self.web3s}
+
+        def sync(web3: Web3, pools: List[Pool], block_identifier) -> int:
+            if block_identifier == "latest":
+                block_identifier = web3.eth.block_number
+            calls = []
+            for pool in pools:
+                if isinstance(pool, UniswapV2Pair):
+                    calls.append(pool.contract.functions.getReserves())
+                else:
+                    calls.append(pool.contract.functions.slot0())
+                    calls.append(pool.contract.functions.liquidity())
+            outputs = iter(Multicall3(web3).aggregate(calls, block_identifier))
+            failed = []
+            for pool in pools:
+                if isinstance(pool, UniswapV2Pair):
+                    reserves = next(outputs)
+                    if reserves is None:
+                        failed.append(pool)
+                        continue
+                    pool.reserve_0, pool.reserve_1, _ = reserves
+                else:
+                    slot0, liquidity = next(outputs), next(outputs)
+                    if slot0 is None or liquidity is None:
+                        failed.append(pool)
+                        continue
+                    pool.sqrt_price_x96, pool.tick = slot0[0], slot0[1]
+                    pool.liquidity = liquidity
+                pool.block_number = block_identifier
+            self.failed[get_chain_id(web3)] = failed
+            return block_identifier
+
+        return self.run(sync, pools=self.pools, block_identifier=block_identifiers)
+
+    def quote(
+        self,
+        amount_in: Dict[int, Decimal],
+        token_in: Dict[int, str],
+        token_out: Dict[int, str],
+    ) -> Dict[int, Tuple[Pool, Decimal]]:
+        """
+        Finds the pair or pool in ``pools`` that gives the most output tokens for
+        swapping ``amount_in`` of ``token_in`` for ``token_out`` on each chain. The
+        quotes are computed locally from the cached state with ``get_amount_out``, so
+        the state should be read with ``sync`` first. Pairs and pools whose state has
+        not been read or could not be read by the last ``sync`` are not quoted. Chains
+        without a quotable pair or pool for the tokens are not included in the results.
+
+        :param amount_in: The amount of input tokens keyed by chain ID.
+        :type amount_in: Dict[int, ``Decimal``]
+        :param token_in: The address of the input token keyed by chain ID.
+        :type token_in: Dict[int, str]
+        :param token_out: The address of the output token keyed by chain ID.
+        :type token_out: Dict[int, str]
+
+        :return: The best pair or pool and the amount of output tokens, keyed by chain
+            ID.
+        :rtype: Dict[int, Tuple[Union[``UniswapV2Pair``, ``UniswapV3Pool``],
+            ``Decimal``]]
+        """
+
+        def quote(web3: Web3, pools: List[Pool], amount_in, token_in, token_out):
+            tokens = {
+                web3.to_checksum_address(token_in),
+                web3.to_checksum_address(token_out),
+            }
+            # ``get_amount_out`` would read the state of these pools again
+            failed = set(self.failed[get_chain_id(web3)])
+            quotes = [
+                (pool, pool.get_amount_out(amount_in, token_in))
+                for pool in pools
+                if pool.block_number is not None
+                and pool not in failed
+                and {pool.token_0.address, pool.token_1.address} == tokens
+            ]
+            return max(quotes, key=lambda quote: quote[1], default=None)
+
+        results = self.run(
+            quote,
+            pools=self.pools,
+            amount_in=amount_in,
+            token_in=token_in,
+            token_out=token_out,
+        )
+        return {
+            chain_id: result
+            for chain_id, result in results.items()
+            if result is not None
+        }
+
+    def close(self) -> None:
+        """
+        Shuts down the threads used to run work on the chains.
+        """
+        self._executor.shutdown()
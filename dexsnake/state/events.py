@@ -0,0 +1,233 @@
+import functools
+import os
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from web3 import Web3
+
+from ..utils.abi import load_abi
+
+_PACKAGE = os.path.dirname(os.path.dirname(__file__))
+
+# The decoded events keyed by name, and the ABI file and event name of each
+_SOURCES = {
+    "UniswapV2Pair.Sync": ("uniswap_v2/abi/UniswapV2Pair.json", "Sync"),
+    "UniswapV2Pair.Swap": ("uniswap_v2/abi/UniswapV2Pair.json", "Swap"),
+    "UniswapV2Factory.PairCreated": (
+        "uniswap_v2/abi/UniswapV2Factory.json",
+        "PairCreated",
+    ),
+    "UniswapV3Pool.Swap": ("uniswap_v3/abi/UniswapV3Pool.json", "Swap"),
+    "UniswapV3Pool.Mint": ("uniswap_v3/abi/UniswapV3Pool.json", "Mint"),
+    "UniswapV3Pool.Burn": ("uniswap_v3/abi/UniswapV3Pool.json", "Burn"),
+    "UniswapV3Factory.PoolCreated": (
+        "uniswap_v3/abi/UniswapV3Factory.json",
+        "PoolCreated",
+    ),
+}
+
+
+class Field(NamedTuple):
+    name: str
+    type: str
+    indexed: bool
+    start: int  # byte offset in the topic or the data
+    end: int
+    topic: int  # index in the topics of an indexed field
+
+
+class Layout(NamedTuple):
+    name: str
+    topic: bytes
+    n_topics: int
+    data_size: int
+    fields: Tuple[Field, ...]
+
+
+def _layout(name: str, path: str, event: str) -> Layout:
+    # Every argument of the decoded events is a static type that takes one 32-byte
+    # word, so each one is at a fixed offset in the topics or the data
+    abi = load_abi(os.path.join(_PACKAGE, path))
+    entry = next(e for e in abi if e["type"] == "event" and e["name"] == event)
+    types = [argument["type"] for argument in entry["inputs"]]
+    fields, n_topics, data_size = [], 1, 0
+    for i, argument in enumerate(entry["inputs"]):
+        field_name = argument["name"] or f"arg{i}"
+        # Addresses are the last 20 bytes of their word
+        start = 12 if argument["type"] == "address" else 0
+        if argument["indexed"]:
+            fields.append(
+                Field(field_name, argument["type"], True, start, 32, n_topics)
+            )
+            n_topics += 1
+        else:
+            fields.append(
+                Field(
+                    field_name,
+                    argument["type"],
+                    False,
+                    data_size + start,
+                    data_size + 32,
+                    0,
+                )
+            )
+            data_size += 32
+    topic = Web3.keccak(text=f"{event}({','.join(types)})")
+    return Layout(name, bytes(topic), n_topics, data_size, tuple(fields))
+
+
+EVENTS: Dict[str, Layout] = {
+    name: _layout(name, path, event) for name, (path, event) in _SOURCES.items()
+}
+
+# The Uniswap V2 and V3 ``Swap`` events have different signatures, so every topic
+# identifies one event
+TOPICS: Dict[bytes, Layout] = {layout.topic: layout for layout in EVENTS.values()}
+
+
+@functools.lru_cache(maxsize=65536)
+def _checksum(address: bytes) -> str:
+    return Web3.to_checksum_address("0x" + address.hex())
+
+
+def _to_bytes(value: Any) -> bytes:
+    # Raw JSON-RPC logs contain hex strings and web3.py logs contain ``HexBytes``
+    if isinstance(value, str):
+        return bytes.fromhex(value[2:] if value.startswith("0x") else value)
+    return bytes(value)
+
+
+def _to_int(value: Any) -> int:
+    return int(value, 16) if isinstance(value, str) else int(value)
+
+
+def _decode_field(field: Field, word: bytes) -> Any:
+    if field.type == "address":
+        return _checksum(word[field.start : field.end])
+    return int.from_bytes(
+        word[field.start : field.end], "big", signed=field.type.startswith("int")
+    )
+
+
+def decode_log(log: Any) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """
+    Decodes a Uniswap V2 ``Sync``, ``Swap``, or ``PairCreated`` event or a Uniswap V3
+    ``Swap``, ``Mint``, ``Burn``, or ``PoolCreated`` event by slicing the topics and the
+    data at the fixed offsets of the event's arguments, which is much faster than
+    decoding the log with ``contract.events.<name>().process_log``. Unnamed arguments
+    are named by their position, e.g., the last argument of ``PairCreated`` is
+    ``arg3``.
+
+    :param log: The log, as returned by ``web3.eth.get_logs`` or by the
+        ``eth_getLogs`` JSON-RPC method.
+    :type log: ``LogReceipt``
+
+    :return: The name of the event, e.g., ``"UniswapV3Pool.Swap"``, and its arguments,
+        or ``None`` if the log is not one of the events or is malformed.
+    :rtype: Tuple[str, Dict[str, Any]]
+    """
+    topics = log["topics"]
+    if not topics:
+        return None
+    layout = TOPICS.get(_to_bytes(topics[0]))
+    if layout is None or len(topics) != layout.n_topics:
+        return None
+    data = _to_bytes(log["data"])
+    if len(data) != layout.data_size:
+        return None
+    args = {}
+    for field in layout.fields:
+        word = _to_bytes(topics[field.topic]) if field.indexed else data
+        args[field.name] = _decode_field(field, word)
+    return layout.name, args
+
+
+def _column(field: Field, words: List[bytes], matrix: np.ndarray) -> np.ndarray:
+    if field.type == "address":
+        return np.array(
+            [_checksum(word[field.start : field.end]) for word in words], dtype=object
+        )
+    signed = field.type.startswith("int")
+    bits = int(field.type[3:] if signed else field.type[4:])
+    if bits <= 64:
+        # Signed values are sign-extended to 32 bytes, so the last 8 bytes hold the
+        # value as a 64-bit integer in two's complement
+        column = matrix[:, field.end - 8 : field.end].copy()
+        return (
+            column.view(">i8" if signed else ">u8")
+            .ravel()
+            .astype(np.int64 if signed else np.uint64)
+        )
+    return np.array(
+        [
+            int.from_bytes(word[field.start : field.end], "big", signed=signed)
+            for word in words
+        ],
+        dtype=object,
+    )
+
+
+def decode_logs(logs: Iterable[Any]) -> Dict[str, Dict[str, np.ndarray]]:
+    """
+    Decodes many logs with the fixed-offset layouts used by ``decode_log`` into one
+    array per event argument. Integers that fit in 64 bits are returned as ``int64``
+    or ``uint64`` arrays, and wider integers and addresses as arrays of Python integers
+    and checksum addresses. Logs that are not one of the events are skipped.
+
+    Besides the arguments, the arrays of each event contain ``index``, the position of
+    each log in ``logs``, which can be used to restore the order of logs across
+    events, and ``address``, ``block_number``, and ``log_index``.
+
+    :param logs: The logs, as returned by ``web3.eth.get_logs`` or by the
+        ``eth_getLogs`` JSON-RPC method.
+    :type logs: Iterable[``LogReceipt``]
+
+    :return: The arrays keyed by argument name, keyed by event name. Events without
+        logs are not included.
+    :rtype: Dict[str, Dict[str, ``np.ndarray``]]
+    """
+    groups: Dict[bytes, List[Tuple[int, Any, List[bytes], bytes]]] = {}
+    for i, log in enumerate(logs):
+        topics = log["topics"]
+        if not topics:
+            continue
+        topics = [_to_bytes(topic) for topic in topics]
+        layout = TOPICS.get(topics[0])
+        if layout is None or len(topics) != layout.n_topics:
+            continue
+        data = _to_bytes(log["data"])
+        if len(data) != layout.data_size:
+            continue
+        groups.setdefault(layout.topic, []).append((i, log, topics, data))
+    results = {}
+    for topic, group in groups.items():
+        layout = TOPICS[topic]
+        datas = [data for _, _, _, data in group]
+        data_matrix = np.frombuffer(b"".join(datas), dtype=np.uint8).reshape(
+            len(group), layout.data_size
+        )
+        arrays = {
+            "index": np.array([i for i, _, _, _ in group], dtype=np.int64),
+            "address": np.array(
+                [_checksum(_to_bytes(log["address"])) for _, log, _, _ in group],
+                dtype=object,
+            ),
+            "block_number": np.array(
+                [_to_int(log["blockNumber"]) for _, log, _, _ in group],
+                dtype=np.int64,
+            ),
+            "log_index": np.array(
+                [_to_int(log["logIndex"]) for _, log, _, _ in group], dtype=np.int64
+            ),
+        }
+        for field in layout.fields:
+            if field.indexed:
+                words = [topics[field.topic] for _, _, topics, _ in group]
+                matrix = np.frombuffer(b"".join(words), dtype=np.uint8).reshape(
+                    len(group), 32
+                )
+            else:
+                words, matrix = datas, data_matrix
+            arrays[field.name] = _column(field, words, matrix)
+        results[layout.name] = arrays
+    return results
@@ -0,0 +1,295 @@
+import logging
+import multiprocessing
+import time
+from multiprocessing.process import BaseProcess
+from multiprocessing.shared_memory import SharedMemory
+from multiprocessing.synchronize import Event
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from web3 import Web3
+
+from ..uniswap_v2.pair import UniswapV2Pair
+from ..uniswap_v3.pool import UniswapV3Pool
+from ..utils.erc20_token import ERC20Token
+from .table import COLUMNS, Pool, PoolStateTable
+
+# The columns that change when the state of a pool changes. The other columns are
+# written once by the parent process.
+STATE_COLUMNS = (
+    "reserve_0",
+    "reserve_1",
+    "sqrt_price_x96",
+    "liquidity",
+    "block_number",
+)
+
+logger = logging.getLogger("dexsnake.state")
+
+
+def _attach(
+    name: str, shape: Tuple[int, ...], dtype: type
+) -> Tuple[SharedMemory, np.ndarray]:
+    memory = SharedMemory(name=name)
+    return memory, np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+
+
+def _run_shard(
+    shard: int,
+    endpoint_uri: str,
+    pools: List[Tuple[int, int, str, str, str, int, int, int]],
+    memory_names: Dict[str, str],
+    n_pools: int,
+    n_shards: int,
+    poll_interval: float,
+    stop: Event,
+) -> None:
+    # Runs in a worker process that owns the state of the pools in one shard
+    web3 = Web3(Web3.HTTPProvider(endpoint_uri))
+    instances = []
+    for _, version, address, token_0, token_1, decimals_0, decimals_1, fee in pools:
+        if version == 2:
+            pool = UniswapV2Pair(web3, address)
+        else:
+            pool = UniswapV3Pool(web3, address)
+            pool._fee = fee
+        pool._token_0 = ERC20Token(web3, token_0)
+        pool._token_1 = ERC20Token(web3, token_1)
+        pool._token_0._decimals = decimals_0
+        pool._token_1._decimals = decimals_1
+        instances.append(pool)
+    table = PoolStateTable(web3, instances)  # no RPC calls as the metadata is known
+    ids = np.array([pool[0] for pool in pools], dtype=np.int64)
+    memories, columns = [], {}
+    for name in STATE_COLUMNS:
+        memory, columns[name] = _attach(memory_names[name], (n_pools,), COLUMNS[name])
+        memories.append(memory)
+    memory, shard_block = _attach(memory_names["shard_block"], (n_shards,), np.int64)
+    memories.append(memory)
+    try:
+        while not stop.is_set():
+            try:
+                # Pools whose state could not be read are left out, so that they
+                # do not keep the shard from catching up
+                unread = table.block_number < 0
+                unread[list(table.failed)] = False
+                if unread.any():
+                    table.refresh(np.flatnonzero(unread))
+                    read = table.block_number >= 0
+                    block_number = (
+                        int(table.block_number[read].min()) if read.any() else -1
+                    )
+                else:
+                    block_number = table.catch_up()
+            except Exception:
+                logger.exception("Failed to update shard %d", shard)
+            else:
+                # The block numbers are written last so that a pool's state is
+                # complete when its block number changes
+                for name in STATE_COLUMNS:
+                    columns[name][ids] = getattr(table, name)
+                shard_block[shard] = block_number
+            stop.wait(poll_interval)
+    finally:
+        del columns, shard_block
+        for memory in memories:
+            memory.close()
+
+
+class ShardedPoolStateTracker:
+    def __init__(
+        self,
+        web3: Web3,
+        pools: Iterable[Pool],
+        n_shards: Optional[int] = None,
+        endpoint_uri: Optional[str] = None,
+        poll_interval: float = 1.0,
+    ):
+        """
+        Initializes a new instance of the ``ShardedPoolStateTracker`` class.
+
+        The tracker keeps the state of many Uniswap V2 pairs and Uniswap V3 pools up to
+        date using several processes, so that decoding and applying events is not
+        limited to one CPU core. The pools are partitioned into ``n_shards`` shards by
+        their address, and each shard is tracked by a worker process that reads the
+        state of its pools, polls the node for their events, and applies them with
+        ``PoolStateTable.catch_up``. The workers write the state into shared memory,
+        which backs the columns of ``table``. Therefore, ``table`` can be queried in
+        this process with ``prices``, ``filter``, and ``top`` like any other
+        ``PoolStateTable`` without copying the state between processes.
+
+        The state is stored only in the columns of ``table``; the attributes of the
+        ``UniswapV2Pair`` and ``UniswapV3Pool`` instances in this process are not
+        updated. Because the shards are updated independently, ``block_number`` may
+        differ between pools. Pools whose state cannot be read keep a ``block_number``
+        of -1 and do not hold up the other pools.
+
+        The tokens, token decimals, and fees of the pools are read in this process
+        when the tracker is initialized. The workers are started with ``start`` and
+        stopped with ``stop``, or by using the tracker as a context manager. The
+        ``numpy`` package is required to use this class.
+
+        :param web3: A ``Web3`` instance connected to a blockchain node.
+        :type web3: ``Web3``
+        :param pools: The ``UniswapV2Pair`` and ``UniswapV3Pool`` instances to track.
+        :type pools: Iterable[Union[``UniswapV2Pair``, ``UniswapV3Pool``]]
+        :param n_shards: The number of worker processes. If not provided, the number of
+            CPU cores is used.
+        :type n_shards: int, optional
+        :param endpoint_uri: The URI of the HTTP endpoint used by the workers. If not
+            provided, the endpoint of ``web3`` is used.
+        :type endpoint_uri: str, optional
+        :param poll_interval: The number of seconds between polls for new events.
+        :type poll_interval: float, optional
+        """
+        if endpoint_uri is None:
+            endpoint_uri = getattr(web3.provider, "endpoint_uri", None)
+            if endpoint_uri is None:
+                raise ValueError(
+                    "endpoint_uri must be provided if web3 does not use an HTTP "
+                    "provider"
+                )
+        self.endpoint_uri: str = endpoint_uri
+        self.n_shards: int = n_shards or multiprocessing.cpu_count()
+        self.poll_interval: float = poll_interval
+        self.table: PoolStateTable = PoolStateTable(web3, pools)
+        self._memories: Dict[str, SharedMemory] = {}
+        for name in STATE_COLUMNS:
+            column = getattr(self.table, name)
+            memory = SharedMemory(create=True, size=max(column.nbytes, 1))
+            shared = np.ndarray(column.shape, dtype=column.dtype, buffer=memory.buf)
+            shared[:] = column
+            setattr(self.table, name, shared)
+            self._memories[name] = memory
+        memory = SharedMemory(create=True, size=self.n_shards * 8)
+        self._shard_block = np.ndarray(
+            (self.n_shards,), dtype=np.int64, buffer=memory.buf
+        )
+        self._shard_block[:] = -1
+        self._memories["shard_block"] = memory
+        # The shard of a pool depends only on its address, so a pool is always
+        # tracked by the same worker
+        self.shards: np.ndarray = np.array(
+            [int(pool.address, 16) % self.n_shards for pool in self.table.pools],
+            dtype=np.int64,
+        )
+        self._context = multiprocessing.get_context("spawn")
+        self._stop = self._context.Event()
+        self._processes: List[BaseProcess] = []
+
+    def __enter__(self) -> "ShardedPoolStateTracker":
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    @property
+    def block_number(self) -> int:
+        """
+        Returns the block up to which the state of every shard is up to date.
+
+        :return: The block number, or -1 if the state of a shard has not been read.
+        :rtype: int
+        """
+        return int(self._shard_block.min())
+
+    def start(self) -> None:
+        """
+        Starts the worker processes.
+        """
+        if self._processes:
+            raise RuntimeError("The tracker has already been started")
+        self._stop.clear()
+        table = self.table
+        memory_names = {name: memory.name for name, memory in self._memories.items()}
+        for shard in range(self.n_shards):
+            pools = [
+                (
+                    int(i),
+                    int(table.version[i]),
+                    table.pools[i].address,
+                    table.tokens[table.token_0[i]].address,
+                    table.tokens[table.token_1[i]].address,
+                    int(table.decimals_0[i]),
+                    int(table.decimals_1[i]),
+                    int(table.fee[i]),
+                )
+                for i in np.flatnonzero(self.shards == shard)
+            ]
+            if not pools:
+                self._shard_block[shard] = np.iinfo(np.int64).max
+                continue
+            process = self._context.Process(
+                target=_run_shard,
+                args=(
+                    shard,
+                    self.endpoint_uri,
+                    pools,
+                    memory_names,
+                    len(table),
+                    self.n_shards,
+                    self.poll_interval,
+                    self._stop,
+                ),
+                daemon=True,
+            )
+            process.start()
+            self._processes.append(process)
+
+    def wait(self, block_number: int = 0, timeout: Optional[float] = None) -> int:
+        """
+        Waits until the state of every shard is up to date at least up to
+        ``block_number``.
+
+        :param block_number: The block number. By default, waits until the state of
+            every shard has been read.
+        :type block_number: int, optional
+        :param timeout: The maximum number of seconds to wait. If not provided, waits
+            indefinitely.
+        :type timeout: float, optional
+
+        :return: The block up to which the state of every shard is up to date.
+        :rtype: int
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.block_number < block_number:
+            if not any(process.is_alive() for process in self._processes):
+                raise RuntimeError("The tracker is not running")
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(
+                    f"The state did not reach block {block_number} in {timeout} seconds"
+                )
+            time.sleep(min(0.05, self.poll_interval))
+        return self.block_number
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """
+        Stops the worker processes. The state remains readable until ``close`` is
+        called.
+
+        :param timeout: The number of seconds to wait for each worker to exit before
+            terminating it.
+        :type timeout: float, optional
+        """
+        self._stop.set()
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self._processes = []
+
+    def close(self) -> None:
+        """
+        Stops the worker processes and frees the shared memory. The columns of
+        ``table`` are copied out of the shared memory, so ``table`` stays usable.
+        """
+        self.stop()
+        for name in STATE_COLUMNS:
+            setattr(self.table, name, getattr(self.table, name).copy())
+        self._shard_block = self._shard_block.copy()
+        for memory in self._memories.values():
+            memory.close()
+            memory.unlink()
+        self._memories = {}
@@ -0,0 +1,191 @@
+import json
+import os
+import shutil
+from typing import List
+
+import numpy as np
+from web3 import Web3
+
+from ..uniswap_v2.pair import UniswapV2Pair
+from ..uniswap_v3.pool import UniswapV3Pool
+from ..utils.erc20_token import ERC20Token
+from ..utils.registry import get_chain_id
+from .table import COLUMNS, PoolStateTable
+
+SNAPSHOT_VERSION = 1
+
+
+def _to_bytes(values: List[int], length: int, signed: bool = False) -> np.ndarray:
+    # NumPy has no integer types wide enough for uint160 prices and int128 liquidity,
+    # so they are stored as big-endian byte strings
+    return np.frombuffer(
+        b"".join(v.to_bytes(length, "big", signed=signed) for v in values),
+        dtype=np.uint8,
+    ).reshape(len(values), length)
+
+
+def _from_bytes(array: np.ndarray, signed: bool = False) -> List[int]:
+    return [int.from_bytes(row.tobytes(), "big", signed=signed) for row in array]
+
+
+def save_snapshot(table: PoolStateTable, path: str) -> None:
+    """
+    Saves the state in ``table`` to the directory ``path``, replacing any existing
+    snapshot there. The snapshot contains the columns of the table, the exact state of
+    every pool, the tick maps of Uniswap V3 pools, and the name, symbol, and decimals of
+    the tokens. Each array is stored in its own ``.npy`` file so that it can be
+    memory-mapped when the snapshot is loaded.
+
+    :param table: The table to save.
+    :type table: ``PoolStateTable``
+    :param path: The path of the snapshot directory.
+    :type path: str
+    """
+    # The snapshot is written to a sibling directory and moved into place, so that an
+    # interrupted save leaves an existing snapshot intact and the memory-mapped files
+    # of a table loaded from it are not overwritten
+    path = os.path.normpath(path)
+    directory = f"{path}.tmp"
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+    for name in COLUMNS:
+        np.save(os.path.join(directory, f"{name}.npy"), getattr(table, name))
+    # Uniswap V2 pairs store their reserves and Uniswap V3 pools store their price and
+    # liquidity in the two state arrays
+    state_0, state_1, ticks = [], [], []
+    tick_map_pool, tick_map_tick, tick_map_liquidity_net = [], [], []
+    for i, pool in enumerate(table.pools):
+        if isinstance(pool, UniswapV2Pair):
+            state_0.append(pool.reserve_0 or 0)
+            state_1.append(pool.reserve_1 or 0)
+            ticks.append(0)
+        else:
+            state_0.append(pool.sqrt_price_x96 or 0)
+            state_1.append(pool.liquidity or 0)
+            ticks.append(pool.tick or 0)
+            for tick, liquidity_net in (pool.liquidity_net or {}).items():
+                tick_map_pool.append(i)
+                tick_map_tick.append(tick)
+                tick_map_liquidity_net.append(liquidity_net)
+    np.save(os.path.join(directory, "state_0.npy"), _to_bytes(state_0, 32))
+    np.save(os.path.join(directory, "state_1.npy"), _to_bytes(state_1, 32))
+    np.save(os.path.join(directory, "tick.npy"), np.array(ticks, dtype=np.int32))
+    np.save(
+        os.path.join(directory, "tick_map_pool.npy"),
+        np.array(tick_map_pool, dtype=np.int32),
+    )
+    np.save(
+        os.path.join(directory, "tick_map_tick.npy"),
+        np.array(tick_map_tick, dtype=np.int32),
+    )
+    np.save(
+        os.path.join(directory, "tick_map_liquidity_net.npy"),
+        _to_bytes(tick_map_liquidity_net, 16, signed=True),
+    )
+    read = table.block_number >= 0
+    meta = {
+        "version": SNAPSHOT_VERSION,
+        "chain_id": get_chain_id(table.web3),
+        "block_number": int(table.block_number[read].min()) if read.any() else None,
+        "pools": [pool.address for pool in table.pools],
+        "pools_with_tick_map": [
+            pool.address
+            for pool in table.pools
+            if isinstance(pool, UniswapV3Pool) and pool.liquidity_net is not None
+        ],
+        "tokens": [
+            {
+                "address": token.address,
+                "name": token._name,
+                "symbol": token._symbol,
+                "decimals": token._decimals,
+            }
+            for token in table.tokens
+        ],
+    }
+    with open(os.path.join(directory, "meta.json"), "w") as file:
+        json.dump(meta, file)
+    if os.path.exists(path):
+        # Directories cannot be replaced atomically, so the old snapshot is moved aside
+        # first and only deleted once the new one is in place
+        old_directory = f"{path}.old"
+        shutil.rmtree(old_directory, ignore_errors=True)
+        os.replace(path, old_directory)
+        os.replace(directory, path)
+        shutil.rmtree(old_directory, ignore_errors=True)
+    else:
+        os.replace(directory, path)
+
+
+def load_snapshot(web3: Web3, path: str, catch_up: bool = True) -> PoolStateTable:
+    """
+    Loads a snapshot saved with ``save_snapshot`` without reading anything from the
+    node apart from the chain ID. The columns are memory-mapped copy-on-write, so the
+    snapshot files are never modified. By default, the state is then brought up to
+    date with ``PoolStateTable.catch_up``, which only fetches the events emitted since
+    the snapshot was taken.
+
+    :param web3: A ``Web3`` instance connected to a blockchain node.
+    :type web3: ``Web3``
+    :param path: The path of the snapshot directory.
+    :type path: str
+    :param catch_up: Whether to bring the state up to date.
+    :type catch_up: bool, optional
+
+    :return: The table.
+    :rtype: ``PoolStateTable``
+    """
+    with open(os.path.join(path, "meta.json"), "r") as file:
+        meta = json.load(file)
+    if meta["version"] != SNAPSHOT_VERSION:
+        raise ValueError(
+            f"Unsupported snapshot version {meta['version']} (expected "
+            f"{SNAPSHOT_VERSION})"
+        )
+    if meta["chain_id"] != get_chain_id(web3):
+        raise ValueError(
+            f"The snapshot is from a different chain (chain ID = {meta['chain_id']})"
+        )
+
+    def load(name):
+        return np.load(os.path.join(path, f"{name}.npy"), mmap_mode="c")
+
+    table = PoolStateTable(web3)
+    for name in COLUMNS:
+        setattr(table, name, load(name))
+    for token_meta in meta["tokens"]:
+        token = ERC20Token(web3, token_meta["address"])
+        for key in ("name", "symbol", "decimals"):
+            if getattr(token, f"_{key}") is None:
+                setattr(token, f"_{key}", token_meta[key])
+        table._token_ids[token.address] = len(table.tokens)
+        table.tokens.append(token)
+    state_0, state_1 = _from_bytes(load("state_0")), _from_bytes(load("state_1"))
+    ticks = load("tick")
+    for i, address in enumerate(meta["pools"]):
+        if table.version[i] == 2:
+            pool = UniswapV2Pair(web3, address)
+        else:
+            pool = UniswapV3Pool(web3, address)
+            pool._fee = int(table.fee[i])
+        pool._token_0 = table.tokens[table.token_0[i]]
+        pool._token_1 = table.tokens[table.token_1[i]]
+        if table.block_number[i] >= 0:
+            if isinstance(pool, UniswapV2Pair):
+                pool.reserve_0, pool.reserve_1 = state_0[i], state_1[i]
+            else:
+                pool.sqrt_price_x96, pool.liquidity = state_0[i], state_1[i]
+                pool.tick = int(ticks[i])
+            pool.block_number = int(table.block_number[i])
+        table._pool_ids[pool.address] = i
+        table.pools.append(pool)
+    for address in meta["pools_with_tick_map"]:
+        table.pools[table._pool_ids[address]].liquidity_net = {}
+    liquidity_nets = _from_bytes(load("tick_map_liquidity_net"), signed=True)
+    for i, tick, liquidity_net in zip(
+        load("tick_map_pool"), load("tick_map_tick"), liquidity_nets
+    ):
+        table.pools[i].liquidity_net[int(tick)] = liquidity_net
+    if catch_up:
+        table.catch_up()
+    return table
@@ -0,0 +1,485 @@
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Union
+
+import numpy as np
+from web3 import Web3
+from web3.types import BlockIdentifier
+
+from ..uniswap_v2.pair import UniswapV2Pair
+from ..uniswap_v3.pool import UniswapV3Pool
+from ..utils.erc20_token import ERC20Token
+from ..utils.multicall import Multicall3
+from .events import EVENTS
+
+Pool = Union[UniswapV2Pair, UniswapV3Pool]
+
+SYNC_TOPIC = EVENTS["UniswapV2Pair.Sync"].topic
+SWAP_V3_TOPIC = EVENTS["UniswapV3Pool.Swap"].topic
+MINT_V3_TOPIC = EVENTS["UniswapV3Pool.Mint"].topic
+BURN_V3_TOPIC = EVENTS["UniswapV3Pool.Burn"].topic
+
+COLUMNS = {
+    "version": np.uint8,  # 2 for Uniswap V2 pairs and 3 for Uniswap V3 pools
+    "token_0": np.int32,  # index in ``PoolStateTable.tokens``
+    "token_1": np.int32,
+    "decimals_0": np.uint8,
+    "decimals_1": np.uint8,
+    "fee": np.uint32,
+    "reserve_0": np.float64,
+    "reserve_1": np.float64,
+    "sqrt_price_x96": np.float64,
+    "liquidity": np.float64,
+    "block_number": np.int64,
+}
+
+
+class PoolStateTable:
+    def __init__(self, web3: Web3, pools: Iterable[Pool] = ()):
+        """
+        Initializes a new instance of the ``PoolStateTable`` class.
+
+        The table stores the state of many Uniswap V2 pairs and Uniswap V3 pools in
+        NumPy arrays with one element per pool, so that prices can be computed and pools
+        can be filtered and ranked over the whole table at once. The pool with ID ``i``
+        is ``pools[i]`` and its state is ``reserve_0[i]``, ``reserve_1[i]``, etc.
+
+        The amounts are stored as floating-point numbers in the smallest unit of each
+        token. For Uniswap V2 pairs, ``sqrt_price_x96`` and ``liquidity`` are derived
+        from the reserves, and for Uniswap V3 pools, ``reserve_0`` and ``reserve_1`` are
+        the virtual reserves of the current tick range. Therefore, ``liquidity`` is the
+        geometric mean of the reserves for both kinds of pools. ``block_number`` is -1
+        for pools whose state has not been read.
+
+        The ``numpy`` package is required to use this class.
+
+        :param web3: A ``Web3`` instance connected to a blockchain node.
+        :type web3: ``Web3``
+        :param pools: The ``UniswapV2Pair`` and ``UniswapV3Pool`` instances to add.
+        :type pools: Iterable[Union[``UniswapV2Pair``, ``UniswapV3Pool``]], optional
+        """
+        self.web3: Web3 = web3
+        self.multicall: Multicall3 = Multicall3(web3)
+        self.pools: List[Pool] = []
+        self.tokens: List[ERC20Token] = []
+        self._pool_ids: Dict[str, int] = {}
+        self._token_ids: Dict[str, int] = {}
+        # The IDs of the pools whose state could not be read by the last ``refresh``
+        self.failed: Set[int] = set()
+        for name, dtype in COLUMNS.items():
+            setattr(self, name, np.zeros(0, dtype=dtype))
+        self.add(pools)
+
+    def __len__(self) -> int:
+        return len(self.pools)
+
+    def pool_id(self, address: str) -> int:
+        """
+        Returns the ID of the pool at ``address``.
+
+        :param address: The address of the pool.
+        :type address: str
+
+        :return: The ID of the pool.
+        :rtype: int
+        """
+        return self._pool_ids[self.web3.to_checksum_address(address)]
+
+    def token_id(self, address: str) -> int:
+        """
+        Returns the ID of the token at ``address``.
+
+        :param address: The address of the token.
+        :type address: str
+
+        :return: The ID of the token.
+        :rtype: int
+        """
+        return self._token_ids[self.web3.to_checksum_address(address)]
+
+    def add(self, pools: Iterable[Pool]) -> None:
+        """
+        Adds pools to the table. Their tokens, token decimals, and fees are read in
+        batches using ``Multicall3`` unless already cached. Pools that are already in
+        the table are skipped, as are pools whose tokens, token decimals, or fee cannot
+        be read, e.g., because they are not pools. The state of the added pools is not
+        read; use ``refresh`` for that.
+
+        :param pools: The ``UniswapV2Pair`` and ``UniswapV3Pool`` instances to add.
+        :type pools: Iterable[Union[``UniswapV2Pair``, ``UniswapV3Pool``]]
+        """
+        pools = [
+            pool for pool in dict.fromkeys(pools) if pool.address not in self._pool_ids
+        ]
+        if not pools:
+            return
+        calls = []
+        for pool in pools:
+            if pool._token_0 is None:
+                calls += [
+                    pool.contract.functions.token0(),
+                    pool.contract.functions.token1(),
+                ]
+            if isinstance(pool, UniswapV3Pool) and pool._fee is None:
+                calls.append(pool.contract.functions.fee())
+        outputs = iter(self.multicall.aggregate(calls))
+        read = []
+        for pool in pools:
+            addresses = fee = None
+            if pool._token_0 is None:
+                addresses = next(outputs), next(outputs)
+            if isinstance(pool, UniswapV3Pool) and pool._fee is None:
+                fee = next(outputs)
+                if fee is None:
+                    continue
+                pool._fee = fee
+            if addresses is not None:
+                if None in addresses:
+                    continue
+                pool._token_0 = ERC20Token(self.web3, addresses[0])
+                pool._token_1 = ERC20Token(self.web3, addresses[1])
+            read.append(pool)
+        pools = read
+        tokens = {
+            token.address: token
+            for pool in pools
+            for token in (pool._token_0, pool._token_1)
+            if token._decimals is None
+        }
+        decimals = self.multicall.aggregate(
+            [token.contract.functions.decimals() for token in tokens.values()]
+        )
+        for token, value in zip(tokens.values(), decimals):
+            token._decimals = value
+        pools = [
+            pool
+            for pool in pools
+            if pool._token_0._decimals is not None
+            and pool._token_1._decimals is not None
+        ]
+        if not pools:
+            return
+        for pool in pools:
+            for token in (pool._token_0, pool._token_1):
+                if token.address not in self._token_ids:
+                    self._token_ids[token.address] = len(self.tokens)
+                    self.tokens.append(token)
+            self._pool_ids[pool.address] = len(self.pools)
+            self.pools.append(pool)
+        new = {
+            "version": [3 if isinstance(pool, UniswapV3Pool) else 2 for pool in pools],
+            "token_0": [self._token_ids[pool._token_0.address] for pool in pools],
+            "token_1": [self._token_ids[pool._token_1.address] for pool in pools],
+            "decimals_0": [pool._token_0._decimals for pool in pools],
+            "decimals_1": [pool._token_1._decimals for pool in pools],
+            "fee": [pool.fee for pool in pools],
+        }
+        for name, dtype in COLUMNS.items():
+            column = (
+                np.array(new[name], dtype=dtype)
+                if name in new
+                else np.zeros(len(pools), dtype=dtype)
+            )
+            if name == "block_number":
+                column[:] = -1
+            setattr(self, name, np.concatenate([getattr(self, name), column]))
+        for pool in pools:
+            if pool.block_number is not None:
+                self._store(self._pool_ids[pool.address], pool)
+
+    def refresh(
+        self,
+        ids: Optional[Sequence[int]] = None,
+        block_identifier: BlockIdentifier = "latest",
+    ) -> None:
+        """
+        Reads the state of the pools in batches using ``Multicall3`` and stores it in
+        the table and in the pool instances, as if ``sync`` had been called for each of
+        them. The IDs of the pools whose state cannot be read are stored in ``failed``,
+        and their state is left unchanged.
+
+        :param ids: The IDs of the pools to read. If not provided, all pools are read.
+        :type ids: Sequence[int], optional
+        :param block_identifier: The block at which the state is read.
+        :type block_identifier: ``BlockIdentifier``, optional
+        """
+        if ids is None:
+            ids = range(len(self.pools))
+        if block_identifier == "latest":
+            block_identifier = self.web3.eth.block_number
+        calls = []
+        for i in ids:
+            pool = self.pools[i]
+            if isinstance(pool, UniswapV2Pair):
+                calls.append(pool.contract.functions.getReserves())
+            else:
+                calls.append(pool.contract.functions.slot0())
+                calls.append(pool.contract.functions.liquidity())
+        outputs = iter(self.multicall.aggregate(calls, block_identifier))
+        self.failed = set()
+        for i in ids:
+            pool = self.pools[i]
+            if isinstance(pool, UniswapV2Pair):
+                reserves = next(outputs)
+                if reserves is None:
+                    self.failed.add(i)
+                    continue
+                pool.reserve_0, pool.reserve_1, _ = reserves
+            else:
+                slot0, liquidity = next(outputs), next(outputs)
+                if slot0 is None or liquidity is None:
+                    self.failed.add(i)
+                    continue
+                pool.sqrt_price_x96, pool.tick = slot0[0], slot0[1]
+                pool.liquidity = liquidity
+            pool.block_number = block_identifier
+            self._store(i, pool)
+
+    def refresh_ticks(
+        self,
+        ids: Optional[Sequence[int]] = None,
+        n_words: int = 1,
+        block_identifier: BlockIdentifier = "latest",
+    ) -> None:
+        """
+        Reads the net liquidity of the initialized ticks near the current tick of
+        Uniswap V3 pools into their ``liquidity_net`` dictionaries. The ticks are found
+        from ``n_words`` words of the pool's tick bitmap on both sides of the word that
+        contains the current tick, each word covering 256 tick spacings. The current
+        state must have been read, e.g., with ``refresh``. The tick maps are kept up to
+        date by ``apply_logs``.
+
+        :param ids: The IDs of the pools to read. If not provided, all Uniswap V3 pools
+            are read.
+        :type ids: Sequence[int], optional
+        :param n_words: The number of tick bitmap words to read on both sides.
+        :type n_words: int, optional
+        :param block_identifier: The block at which the ticks are read.
+        :type block_identifier: ``BlockIdentifier``, optional
+        """
+        if ids is None:
+            ids = np.flatnonzero(self.version == 3)
+        pools = [self.pools[i] for i in ids if isinstance(self.pools[i], UniswapV3Pool)]
+        if block_identifier == "latest":
+            block_identifier = self.web3.eth.block_number
+        unknown = [pool for pool in pools if pool._tick_spacing is None]
+        spacings = self.multicall.aggregate(
+            [pool.contract.functions.tickSpacing() for pool in unknown]
+        )
+        for pool, spacing in zip(unknown, spacings):
+            pool._tick_spacing = spacing
+        words = []  # (pool, word position)
+        for pool in pools:
+            center = (pool.tick // pool.tick_spacing) >> 8
+            words += [(pool, w) for w in range(center - n_words, center + n_words + 1)]
+        bitmaps = self.multicall.aggregate(
+            [pool.contract.functions.tickBitmap(w) for pool, w in words],
+            block_identifier,
+        )
+        ticks = []  # (pool, tick)
+        for (pool, w), bitmap in zip(words, bitmaps):
+            for bit in range(256):
+                if bitmap >> bit & 1:
+                    ticks.append((pool, ((w << 8) + bit) * pool.tick_spacing))
+        outputs = self.multicall.aggregate(
+            [pool.contract.functions.ticks(tick) for pool, tick in ticks],
+            block_identifier,
+        )
+        for pool in pools:
+            pool.liquidity_net = {}
+        for (pool, tick), output in zip(ticks, outputs):
+            pool.liquidity_net[tick] = output[1]
+
+    def apply_logs(self, logs: Iterable[Any]) -> None:
+        """
+        Updates the state of the pools from their ``Sync`` (Uniswap V2) and ``Swap``,
+        ``Mint``, and ``Burn`` (Uniswap V3) events without reading the state from the
+        node. The logs must be in the order in which they were emitted. Logs from pools
+        that are not in the table, logs from blocks at or before the block at which a
+        pool's state was read, and logs from pools whose state has not been read are
+        ignored.
+
+        :param logs: The logs, e.g., as returned by ``web3.eth.get_logs``.
+        :type logs: Iterable[``LogReceipt``]
+        """
+        read_at = self.block_number.copy()
+        for log in logs:
+            i = self._pool_ids.get(log["address"])
+            if i is None or log["blockNumber"] <= read_at[i]:
+                continue
+            pool = self.pools[i]
+            topic = bytes(log["topics"][0])
+            data = bytes(log["data"])
+            if topic == SYNC_TOPIC and isinstance(pool, UniswapV2Pair):
+                pool.reserve_0 = int.from_bytes(data[0:32], "big")
+                pool.reserve_1 = int.from_bytes(data[32:64], "big")
+            elif topic == SWAP_V3_TOPIC and isinstance(pool, UniswapV3Pool):
+                pool.sqrt_price_x96 = int.from_bytes(data[64:96], "big")
+                pool.liquidity = int.from_bytes(data[96:128], "big")
+                pool.tick = int.from_bytes(data[128:160], "big", signed=True)
+            elif topic in (MINT_V3_TOPIC, BURN_V3_TOPIC) and isinstance(
+                pool, UniswapV3Pool
+            ):
+                tick_lower = int.from_bytes(log["topics"][2], "big", signed=True)
+                tick_upper = int.from_bytes(log["topics"][3], "big", signed=True)
+                if topic == MINT_V3_TOPIC:
+                    amount = int.from_bytes(data[32:64], "big")
+                else:
+                    amount = -int.from_bytes(data[0:32], "big")
+                if tick_lower <= pool.tick < tick_upper:
+                    pool.liquidity += amount
+                if pool.liquidity_net is not None:
+                    for tick, delta in ((tick_lower, amount), (tick_upper, -amount)):
+                        net = pool.liquidity_net.get(tick, 0) + delta
+                        if net == 0:
+                            pool.liquidity_net.pop(tick, None)
+                        else:
+                            pool.liquidity_net[tick] = net
+            else:
+                continue
+            pool.block_number = log["blockNumber"]
+            self._store(i, pool)
+
+    def catch_up(
+        self, block_identifier: BlockIdentifier = "latest", max_blocks: int = 2000
+    ) -> int:
+        """
+        Brings the state of the pools up to date by fetching their events since the
+        oldest block at which a pool's state was read and applying them with
+        ``apply_logs``. This is much faster than reading the state of every pool again
+        if the state is only a few blocks old.
+
+        :param block_identifier: The block up to which the events are applied.
+        :type block_identifier: ``BlockIdentifier``, optional
+        :param max_blocks: The maximum number of blocks per ``eth_getLogs`` request.
+        :type max_blocks: int, optional
+
+        :return: The block up to which the state is up to date.
+        :rtype: int
+        """
+        if block_identifier == "latest":
+            block_identifier = self.web3.eth.block_number
+        read = self.block_number >= 0
+        if not read.any():
+            return block_identifier
+        addresses = [pool.address for pool, r in zip(self.pools, read) if r]
+        topics = [[SYNC_TOPIC, SWAP_V3_TOPIC, MINT_V3_TOPIC, BURN_V3_TOPIC]]
+        start = int(self.block_number[read].min()) + 1
+        for from_block in range(start, block_identifier + 1, max_blocks):
+            self.apply_logs(
+                self.web3.eth.get_logs(
+                    {
+                        "fromBlock": from_block,
+                        "toBlock": min(from_block + max_blocks - 1, block_identifier),
+                        "address": addresses,
+                        "topics": topics,
+                    }
+                )
+            )
+        for i in np.flatnonzero(read):
+            self.pools[i].block_number = block_identifier
+        self.block_number[read] = block_identifier
+        return block_identifier
+
+    def _store(self, i: int, pool: Pool) -> None:
+        if isinstance(pool, UniswapV2Pair):
+            reserve_0, reserve_1 = float(pool.reserve_0), float(pool.reserve_1)
+            self.reserve_0[i], self.reserve_1[i] = reserve_0, reserve_1
+            self.liquidity[i] = np.sqrt(reserve_0 * reserve_1)
+            self.sqrt_price_x96[i] = (
+                np.sqrt(reserve_1 / reserve_0) * 2**96 if reserve_0 > 0 else 0.0
+            )
+        else:
+            self.reserve_0[i], self.reserve_1[i] = (
+                float(reserve) for reserve in pool._virtual_reserves(True)
+            )
+            self.sqrt_price_x96[i] = float(pool.sqrt_price_x96)
+            self.liquidity[i] = float(pool.liquidity)
+        self.block_number[i] = pool.block_number
+
+    def prices(self) -> np.ndarray:
+        """
+        Returns the price of ``token_0`` denominated in ``token_1`` in every pool,
+        taking into account the token decimals. The price is NaN for pools that have no
+        liquidity or whose state has not been read.
+
+        :return: The prices.
+        :rtype: ``numpy.ndarray``
+        """
+        sqrt_price = self.sqrt_price_x96 / 2**96
+        with np.errstate(invalid="ignore"):
+            prices = sqrt_price**2 * 10.0 ** (
+                self.decimals_0.astype(np.int16) - self.decimals_1.astype(np.int16)
+            )
+        prices[(self.block_number < 0) | (self.sqrt_price_x96 == 0)] = np.nan
+        return prices
+
+    def filter(
+        self,
+        min_liquidity: Optional[float] = None,
+        tokens: Optional[Iterable[str]] = None,
+        version: Optional[int] = None,
+        min_block_number: Optional[int] = None,
+    ) -> np.ndarray:
+        """
+        Returns the IDs of the pools that satisfy all of the given conditions.
+
+        :param min_liquidity: The minimum value of ``liquidity``.
+        :type min_liquidity: float, optional
+        :param tokens: The addresses of tokens of which at least one must be in the
+            pool.
+        :type tokens: Iterable[str], optional
+        :param version: 2 to select Uniswap V2 pairs or 3 to select Uniswap V3 pools.
+        :type version: int, optional
+        :param min_block_number: The oldest block at which the state may have been read.
+        :type min_block_number: int, optional
+
+        :return: The IDs of the pools.
+        :rtype: ``numpy.ndarray``
+        """
+        mask = np.ones(len(self.pools), dtype=bool)
+        if min_liquidity is not None:
+            mask &= self.liquidity >= min_liquidity
+        if tokens is not None:
+            token_ids = [
+                self._token_ids[address]
+                for address in map(self.web3.to_checksum_address, tokens)
+                if address in self._token_ids
+            ]
+            mask &= np.isin(self.token_0, token_ids) | np.isin(self.token_1, token_ids)
+        if version is not None:
+            mask &= self.version == version
+        if min_block_number is not None:
+            mask &= self.block_number >= min_block_number
+        return np.flatnonzero(mask)
+
+    def top(
+        self,
+        n: int,
+        values: Optional[np.ndarray] = None,
+        ids: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """
+        Returns the IDs of the ``n`` pools with the largest ``values``, the largest
+        first.
+
+        :param n: The number of pools.
+        :type n: int
+        :param values: One value per pool in the table. If not provided,
+            ``liquidity`` is used.
+        :type values: ``numpy.ndarray``, optional
+        :param ids: The IDs of the pools to choose from, e.g., the output of
+            ``filter``. If not provided, all pools are considered.
+        :type ids: ``numpy.ndarray``, optional
+
+        :return: The IDs of the pools.
+        :rtype: ``numpy.ndarray``
+        """
+        if values is None:
+            values = self.liquidity
+        if ids is None:
+            ids = np.arange(len(self.pools))
+        candidates = np.nan_to_num(values[ids], nan=-np.inf)
+        if n < len(ids):
+            partition = np.argpartition(-candidates, n)[:n]
+        else:
+            partition = np.arange(len(ids))
+        return ids[partition[np.argsort(-candidates[partition], kind="stable")]]
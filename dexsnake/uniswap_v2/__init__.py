@@ -1,3 +1,16 @@
-from .factory import UniswapV2Factory
-from .pair import UniswapV2Pair
-from .router import UniswapV2Router
+import importlib
+
+_ATTRIBUTES = {
+    "UniswapV2Factory": ".factory",
+    "UniswapV2Pair": ".pair",
+    "UniswapV2Router": ".router",
+}
+
+__all__ = list(_ATTRIBUTES)
+
+
+def __getattr__(name):
+    # The modules are imported on first access
+    if name in _ATTRIBUTES:
+        return getattr(importlib.import_module(_ATTRIBUTES[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,37 +1,72 @@
-import json
 import os
 from decimal import Decimal
 from typing import Optional, Tuple
 
 from web3 import Web3
 from web3.contract import Contract
+from web3.types import BlockIdentifier
 
+from ..utils.abi import load_abi
 from ..utils.erc20_token import ERC20Token
+from ..utils.metrics import record_cache, timed
+from ..utils.registry import Shared, get_chain_id
 from .config import CONFIG
 
 
-class UniswapV2Pair:
+class UniswapV2Pair(metaclass=Shared):
+    __slots__ = (
+        "web3",
+        "address",
+        "_contract",
+        "_token_0",
+        "_token_1",
+        "reserve_0",
+        "reserve_1",
+        "block_number",
+        "__weakref__",
+    )
+
     def __init__(self, web3: Web3, address: str):
         """
         Initializes a new instance of the ``UniswapV2Pair`` class.
 
+        There is only one instance per pair and ``Web3`` instance, i.e., creating an
+        instance for a pair that is already in use returns the existing instance
+        together with its cached state.
+
         :param web3: A ``Web3`` instance connected to a blockchain node.
         :type web3: ``Web3``
         :param address: The address of the pair contract.
         :type address: str
         """
-        if str(web3.eth.chain_id) not in CONFIG.keys():
-            raise ValueError(f"Unsupported chain (chain ID = {web3.eth.chain_id})")
+        chain_id = get_chain_id(web3)
+        if str(chain_id) not in CONFIG.keys():
+            raise ValueError(f"Unsupported chain (chain ID = {chain_id})")
         self.web3: Web3 = web3
-        with open(
-            os.path.join(os.path.dirname(__file__), "abi", "UniswapV2Pair.json"), "r"
-        ) as file:
-            self.contract: Contract = self.web3.eth.contract(
-                address=self.web3.to_checksum_address(address),
-                abi=json.load(file),
-            )
+        self.address: str = self.web3.to_checksum_address(address)
+        self._contract: Optional[Contract] = None
         self._token_0: Optional[ERC20Token] = None
         self._token_1: Optional[ERC20Token] = None
+        self.reserve_0: Optional[int] = None
+        self.reserve_1: Optional[int] = None
+        self.block_number: Optional[int] = None
+
+    @property
+    def contract(self) -> Contract:
+        """
+        Returns the ``Contract`` instance of the pair, which is created on first use.
+
+        :return: The pair contract.
+        :rtype: ``Contract``
+        """
+        if self._contract is None:
+            self._contract = self.web3.eth.contract(
+                address=self.address,
+                abi=load_abi(
+                    os.path.join(os.path.dirname(__file__), "abi", "UniswapV2Pair.json")
+                ),
+            )
+        return self._contract
 
     @property
     def token_0(self) -> ERC20Token:
@@ -41,6 +76,7 @@ class UniswapV2Pair:
         :return: An ``ERC20Token`` instance representing the first token.
         :rtype: ``ERC20Token``
         """
+        record_cache("UniswapV2Pair.token_0", self._token_0 is not None)
         if self._token_0 is None:
             self._token_0 = ERC20Token(
                 self.web3, self.contract.functions.token0().call()
@@ -55,12 +91,95 @@ class UniswapV2Pair:
         :return: An ``ERC20Token`` instance representing the second token.
         :rtype: ``ERC20Token``
         """
+        record_cache("UniswapV2Pair.token_1", self._token_1 is not None)
         if self._token_1 is None:
             self._token_1 = ERC20Token(
                 self.web3, self.contract.functions.token1().call()
             )
         return self._token_1
 
+    @property
+    def fee(self) -> int:
+        """
+        Returns the pair's swap fee denominated in hundredths of a basis point (i.e.,
+        1e-6), the same unit as ``UniswapV3Pool.fee``. Uniswap V2 pairs always charge
+        0.3%.
+
+        :return: The fee of the pair.
+        :rtype: int
+        """
+        return 3000
+
+    @timed
+    def sync(self, block_identifier: BlockIdentifier = "latest") -> None:
+        """
+        Reads the pair's reserves at ``block_identifier`` and caches them in
+        ``reserve_0`` and ``reserve_1`` (raw integer amounts) together with the block
+        number in ``block_number``. The cached state is used by ``get_amount_out`` to
+        quote swaps locally without calling the node.
+
+        :param block_identifier: The block at which the reserves are read.
+        :type block_identifier: ``BlockIdentifier``, optional
+        """
+        if block_identifier == "latest":
+            block_identifier = self.web3.eth.block_number
+        reserve_0, reserve_1, _ = self.contract.functions.getReserves().call(
+            block_identifier=block_identifier
+        )
+        self.reserve_0, self.reserve_1 = reserve_0, reserve_1
+        self.block_number = block_identifier
+
+    @timed
+    def get_amount_out(self, amount_in: Decimal, token_in: str) -> Decimal:
+        """
+        Returns the amount of output tokens received for swapping ``amount_in`` of
+        ``token_in`` in the pair, computed locally from the cached reserves. The
+        reserves are read with ``sync`` first if they have not been cached yet.
+
+        :param amount_in: The amount of input tokens.
+        :type amount_in: ``Decimal``
+        :param token_in: The address of the input token.
+        :type token_in: str
+
+        :return: The amount of output tokens.
+        :rtype: ``Decimal``
+        """
+        if self.reserve_0 is None:
+            self.sync()
+        zero_for_one = self.web3.to_checksum_address(token_in) == self.token_0.address
+        token_in_decimals, token_out_decimals = (
+            (self.token_0.decimals, self.token_1.decimals)
+            if zero_for_one
+            else (self.token_1.decimals, self.token_0.decimals)
+        )
+        amount_out = self._amount_out(
+            int(Decimal(amount_in) * Decimal(10**token_in_decimals)), zero_for_one
+        )
+        return Decimal(amount_out) / Decimal(10**token_out_decimals)
+
+    def _virtual_reserves(self, zero_for_one: bool) -> Tuple[int, int]:
+        if zero_for_one:
+            return self.reserve_0, self.reserve_1
+        return self.reserve_1, self.reserve_0
+
+    def _amount_out(self, amount_in: int, zero_for_one: bool) -> int:
+        # Same integer arithmetic as ``UniswapV2Library.getAmountOut``
+        reserve_in, reserve_out = self._virtual_reserves(zero_for_one)
+        amount_in_with_fee = amount_in * 997
+        return (amount_in_with_fee * reserve_out) // (
+            reserve_in * 1000 + amount_in_with_fee
+        )
+
+    def _amount_in(self, amount_out: int, zero_for_one: bool) -> int:
+        # Same integer arithmetic as ``UniswapV2Library.getAmountIn``
+        reserve_in, reserve_out = self._virtual_reserves(zero_for_one)
+        if amount_out >= reserve_out:
+            raise ValueError("Insufficient liquidity for the output amount")
+        return (reserve_in * amount_out * 1000) // (
+            (reserve_out - amount_out) * 997
+        ) + 1
+
+    @timed
     def get_reserves(self) -> Tuple[Decimal, Decimal]:
         """
         Returns the current reserves of ``token_0`` and ``token_1`` after taking into
@@ -77,6 +196,7 @@ class UniswapV2Pair:
             Decimal(reserve_1) / Decimal(10**self.token_1.decimals),
         )
 
+    @timed
     def get_price(self) -> Decimal:
         """
         Returns the current price of ``token_0`` denominated in ``token_1``.
@@ -1,41 +1,54 @@
-import json
 import os
 import time
 from decimal import Decimal
-from typing import Any, List, Optional
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 from web3 import Web3
 from web3.contract import Contract
-from web3.types import TxReceipt
+from web3.contract.contract import ContractFunction
+from web3.types import BlockIdentifier, TxReceipt
 
+from ..utils.abi import load_abi
+from ..utils.classifier import TokenClassifier
 from ..utils.erc20_token import ERC20Token
+from ..utils.execution import SwapExecution, parse_swap_receipt
+from ..utils.metrics import record_cache, timed
+from ..utils.simulation import SIMULATION_ACCOUNT, SwapSimulation, simulate_swaps
 from .config import CONFIG
+from .factory import UniswapV2Factory
+from .pair import UniswapV2Pair
 
 
 class UniswapV2Router:
-    def __init__(self, web3: Web3):
+    def __init__(self, web3: Web3, classifier: Optional[TokenClassifier] = None):
         """
         Initializes a new instance of the ``UniswapV2Router`` class.
 
         :param web3: A ``Web3`` instance connected to a blockchain node.
         :type web3: ``Web3``
+        :param classifier: If provided, the tokens of every swap are classified with it
+            before the transaction is built, and a ``ValueError`` is raised if any of
+            them is not allowed, e.g., because it is a honeypot.
+        :type classifier: ``TokenClassifier``, optional
         """
         if str(web3.eth.chain_id) not in CONFIG.keys():
             raise ValueError(f"Unsupported chain (chain ID = {web3.eth.chain_id})")
         self.web3: Web3 = web3
-        with open(
-            os.path.join(os.path.dirname(__file__), "abi", "UniswapV2Router02.json"),
-            "r",
-        ) as file:
-            self.contract: Contract = self.web3.eth.contract(
-                address=CONFIG[str(self.web3.eth.chain_id)]["router_02"],
-                abi=json.load(file),
-            )
+        self.classifier: Optional[TokenClassifier] = classifier
+        self._weth: Optional[str] = None
+        self._pairs: Dict[Tuple[str, str], UniswapV2Pair] = {}
+        self.contract: Contract = self.web3.eth.contract(
+            address=CONFIG[str(self.web3.eth.chain_id)]["router_02"],
+            abi=load_abi(
+                os.path.join(os.path.dirname(__file__), "abi", "UniswapV2Router02.json")
+            ),
+        )
 
+    @timed
     def swap_exact_tokens_for_tokens(
         self,
         amount_in: Decimal,
-        amount_out_min: Decimal,
+        amount_out_min: Optional[Decimal],
         path: List[str],
         to: str,
         account: str,
@@ -43,7 +56,10 @@ class UniswapV2Router:
         deadline: Optional[int] = None,
         gas: Optional[int] = None,
         gas_price: Optional[int] = None,
-    ) -> TxReceipt:
+        fee_on_transfer: bool = False,
+        slippage_bps: Optional[int] = None,
+        max_state_age: int = 2,
+    ) -> SwapExecution:
         """
         Swaps an exact amount of input tokens for as many output tokens as possible,
         along the route determined by ``path``.
@@ -72,42 +88,71 @@ class UniswapV2Router:
         :param gas_price: The gas price for the transaction in wei (i.e., 1e-18 ETH). If
             not provided, the current network gas price will be used.
         :type gas_price: int, optional
+        :param fee_on_transfer: Whether to use the variant of the swap that supports
+            tokens that take a fee on transfer, in which case ``amount_out_min`` is
+            checked against the amount actually received.
+        :type fee_on_transfer: bool, optional
+        :param slippage_bps: If provided, ``amount_out_min`` is ignored and derived
+            instead from a quote computed locally from the cached state of the pairs
+            along ``path``, less the given slippage tolerance in basis points. This
+            avoids calling ``getAmountsOut`` before the swap. The quote does not take
+            into account fees on transfer. The tolerance must be between 0 and 10,000.
+        :type slippage_bps: int, optional
+        :param max_state_age: The maximum age of the cached state of a pair in blocks
+            when ``slippage_bps`` is provided. Older state, e.g., not kept up to date by
+            a ``PoolStateTable``, is read again with ``sync`` before quoting.
+        :type max_state_age: int, optional
 
-        :return: The transaction receipt.
-        :rtype: TxReceipt
+        :return: The result of the swap parsed from the transaction receipt.
+        :rtype: ``SwapExecution``
         """
-        if gas_price is None:
-            gas_price = self.web3.eth.gas_price
+        if amount_out_min is None and slippage_bps is None:
+            raise ValueError(
+                "Either `amount_out_min` or `slippage_bps` must be provided"
+            )
         if deadline is None:
             deadline = int(time.time() + 300)
         path_checksum = [self.web3.to_checksum_address(address) for address in path]
         account_checksum = self.web3.to_checksum_address(account)
+        self._check_tokens(path_checksum)
         token_in_decimals = ERC20Token(self.web3, path_checksum[0]).decimals
         token_out_decimals = ERC20Token(self.web3, path_checksum[-1]).decimals
-        tx = self.contract.functions.swapExactTokensForTokens(
-            int(Decimal(amount_in) * Decimal(10**token_in_decimals)),
-            int(Decimal(amount_out_min) * Decimal(10**token_out_decimals)),
+        function = (
+            self.contract.functions.swapExactTokensForTokensSupportingFeeOnTransferTokens
+            if fee_on_transfer
+            else self.contract.functions.swapExactTokensForTokens
+        )
+        amount_in_raw = int(Decimal(amount_in) * Decimal(10**token_in_decimals))
+        if slippage_bps is None:
+            amount_out_min_raw = int(
+                Decimal(amount_out_min) * Decimal(10**token_out_decimals)
+            )
+        else:
+            amount_out_min_raw = self._amount_out_min(
+                amount_in_raw, path_checksum, slippage_bps, max_state_age
+            )
+        swap = function(
+            amount_in_raw,
+            amount_out_min_raw,
             path_checksum,
             self.web3.to_checksum_address(to),
             deadline,
-        ).build_transaction(
-            {
-                "from": account_checksum,
-                "nonce": self.web3.eth.get_transaction_count(account_checksum),
-                "gasPrice": gas_price,
-            }
         )
-        if gas is None:
-            gas = self.web3.eth.estimate_gas(tx)
-        tx["gas"] = gas
-        signed_tx = self.web3.eth.account.sign_transaction(tx, private_key=private_key)
-        tx_hash = self.web3.eth.send_raw_transaction(signed_tx.rawTransaction)
-        return self.web3.eth.wait_for_transaction_receipt(tx_hash)
+        receipt = self._send(swap, account_checksum, private_key, gas, gas_price)
+        return parse_swap_receipt(
+            self.web3,
+            receipt,
+            path_checksum[0],
+            path_checksum[-1],
+            account_checksum,
+            to,
+        )
 
+    @timed
     def swap_tokens_for_exact_tokens(
         self,
         amount_out: Decimal,
-        amount_in_max: Decimal,
+        amount_in_max: Optional[Decimal],
         path: List[str],
         to: str,
         account: str,
@@ -115,7 +160,9 @@ class UniswapV2Router:
         deadline: Optional[int] = None,
         gas: Optional[int] = None,
         gas_price: Optional[int] = None,
-    ) -> TxReceipt:
+        slippage_bps: Optional[int] = None,
+        max_state_age: int = 2,
+    ) -> SwapExecution:
         """
         Swaps as few input tokens as possible for an exact amount of output tokens,
         along the route determined by ``path``.
@@ -144,29 +191,311 @@ class UniswapV2Router:
         :param gas_price: The gas price for the transaction in wei (i.e., 1e-18 ETH). If
             not provided, the current network gas price will be used.
         :type gas_price: int, optional
+        :param slippage_bps: If provided, ``amount_in_max`` is ignored and derived
+            instead from a quote computed locally from the cached state of the pairs
+            along ``path``, plus the given slippage tolerance in basis points. This
+            avoids calling ``getAmountsIn`` before the swap. The quote does not take
+            into account fees on transfer. The tolerance must be between 0 and 10,000.
+        :type slippage_bps: int, optional
+        :param max_state_age: The maximum age of the cached state of a pair in blocks
+            when ``slippage_bps`` is provided. Older state, e.g., not kept up to date by
+            a ``PoolStateTable``, is read again with ``sync`` before quoting.
+        :type max_state_age: int, optional
 
-        :return: The transaction receipt.
-        :rtype: TxReceipt
+        :return: The result of the swap parsed from the transaction receipt.
+        :rtype: ``SwapExecution``
         """
-        if gas_price is None:
-            gas_price = self.web3.eth.gas_price
+        if amount_in_max is None and slippage_bps is None:
+            raise ValueError(
+                "Either `amount_in_max` or `slippage_bps` must be provided"
+            )
         if deadline is None:
             deadline = int(time.time() + 300)
         path_checksum = [self.web3.to_checksum_address(address) for address in path]
         account_checksum = self.web3.to_checksum_address(account)
+        self._check_tokens(path_checksum)
         token_in_decimals = ERC20Token(self.web3, path_checksum[0]).decimals
         token_out_decimals = ERC20Token(self.web3, path_checksum[-1]).decimals
-        tx = self.contract.functions.swapTokensForExactTokens(
-            int(Decimal(amount_out) * Decimal(10**token_out_decimals)),
-            int(Decimal(amount_in_max) * Decimal(10**token_in_decimals)),
+        amount_out_raw = int(Decimal(amount_out) * Decimal(10**token_out_decimals))
+        if slippage_bps is None:
+            amount_in_max_raw = int(
+                Decimal(amount_in_max) * Decimal(10**token_in_decimals)
+            )
+        else:
+            amount_in_max_raw = self._amount_in_max(
+                amount_out_raw, path_checksum, slippage_bps, max_state_age
+            )
+        swap = self.contract.functions.swapTokensForExactTokens(
+            amount_out_raw,
+            amount_in_max_raw,
+            path_checksum,
+            self.web3.to_checksum_address(to),
+            deadline,
+        )
+        receipt = self._send(swap, account_checksum, private_key, gas, gas_price)
+        return parse_swap_receipt(
+            self.web3,
+            receipt,
+            path_checksum[0],
+            path_checksum[-1],
+            account_checksum,
+            to,
+        )
+
+    @property
+    def weth(self) -> str:
+        """
+        Returns the address of the wrapped native token (e.g., WETH) used by the router
+        for swaps to and from the native token.
+
+        :return: The address of the wrapped native token.
+        :rtype: str
+        """
+        record_cache("UniswapV2Router.weth", self._weth is not None)
+        if self._weth is None:
+            self._weth = self.contract.functions.WETH().call()
+        return self._weth
+
+    @timed
+    def swap_exact_eth_for_tokens(
+        self,
+        amount_in: Decimal,
+        amount_out_min: Optional[Decimal],
+        path: List[str],
+        to: str,
+        account: str,
+        private_key: str,
+        deadline: Optional[int] = None,
+        gas: Optional[int] = None,
+        gas_price: Optional[int] = None,
+        fee_on_transfer: bool = False,
+        slippage_bps: Optional[int] = None,
+        max_state_age: int = 2,
+    ) -> SwapExecution:
+        """
+        Swaps an exact amount of the native token (e.g., ETH) for as many output tokens
+        as possible, along the route determined by ``path``. The native token is
+        wrapped by the router in the same transaction.
+
+        :param amount_in: The amount of the native token to send.
+        :type amount_in: ``Decimal``
+        :param amount_out_min: The minimum amount of output tokens that must be received
+            for the transaction not to revert.
+        :type amount_out_min: ``Decimal``
+        :param path: A list of token addresses that starts with ``weth``. The length of
+            ``path`` must be >= 2 and Uniswap V2 pairs for each consecutive pair of
+            addresses must exist and have liquidity.
+        :type path: List[str]
+        :param to: The recipient of the output tokens.
+        :type to: str
+        :param account: The account address from which the transaction will be sent.
+        :type account: str
+        :param private_key: The private key of the account.
+        :type private_key: str
+        :param deadline: The Unix timestamp after which the transaction will revert. If
+            not provided, it will be set to five minutes from the current time.
+        :type deadline: int, optional
+        :param gas: The gas limit for the transaction. If not provided, it will be
+            estimated automatically.
+        :type gas: int, optional
+        :param gas_price: The gas price for the transaction in wei (i.e., 1e-18 ETH). If
+            not provided, the current network gas price will be used.
+        :type gas_price: int, optional
+        :param fee_on_transfer: Whether to use the variant of the swap that supports
+            tokens that take a fee on transfer, in which case ``amount_out_min`` is
+            checked against the amount actually received.
+        :type fee_on_transfer: bool, optional
+        :param slippage_bps: If provided, ``amount_out_min`` is ignored and derived
+            instead from a quote computed locally from the cached state of the pairs
+            along ``path``, less the given slippage tolerance in basis points. This
+            avoids calling ``getAmountsOut`` before the swap. The quote does not take
+            into account fees on transfer. The tolerance must be between 0 and 10,000.
+        :type slippage_bps: int, optional
+        :param max_state_age: The maximum age of the cached state of a pair in blocks
+            when ``slippage_bps`` is provided. Older state, e.g., not kept up to date by
+            a ``PoolStateTable``, is read again with ``sync`` before quoting.
+        :type max_state_age: int, optional
+
+        :return: The result of the swap parsed from the transaction receipt.
+        :rtype: ``SwapExecution``
+        """
+        if amount_out_min is None and slippage_bps is None:
+            raise ValueError(
+                "Either `amount_out_min` or `slippage_bps` must be provided"
+            )
+        if deadline is None:
+            deadline = int(time.time() + 300)
+        path_checksum = [self.web3.to_checksum_address(address) for address in path]
+        if path_checksum[0] != self.weth:
+            raise ValueError(f"The path must start with WETH ({self.weth})")
+        account_checksum = self.web3.to_checksum_address(account)
+        self._check_tokens(path_checksum)
+        token_out_decimals = ERC20Token(self.web3, path_checksum[-1]).decimals
+        function = (
+            self.contract.functions.swapExactETHForTokensSupportingFeeOnTransferTokens
+            if fee_on_transfer
+            else self.contract.functions.swapExactETHForTokens
+        )
+        amount_in_wei = self.web3.to_wei(Decimal(amount_in), "ether")
+        if slippage_bps is None:
+            amount_out_min_raw = int(
+                Decimal(amount_out_min) * Decimal(10**token_out_decimals)
+            )
+        else:
+            amount_out_min_raw = self._amount_out_min(
+                amount_in_wei, path_checksum, slippage_bps, max_state_age
+            )
+        swap = function(
+            amount_out_min_raw,
             path_checksum,
             self.web3.to_checksum_address(to),
             deadline,
-        ).build_transaction(
+        )
+        receipt = self._send(
+            swap,
+            account_checksum,
+            private_key,
+            gas,
+            gas_price,
+            value=amount_in_wei,
+        )
+        return parse_swap_receipt(
+            self.web3,
+            receipt,
+            path_checksum[0],
+            path_checksum[-1],
+            account_checksum,
+            to,
+            native_in=True,
+        )
+
+    @timed
+    def swap_exact_tokens_for_eth(
+        self,
+        amount_in: Decimal,
+        amount_out_min: Optional[Decimal],
+        path: List[str],
+        to: str,
+        account: str,
+        private_key: str,
+        deadline: Optional[int] = None,
+        gas: Optional[int] = None,
+        gas_price: Optional[int] = None,
+        fee_on_transfer: bool = False,
+        slippage_bps: Optional[int] = None,
+        max_state_age: int = 2,
+    ) -> SwapExecution:
+        """
+        Swaps an exact amount of input tokens for as much of the native token (e.g.,
+        ETH) as possible, along the route determined by ``path``. The wrapped native
+        token is unwrapped by the router in the same transaction.
+
+        :param amount_in: The amount of input tokens to send.
+        :type amount_in: ``Decimal``
+        :param amount_out_min: The minimum amount of the native token that must be
+            received for the transaction not to revert.
+        :type amount_out_min: ``Decimal``
+        :param path: A list of token addresses that ends with ``weth``. The length of
+            ``path`` must be >= 2 and Uniswap V2 pairs for each consecutive pair of
+            addresses must exist and have liquidity.
+        :type path: List[str]
+        :param to: The recipient of the native token.
+        :type to: str
+        :param account: The account address from which the transaction will be sent.
+        :type account: str
+        :param private_key: The private key of the account.
+        :type private_key: str
+        :param deadline: The Unix timestamp after which the transaction will revert. If
+            not provided, it will be set to five minutes from the current time.
+        :type deadline: int, optional
+        :param gas: The gas limit for the transaction. If not provided, it will be
+            estimated automatically.
+        :type gas: int, optional
+        :param gas_price: The gas price for the transaction in wei (i.e., 1e-18 ETH). If
+            not provided, the current network gas price will be used.
+        :type gas_price: int, optional
+        :param fee_on_transfer: Whether to use the variant of the swap that supports
+            tokens that take a fee on transfer, in which case ``amount_out_min`` is
+            checked against the amount actually received.
+        :type fee_on_transfer: bool, optional
+        :param slippage_bps: If provided, ``amount_out_min`` is ignored and derived
+            instead from a quote computed locally from the cached state of the pairs
+            along ``path``, less the given slippage tolerance in basis points. This
+            avoids calling ``getAmountsOut`` before the swap. The quote does not take
+            into account fees on transfer. The tolerance must be between 0 and 10,000.
+        :type slippage_bps: int, optional
+        :param max_state_age: The maximum age of the cached state of a pair in blocks
+            when ``slippage_bps`` is provided. Older state, e.g., not kept up to date by
+            a ``PoolStateTable``, is read again with ``sync`` before quoting.
+        :type max_state_age: int, optional
+
+        :return: The result of the swap parsed from the transaction receipt.
+        :rtype: ``SwapExecution``
+        """
+        if amount_out_min is None and slippage_bps is None:
+            raise ValueError(
+                "Either `amount_out_min` or `slippage_bps` must be provided"
+            )
+        if deadline is None:
+            deadline = int(time.time() + 300)
+        path_checksum = [self.web3.to_checksum_address(address) for address in path]
+        if path_checksum[-1] != self.weth:
+            raise ValueError(f"The path must end with WETH ({self.weth})")
+        account_checksum = self.web3.to_checksum_address(account)
+        self._check_tokens(path_checksum)
+        token_in_decimals = ERC20Token(self.web3, path_checksum[0]).decimals
+        function = (
+            self.contract.functions.swapExactTokensForETHSupportingFeeOnTransferTokens
+            if fee_on_transfer
+            else self.contract.functions.swapExactTokensForETH
+        )
+        amount_in_raw = int(Decimal(amount_in) * Decimal(10**token_in_decimals))
+        if slippage_bps is None:
+            amount_out_min_wei = self.web3.to_wei(Decimal(amount_out_min), "ether")
+        else:
+            amount_out_min_wei = self._amount_out_min(
+                amount_in_raw, path_checksum, slippage_bps, max_state_age
+            )
+        swap = function(
+            amount_in_raw,
+            amount_out_min_wei,
+            path_checksum,
+            self.web3.to_checksum_address(to),
+            deadline,
+        )
+        receipt = self._send(swap, account_checksum, private_key, gas, gas_price)
+        return parse_swap_receipt(
+            self.web3,
+            receipt,
+            path_checksum[0],
+            path_checksum[-1],
+            account_checksum,
+            to,
+            native_out=True,
+        )
+
+    def _check_tokens(self, tokens: List[str]) -> None:
+        # Rejects honeypots and tokens that take a fee before building a transaction
+        if self.classifier is not None:
+            self.classifier.check(tokens)
+
+    def _send(
+        self,
+        function: ContractFunction,
+        account: str,
+        private_key: str,
+        gas: Optional[int],
+        gas_price: Optional[int],
+        value: int = 0,
+    ) -> TxReceipt:
+        if gas_price is None:
+            gas_price = self.web3.eth.gas_price
+        tx = function.build_transaction(
             {
-                "from": account_checksum,
-                "nonce": self.web3.eth.get_transaction_count(account_checksum),
+                "from": account,
+                "nonce": self.web3.eth.get_transaction_count(account),
                 "gasPrice": gas_price,
+                "value": value,
             }
         )
         if gas is None:
@@ -175,3 +504,95 @@ class UniswapV2Router:
         signed_tx = self.web3.eth.account.sign_transaction(tx, private_key=private_key)
         tx_hash = self.web3.eth.send_raw_transaction(signed_tx.rawTransaction)
         return self.web3.eth.wait_for_transaction_receipt(tx_hash)
+
+    def _cached_pairs(self, path: List[str], max_state_age: int) -> List[UniswapV2Pair]:
+        pairs = []
+        for token_a, token_b in zip(path, path[1:]):
+            key = (token_a, token_b) if token_a < token_b else (token_b, token_a)
+            if key not in self._pairs:
+                address = UniswapV2Factory(self.web3).get_pair(token_a, token_b)
+                if int(address, 16) == 0:
+                    raise ValueError(f"No Uniswap V2 pair for {token_a} and {token_b}")
+                self._pairs[key] = UniswapV2Pair(self.web3, address)
+            pairs.append(self._pairs[key])
+        block_number = self.web3.eth.block_number
+        for pair in pairs:
+            fresh = (
+                pair.block_number is not None
+                and block_number - pair.block_number <= max_state_age
+            )
+            record_cache("UniswapV2Router.pair_state", fresh)
+            if not fresh:
+                pair.sync(block_number)
+        return pairs
+
+    def _amount_out_min(
+        self, amount_in: int, path: List[str], slippage_bps: int, max_state_age: int
+    ) -> int:
+        if not 0 <= slippage_bps <= 10_000:
+            raise ValueError("`slippage_bps` must be between 0 and 10,000")
+        amount = amount_in
+        for token_in, pair in zip(path, self._cached_pairs(path, max_state_age)):
+            amount = pair._amount_out(amount, token_in == pair.token_0.address)
+        return amount * (10_000 - slippage_bps) // 10_000
+
+    def _amount_in_max(
+        self, amount_out: int, path: List[str], slippage_bps: int, max_state_age: int
+    ) -> int:
+        if not 0 <= slippage_bps <= 10_000:
+            raise ValueError("`slippage_bps` must be between 0 and 10,000")
+        amount = amount_out
+        legs = list(zip(path, self._cached_pairs(path, max_state_age)))
+        for token_in, pair in reversed(legs):
+            amount = pair._amount_in(amount, token_in == pair.token_0.address)
+        return -(-amount * (10_000 + slippage_bps) // 10_000)
+
+    @timed
+    def simulate_swap_exact_tokens_for_tokens(
+        self,
+        candidates: Sequence[Tuple[Decimal, List[str]]],
+        account: Optional[str] = None,
+        block_identifier: BlockIdentifier = "latest",
+        max_workers: int = 8,
+    ) -> List[SwapSimulation]:
+        """
+        Simulates ``swapExactTokensForTokens`` for many candidate swaps with
+        ``eth_call`` without sending transactions, returning the amount of output
+        tokens and the gas used by each swap, or the revert reason. The candidates are
+        simulated concurrently on top of the same block and independently of each
+        other. The balance and allowance of the input token are overridden in the
+        simulation, so the account does not need to hold the input tokens or have
+        approved the router.
+
+        :param candidates: The amount of input tokens and the path of each swap, as in
+            ``swap_exact_tokens_for_tokens``.
+        :type candidates: Sequence[Tuple[``Decimal``, List[str]]]
+        :param account: The account from which the swaps are simulated. The output
+            tokens are sent to the same account. If not provided, a placeholder account
+            is used.
+        :type account: str, optional
+        :param block_identifier: The block on top of which the swaps are simulated.
+        :type block_identifier: ``BlockIdentifier``, optional
+        :param max_workers: The maximum number of concurrent ``eth_call`` requests.
+        :type max_workers: int, optional
+
+        :return: The results of the simulations in the same order as ``candidates``.
+        :rtype: List[``SwapSimulation``]
+        """
+        account_checksum = self.web3.to_checksum_address(
+            SIMULATION_ACCOUNT if account is None else account
+        )
+        deadline = int(time.time() + 300)
+        swaps = []
+        for amount_in, path in candidates:
+            path_checksum = [self.web3.to_checksum_address(address) for address in path]
+            token_in = ERC20Token(self.web3, path_checksum[0])
+            token_out = ERC20Token(self.web3, path_checksum[-1])
+            amount_in_raw = int(Decimal(amount_in) * Decimal(10**token_in.decimals))
+            call = self.contract.functions.swapExactTokensForTokens(
+                amount_in_raw, 0, path_checksum, account_checksum, deadline
+            )
+            swaps.append((call, token_in, amount_in_raw, token_out))
+        return simulate_swaps(
+            self.web3, account_checksum, swaps, block_identifier, max_workers
+        )
@@ -1,3 +1,16 @@
-from .factory import UniswapV3Factory
-from .pool import UniswapV3Pool
-from .router import UniswapV3Router
+import importlib
+
+_ATTRIBUTES = {
+    "UniswapV3Factory": ".factory",
+    "UniswapV3Pool": ".pool",
+    "UniswapV3Router": ".router",
+}
+
+__all__ = list(_ATTRIBUTES)
+
+
+def __getattr__(name):
+    # The modules are imported on first access
+    if name in _ATTRIBUTES:
+        return getattr(importlib.import_module(_ATTRIBUTES[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
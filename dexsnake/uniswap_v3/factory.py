@@ -1,10 +1,11 @@
-import json
 import os
 
 from web3 import Web3
 from web3.contract import Contract
 from web3.types import TxReceipt
 
+from ..utils.abi import load_abi
+from ..utils.metrics import timed
 from .config import CONFIG
 
 
@@ -19,14 +20,14 @@ class UniswapV3Factory:
         if str(web3.eth.chain_id) not in CONFIG.keys():
             raise ValueError(f"Unsupported chain (chain ID = {web3.eth.chain_id})")
         self.web3: Web3 = web3
-        with open(
-            os.path.join(os.path.dirname(__file__), "abi", "UniswapV3Factory.json"), "r"
-        ) as file:
-            self.contract: Contract = self.web3.eth.contract(
-                address=CONFIG[str(self.web3.eth.chain_id)]["factory"],
-                abi=json.load(file),
-            )
-
+        self.contract: Contract = self.web3.eth.contract(
+            address=CONFIG[str(self.web3.eth.chain_id)]["factory"],
+            abi=load_abi(
+                os.path.join(os.path.dirname(__file__), "abi", "UniswapV3Factory.json")
+            ),
+        )
+
+    @timed
     def get_pool(self, token_a: str, token_b: str, fee: int) -> str:
         """
         Returns the address of the pool for ``token_a`` and ``token_b`` with a given fee
@@ -1,38 +1,81 @@
-import json
 import os
 from decimal import Decimal
-from typing import Dict, Optional, Tuple
+from typing import Dict, Optional, Sequence, Tuple
 
 from web3 import Web3
 from web3.contract import Contract
+from web3.types import BlockIdentifier
 
+from ..utils.abi import load_abi
 from ..utils.erc20_token import ERC20Token
+from ..utils.metrics import record_cache, timed
+from ..utils.registry import Shared, get_chain_id
 from .config import CONFIG
 
 
-class UniswapV3Pool:
+class UniswapV3Pool(metaclass=Shared):
+    __slots__ = (
+        "web3",
+        "address",
+        "_contract",
+        "_token_0",
+        "_token_1",
+        "_fee",
+        "_tick_spacing",
+        "sqrt_price_x96",
+        "tick",
+        "liquidity",
+        "block_number",
+        "liquidity_net",
+        "__weakref__",
+    )
+
     def __init__(self, web3: Web3, address: str):
         """
         Initializes a new instance of the ``UniswapV3Pool`` class.
 
+        There is only one instance per pool and ``Web3`` instance, i.e., creating an
+        instance for a pool that is already in use returns the existing instance
+        together with its cached state.
+
         :param web3: A ``Web3`` instance connected to a blockchain node.
         :type web3: ``Web3``
         :param address: The address of the pool contract.
         :type address: str
         """
-        if str(web3.eth.chain_id) not in CONFIG.keys():
-            raise ValueError(f"Unsupported chain (chain ID = {web3.eth.chain_id})")
-        self.web3 = web3
-        with open(
-            os.path.join(os.path.dirname(__file__), "abi", "UniswapV3Pool.json"), "r"
-        ) as file:
-            self.contract: Contract = self.web3.eth.contract(
-                address=self.web3.to_checksum_address(address),
-                abi=json.load(file),
-            )
+        chain_id = get_chain_id(web3)
+        if str(chain_id) not in CONFIG.keys():
+            raise ValueError(f"Unsupported chain (chain ID = {chain_id})")
+        self.web3: Web3 = web3
+        self.address: str = self.web3.to_checksum_address(address)
+        self._contract: Optional[Contract] = None
         self._token_0: Optional[ERC20Token] = None
         self._token_1: Optional[ERC20Token] = None
         self._fee: Optional[int] = None
+        self.sqrt_price_x96: Optional[int] = None
+        self.tick: Optional[int] = None
+        self.liquidity: Optional[int] = None
+        self.block_number: Optional[int] = None
+        # Net liquidity of the initialized ticks, see ``PoolStateTable.refresh_ticks``
+        self.liquidity_net: Optional[Dict[int, int]] = None
+        self._tick_spacing: Optional[int] = None
+
+    @property
+    def contract(self) -> Contract:
+        """
+        Returns the ``Contract`` instance of the pool, which is created on first use.
+
+        :return: The pool contract.
+        :rtype: ``Contract``
+        """
+        if self._contract is None:
+            self._contract = self.web3.eth.contract(
+                address=self.address,
+                abi=load_abi(
+                    os.path.join(os.path.dirname(__file__), "abi", "UniswapV3Pool.json")
+                ),
+            )
+        return self._contract
 
     @property
     def token_0(self) -> ERC20Token:
@@ -42,6 +85,7 @@ class UniswapV3Pool:
         :return: An ``ERC20Token`` instance representing the first token.
         :rtype: ``ERC20Token``
         """
+        record_cache("UniswapV3Pool.token_0", self._token_0 is not None)
         if self._token_0 is None:
             self._token_0 = ERC20Token(
                 self.web3, self.contract.functions.token0().call()
@@ -56,6 +100,7 @@ class UniswapV3Pool:
         :return: An ``ERC20Token`` instance representing the second token.
         :rtype: ``ERC20Token``
         """
+        record_cache("UniswapV3Pool.token_1", self._token_1 is not None)
         if self._token_1 is None:
             self._token_1 = ERC20Token(
                 self.web3, self.contract.functions.token1().call()
@@ -70,10 +115,103 @@ class UniswapV3Pool:
         :return: The fee tier of the pool.
         :rtype: int
         """
+        record_cache("UniswapV3Pool.fee", self._fee is not None)
         if self._fee is None:
             self._fee = self.contract.functions.fee().call()
         return self._fee
 
+    @property
+    def tick_spacing(self) -> int:
+        """
+        Returns the spacing between the ticks that can be initialized in the pool.
+
+        :return: The tick spacing of the pool.
+        :rtype: int
+        """
+        record_cache("UniswapV3Pool.tick_spacing", self._tick_spacing is not None)
+        if self._tick_spacing is None:
+            self._tick_spacing = self.contract.functions.tickSpacing().call()
+        return self._tick_spacing
+
+    @timed
+    def sync(self, block_identifier: BlockIdentifier = "latest") -> None:
+        """
+        Reads the pool's current price, tick, and in-range liquidity at
+        ``block_identifier`` and caches them in ``sqrt_price_x96``, ``tick``, and
+        ``liquidity`` together with the block number in ``block_number``. The cached
+        state is used by ``get_amount_out`` to quote swaps locally without calling the
+        node.
+
+        :param block_identifier: The block at which the state is read.
+        :type block_identifier: ``BlockIdentifier``, optional
+        """
+        if block_identifier == "latest":
+            block_identifier = self.web3.eth.block_number
+        slot0 = self.contract.functions.slot0().call(block_identifier=block_identifier)
+        self.sqrt_price_x96, self.tick = slot0[0], slot0[1]
+        self.liquidity = self.contract.functions.liquidity().call(
+            block_identifier=block_identifier
+        )
+        self.block_number = block_identifier
+
+    @timed
+    def get_amount_out(self, amount_in: Decimal, token_in: str) -> Decimal:
+        """
+        Returns the amount of output tokens received for swapping ``amount_in`` of
+        ``token_in`` in the pool, computed locally from the cached state. The state is
+        read with ``sync`` first if it has not been cached yet.
+
+        The quote assumes that the swap does not cross an initialized tick, i.e., that
+        it is small enough to be filled by the liquidity in the current tick range.
+
+        :param amount_in: The amount of input tokens.
+        :type amount_in: ``Decimal``
+        :param token_in: The address of the input token.
+        :type token_in: str
+
+        :return: The amount of output tokens.
+        :rtype: ``Decimal``
+        """
+        if self.sqrt_price_x96 is None:
+            self.sync()
+        zero_for_one = self.web3.to_checksum_address(token_in) == self.token_0.address
+        token_in_decimals, token_out_decimals = (
+            (self.token_0.decimals, self.token_1.decimals)
+            if zero_for_one
+            else (self.token_1.decimals, self.token_0.decimals)
+        )
+        amount_out = self._amount_out(
+            int(Decimal(amount_in) * Decimal(10**token_in_decimals)), zero_for_one
+        )
+        return Decimal(amount_out) / Decimal(10**token_out_decimals)
+
+    def _virtual_reserves(self, zero_for_one: bool) -> Tuple[int, int]:
+        # Within a tick range the pool behaves like a constant product pool with
+        # reserves x = L / sqrt(P) and y = L * sqrt(P)
+        if self.sqrt_price_x96 == 0:  # the pool has not been initialized
+            return 0, 0
+        reserve_0 = (self.liquidity << 96) // self.sqrt_price_x96
+        reserve_1 = (self.liquidity * self.sqrt_price_x96) >> 96
+        if zero_for_one:
+            return reserve_0, reserve_1
+        return reserve_1, reserve_0
+
+    def _amount_out(self, amount_in: int, zero_for_one: bool) -> int:
+        reserve_in, reserve_out = self._virtual_reserves(zero_for_one)
+        amount_in_with_fee = amount_in * (1_000_000 - self.fee)
+        return (amount_in_with_fee * reserve_out) // (
+            reserve_in * 1_000_000 + amount_in_with_fee
+        )
+
+    def _amount_in(self, amount_out: int, zero_for_one: bool) -> int:
+        reserve_in, reserve_out = self._virtual_reserves(zero_for_one)
+        if amount_out >= reserve_out:
+            raise ValueError("Insufficient liquidity for the output amount")
+        return (reserve_in * amount_out * 1_000_000) // (
+            (reserve_out - amount_out) * (1_000_000 - self.fee)
+        ) + 1
+
+    @timed
     def get_price(self) -> Decimal:
         """
         Returns the current price of ``token_0`` denominated in ``token_1`` in the pool.
@@ -87,3 +225,31 @@ class UniswapV3Pool:
             Decimal(10) ** (self.token_0.decimals - self.token_1.decimals)
         )
         return price
+
+    @timed
+    def get_twap(self, window: int) -> Decimal:
+        """
+        Returns the time-weighted average price of ``token_0`` denominated in
+        ``token_1`` over the last ``window`` seconds, computed from the pool's price
+        oracle with ``observe``. The pool must have stored enough observations to cover
+        the window, or the call reverts.
+
+        :param window: The length of the averaging window in seconds, which must be
+            positive.
+        :type window: int
+
+        :return: The time-weighted average price.
+        :rtype: ``Decimal``
+        """
+        if window <= 0:
+            raise ValueError("`window` must be positive")
+        tick_cumulatives, _ = self.contract.functions.observe([window, 0]).call()
+        return self._twap(tick_cumulatives, window)
+
+    def _twap(self, tick_cumulatives: Sequence[int], window: int) -> Decimal:
+        # The arithmetic mean tick is rounded towards negative infinity as in
+        # ``OracleLibrary.consult``
+        tick = (tick_cumulatives[1] - tick_cumulatives[0]) // window
+        return Decimal("1.0001") ** tick * (
+            Decimal(10) ** (self.token_0.decimals - self.token_1.decimals)
+        )
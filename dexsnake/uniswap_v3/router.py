@@ -1,43 +1,60 @@
-import json
 import os
 import time
 from decimal import Decimal
-from typing import Optional
+from typing import Dict, List, Optional, Sequence, Tuple
 
 from web3 import Web3
 from web3.contract import Contract
-from web3.types import TxReceipt
+from web3.contract.contract import ContractFunction
+from web3.types import BlockIdentifier, TxReceipt
 
+from ..utils.abi import load_abi
+from ..utils.classifier import TokenClassifier
 from ..utils.erc20_token import ERC20Token
+from ..utils.execution import SwapExecution, parse_swap_receipt
+from ..utils.metrics import record_cache, timed
+from ..utils.simulation import SIMULATION_ACCOUNT, SwapSimulation, simulate_swaps
 from .config import CONFIG
+from .factory import UniswapV3Factory
+from .pool import UniswapV3Pool
+
+# Recipient that makes SwapRouter02 keep the output of a swap for a subsequent call in
+# the same ``multicall``, see ``Constants.ADDRESS_THIS``
+ADDRESS_THIS = "0x0000000000000000000000000000000000000002"
 
 
 class UniswapV3Router:
-    def __init__(self, web3: Web3):
+    def __init__(self, web3: Web3, classifier: Optional[TokenClassifier] = None):
         """
         Initializes a new instance of the ``UniswapV3Router`` class.
 
         :param web3: A ``Web3`` instance connected to a blockchain node.
         :type web3: ``Web3``
+        :param classifier: If provided, the tokens of every swap are classified with it
+            before the transaction is built, and a ``ValueError`` is raised if any of
+            them is not allowed, e.g., because it is a honeypot.
+        :type classifier: ``TokenClassifier``, optional
         """
         if str(web3.eth.chain_id) not in CONFIG.keys():
             raise ValueError(f"Unsupported chain (chain ID = {web3.eth.chain_id})")
         self.web3: Web3 = web3
-        with open(
-            os.path.join(
-                os.path.dirname(__file__), "abi", "UniswapV3SwapRouter02.json"
+        self.classifier: Optional[TokenClassifier] = classifier
+        self._weth: Optional[str] = None
+        self._pools: Dict[Tuple[str, str, int], UniswapV3Pool] = {}
+        self.contract: Contract = self.web3.eth.contract(
+            address=CONFIG[str(self.web3.eth.chain_id)]["swap_router_02"],
+            abi=load_abi(
+                os.path.join(
+                    os.path.dirname(__file__), "abi", "UniswapV3SwapRouter02.json"
+                )
             ),
-            "r",
-        ) as file:
-            self.contract: Contract = self.web3.eth.contract(
-                address=CONFIG[str(self.web3.eth.chain_id)]["swap_router_02"],
-                abi=json.load(file),
-            )
+        )
 
+    @timed
     def exact_input_single(
         self,
         amount_in: Decimal,
-        amount_out_min: Decimal,
+        amount_out_min: Optional[Decimal],
         token_in: str,
         token_out: str,
         fee: int,
@@ -47,7 +64,10 @@ class UniswapV3Router:
         deadline: Optional[int] = None,
         gas: Optional[int] = None,
         gas_price: Optional[int] = None,
-    ) -> TxReceipt:
+        permit: bool = False,
+        slippage_bps: Optional[int] = None,
+        max_state_age: int = 2,
+    ) -> SwapExecution:
         """
         Swaps an exact amount of input tokens for as many output tokens as possible, in
         a single Uniswap V3 pool defined by the token pair and fee.
@@ -79,49 +99,82 @@ class UniswapV3Router:
         :param gas_price: The gas price for the transaction in wei. If not provided, the
             current network gas price will be used.
         :type gas_price: int, optional
+        :param permit: Whether to approve the router with an EIP-2612 permit signed
+            locally and submitted in the same transaction as the swap, instead of
+            requiring a prior approval. The input token must support permits (see
+            ``ERC20Token.supports_permit``).
+        :type permit: bool, optional
+        :param slippage_bps: If provided, ``amount_out_min`` is ignored and derived
+            instead from a quote computed locally from the cached state of the pool,
+            less the given slippage tolerance in basis points. This avoids calling the
+            quoter before the swap. Like ``UniswapV3Pool.get_amount_out``, the quote
+            assumes that the swap does not cross an initialized tick. The tolerance must
+            be between 0 and 10,000.
+        :type slippage_bps: int, optional
+        :param max_state_age: The maximum age of the cached state of the pool in blocks
+            when ``slippage_bps`` is provided. Older state, e.g., not kept up to date by
+            a ``PoolStateTable``, is read again with ``sync`` before quoting.
+        :type max_state_age: int, optional
 
-        :return: The transaction receipt of the swap operation.
-        :rtype: TxReceipt
+        :return: The result of the swap parsed from the transaction receipt.
+        :rtype: ``SwapExecution``
         """
-        if gas_price is None:
-            gas_price = self.web3.eth.gas_price
+        if amount_out_min is None and slippage_bps is None:
+            raise ValueError(
+                "Either `amount_out_min` or `slippage_bps` must be provided"
+            )
         if deadline is None:
             deadline = int(time.time() + 300)
         token_in_checksum = self.web3.to_checksum_address(token_in)
         token_out_checksum = self.web3.to_checksum_address(token_out)
         account_checksum = self.web3.to_checksum_address(account)
+        self._check_tokens([token_in_checksum, token_out_checksum])
         token_in_decimals = ERC20Token(self.web3, token_in_checksum).decimals
         token_out_decimals = ERC20Token(self.web3, token_out_checksum).decimals
+        amount_in_raw = int(Decimal(amount_in) * Decimal(10**token_in_decimals))
+        if slippage_bps is None:
+            amount_out_min_raw = int(
+                Decimal(amount_out_min) * Decimal(10**token_out_decimals)
+            )
+        else:
+            amount_out_min_raw = self._amount_out_min(
+                amount_in_raw,
+                token_in_checksum,
+                token_out_checksum,
+                fee,
+                slippage_bps,
+                max_state_age,
+            )
         params = {
             "tokenIn": token_in_checksum,
             "tokenOut": token_out_checksum,
             "fee": fee,
             "recipient": self.web3.to_checksum_address(recipient),
             "deadline": deadline,
-            "amountIn": int(Decimal(amount_in) * Decimal(10**token_in_decimals)),
-            "amountOutMinimum": int(
-                Decimal(amount_out_min) * Decimal(10**token_out_decimals)
-            ),
+            "amountIn": amount_in_raw,
+            "amountOutMinimum": amount_out_min_raw,
             "sqrtPriceLimitX96": 0,
         }
-        tx = self.contract.functions.exactInputSingle(params).build_transaction(
-            {
-                "from": account_checksum,
-                "nonce": self.web3.eth.get_transaction_count(account_checksum),
-                "gasPrice": gas_price,
-            }
+        swap = self.contract.functions.exactInputSingle(params)
+        if permit:
+            swap = self._with_permit(
+                swap, token_in_checksum, amount_in, account, private_key, deadline
+            )
+        receipt = self._send(swap, account_checksum, private_key, gas, gas_price)
+        return parse_swap_receipt(
+            self.web3,
+            receipt,
+            token_in_checksum,
+            token_out_checksum,
+            account_checksum,
+            recipient,
         )
-        if gas is None:
-            gas = self.web3.eth.estimate_gas(tx)
-        tx["gas"] = gas
-        signed_tx = self.web3.eth.account.sign_transaction(tx, private_key=private_key)
-        tx_hash = self.web3.eth.send_raw_transaction(signed_tx.rawTransaction)
-        return self.web3.eth.wait_for_transaction_receipt(tx_hash)
 
+    @timed
     def exact_output_single(
         self,
         amount_out: Decimal,
-        amount_in_max: Decimal,
+        amount_in_max: Optional[Decimal],
         token_in: str,
         token_out: str,
         fee: int,
@@ -131,7 +184,10 @@ class UniswapV3Router:
         deadline: Optional[int] = None,
         gas: Optional[int] = None,
         gas_price: Optional[int] = None,
-    ) -> TxReceipt:
+        permit: bool = False,
+        slippage_bps: Optional[int] = None,
+        max_state_age: int = 2,
+    ) -> SwapExecution:
         """
         Swaps as few input tokens as possible for an exact amount of output tokens, in
         a single Uniswap V3 pool defined by the token pair and fee.
@@ -162,36 +218,348 @@ class UniswapV3Router:
         :param gas_price: The gas price for the transaction in wei. If not provided, the
             current network gas price will be used.
         :type gas_price: int, optional
+        :param permit: Whether to approve the router with an EIP-2612 permit signed
+            locally and submitted in the same transaction as the swap, instead of
+            requiring a prior approval. The input token must support permits (see
+            ``ERC20Token.supports_permit``).
+        :type permit: bool, optional
+        :param slippage_bps: If provided, ``amount_in_max`` is ignored and derived
+            instead from a quote computed locally from the cached state of the pool,
+            plus the given slippage tolerance in basis points. This avoids calling the
+            quoter before the swap. Like ``UniswapV3Pool.get_amount_out``, the quote
+            assumes that the swap does not cross an initialized tick. The tolerance must
+            be between 0 and 10,000.
+        :type slippage_bps: int, optional
+        :param max_state_age: The maximum age of the cached state of the pool in blocks
+            when ``slippage_bps`` is provided. Older state, e.g., not kept up to date by
+            a ``PoolStateTable``, is read again with ``sync`` before quoting.
+        :type max_state_age: int, optional
 
-        :return: The transaction receipt of the swap operation.
-        :rtype: TxReceipt
+        :return: The result of the swap parsed from the transaction receipt.
+        :rtype: ``SwapExecution``
         """
-        if gas_price is None:
-            gas_price = self.web3.eth.gas_price
+        if amount_in_max is None and slippage_bps is None:
+            raise ValueError(
+                "Either `amount_in_max` or `slippage_bps` must be provided"
+            )
         if deadline is None:
             deadline = int(time.time() + 300)
         token_in_checksum = self.web3.to_checksum_address(token_in)
         token_out_checksum = self.web3.to_checksum_address(token_out)
         account_checksum = self.web3.to_checksum_address(account)
+        self._check_tokens([token_in_checksum, token_out_checksum])
         token_in_decimals = ERC20Token(self.web3, token_in_checksum).decimals
         token_out_decimals = ERC20Token(self.web3, token_out_checksum).decimals
+        amount_out_raw = int(Decimal(amount_out) * Decimal(10**token_out_decimals))
+        if slippage_bps is None:
+            amount_in_max_raw = int(
+                Decimal(amount_in_max) * Decimal(10**token_in_decimals)
+            )
+        else:
+            amount_in_max_raw = self._amount_in_max(
+                amount_out_raw,
+                token_in_checksum,
+                token_out_checksum,
+                fee,
+                slippage_bps,
+                max_state_age,
+            )
         params = {
             "tokenIn": token_in_checksum,
             "tokenOut": token_out_checksum,
             "fee": fee,
             "recipient": self.web3.to_checksum_address(recipient),
             "deadline": deadline,
-            "amountOut": int(Decimal(amount_out) * Decimal(10**token_out_decimals)),
-            "amountInMaximum": int(
-                Decimal(amount_in_max) * Decimal(10**token_in_decimals)
-            ),
+            "amountOut": amount_out_raw,
+            "amountInMaximum": amount_in_max_raw,
+            "sqrtPriceLimitX96": 0,
+        }
+        swap = self.contract.functions.exactOutputSingle(params)
+        if permit:
+            swap = self._with_permit(
+                swap,
+                token_in_checksum,
+                Decimal(amount_in_max_raw) / Decimal(10**token_in_decimals),
+                account,
+                private_key,
+                deadline,
+            )
+        receipt = self._send(swap, account_checksum, private_key, gas, gas_price)
+        return parse_swap_receipt(
+            self.web3,
+            receipt,
+            token_in_checksum,
+            token_out_checksum,
+            account_checksum,
+            recipient,
+        )
+
+    @property
+    def weth(self) -> str:
+        """
+        Returns the address of the wrapped native token (e.g., WETH) used by the router
+        for swaps to and from the native token.
+
+        :return: The address of the wrapped native token.
+        :rtype: str
+        """
+        record_cache("UniswapV3Router.weth", self._weth is not None)
+        if self._weth is None:
+            self._weth = self.contract.functions.WETH9().call()
+        return self._weth
+
+    @timed
+    def exact_input_single_eth_for_tokens(
+        self,
+        amount_in: Decimal,
+        amount_out_min: Optional[Decimal],
+        token_out: str,
+        fee: int,
+        recipient: str,
+        account: str,
+        private_key: str,
+        deadline: Optional[int] = None,
+        gas: Optional[int] = None,
+        gas_price: Optional[int] = None,
+        slippage_bps: Optional[int] = None,
+        max_state_age: int = 2,
+    ) -> SwapExecution:
+        """
+        Swaps an exact amount of the native token (e.g., ETH) for as many output tokens
+        as possible, in the Uniswap V3 pool defined by ``weth``, ``token_out``, and the
+        fee. The native token is sent with the transaction and wrapped by the router,
+        so no separate wrapping transaction is needed.
+
+        :param amount_in: The amount of the native token to send.
+        :type amount_in: ``Decimal``
+        :param amount_out_min: The minimum amount of output tokens that must be received
+            for the transaction not to revert.
+        :type amount_out_min: ``Decimal``
+        :param token_out: The address of the output token.
+        :type token_out: str
+        :param fee: The pool's fee denominated in hundredths of a basis point (i.e.,
+            1e-6). Must be one of the following: 500, 3000, 10000.
+        :type fee: int
+        :param recipient: The recipient of the output tokens.
+        :type recipient: str
+        :param account: The account address from which the transaction will be sent.
+        :type account: str
+        :param private_key: The private key of the account.
+        :type private_key: str
+        :param deadline: The Unix timestamp after which the transaction will revert. If
+            not provided, it will be set to five minutes from the current time.
+        :type deadline: int, optional
+        :param gas: The gas limit for the transaction. If not provided, it will be
+            estimated automatically.
+        :type gas: int, optional
+        :param gas_price: The gas price for the transaction in wei. If not provided, the
+            current network gas price will be used.
+        :type gas_price: int, optional
+        :param slippage_bps: If provided, ``amount_out_min`` is ignored and derived
+            instead from a quote computed locally from the cached state of the pool,
+            less the given slippage tolerance in basis points. This avoids calling the
+            quoter before the swap. Like ``UniswapV3Pool.get_amount_out``, the quote
+            assumes that the swap does not cross an initialized tick. The tolerance must
+            be between 0 and 10,000.
+        :type slippage_bps: int, optional
+        :param max_state_age: The maximum age of the cached state of the pool in blocks
+            when ``slippage_bps`` is provided. Older state, e.g., not kept up to date by
+            a ``PoolStateTable``, is read again with ``sync`` before quoting.
+        :type max_state_age: int, optional
+
+        :return: The result of the swap parsed from the transaction receipt.
+        :rtype: ``SwapExecution``
+        """
+        if amount_out_min is None and slippage_bps is None:
+            raise ValueError(
+                "Either `amount_out_min` or `slippage_bps` must be provided"
+            )
+        if deadline is None:
+            deadline = int(time.time() + 300)
+        token_out_checksum = self.web3.to_checksum_address(token_out)
+        account_checksum = self.web3.to_checksum_address(account)
+        self._check_tokens([token_out_checksum])
+        token_out_decimals = ERC20Token(self.web3, token_out_checksum).decimals
+        amount_in_wei = self.web3.to_wei(Decimal(amount_in), "ether")
+        if slippage_bps is None:
+            amount_out_min_raw = int(
+                Decimal(amount_out_min) * Decimal(10**token_out_decimals)
+            )
+        else:
+            amount_out_min_raw = self._amount_out_min(
+                amount_in_wei,
+                self.weth,
+                token_out_checksum,
+                fee,
+                slippage_bps,
+                max_state_age,
+            )
+        params = {
+            "tokenIn": self.weth,
+            "tokenOut": token_out_checksum,
+            "fee": fee,
+            "recipient": self.web3.to_checksum_address(recipient),
+            "amountIn": amount_in_wei,
+            "amountOutMinimum": amount_out_min_raw,
+            "sqrtPriceLimitX96": 0,
+        }
+        swap = self.contract.functions.multicall(
+            deadline,
+            [self.contract.encodeABI(fn_name="exactInputSingle", args=[params])],
+        )
+        receipt = self._send(
+            swap, account_checksum, private_key, gas, gas_price, value=amount_in_wei
+        )
+        return parse_swap_receipt(
+            self.web3,
+            receipt,
+            self.weth,
+            token_out_checksum,
+            account_checksum,
+            recipient,
+            native_in=True,
+        )
+
+    @timed
+    def exact_input_single_tokens_for_eth(
+        self,
+        amount_in: Decimal,
+        amount_out_min: Optional[Decimal],
+        token_in: str,
+        fee: int,
+        recipient: str,
+        account: str,
+        private_key: str,
+        deadline: Optional[int] = None,
+        gas: Optional[int] = None,
+        gas_price: Optional[int] = None,
+        slippage_bps: Optional[int] = None,
+        max_state_age: int = 2,
+    ) -> SwapExecution:
+        """
+        Swaps an exact amount of input tokens for as much of the native token (e.g.,
+        ETH) as possible, in the Uniswap V3 pool defined by ``token_in``, ``weth``, and
+        the fee. The swap and unwrapping the output with ``unwrapWETH9`` are executed
+        in the same transaction.
+
+        :param amount_in: The amount of input tokens to send.
+        :type amount_in: ``Decimal``
+        :param amount_out_min: The minimum amount of the native token that must be
+            received for the transaction not to revert.
+        :type amount_out_min: ``Decimal``
+        :param token_in: The address of the input token.
+        :type token_in: str
+        :param fee: The pool's fee denominated in hundredths of a basis point (i.e.,
+            1e-6). Must be one of the following: 500, 3000, 10000.
+        :type fee: int
+        :param recipient: The recipient of the output native token.
+        :type recipient: str
+        :param account: The account address from which the transaction will be sent.
+        :type account: str
+        :param private_key: The private key of the account.
+        :type private_key: str
+        :param deadline: The Unix timestamp after which the transaction will revert. If
+            not provided, it will be set to five minutes from the current time.
+        :type deadline: int, optional
+        :param gas: The gas limit for the transaction. If not provided, it will be
+            estimated automatically.
+        :type gas: int, optional
+        :param gas_price: The gas price for the transaction in wei. If not provided, the
+            current network gas price will be used.
+        :type gas_price: int, optional
+        :param slippage_bps: If provided, ``amount_out_min`` is ignored and derived
+            instead from a quote computed locally from the cached state of the pool,
+            less the given slippage tolerance in basis points. This avoids calling the
+            quoter before the swap. Like ``UniswapV3Pool.get_amount_out``, the quote
+            assumes that the swap does not cross an initialized tick. The tolerance must
+            be between 0 and 10,000.
+        :type slippage_bps: int, optional
+        :param max_state_age: The maximum age of the cached state of the pool in blocks
+            when ``slippage_bps`` is provided. Older state, e.g., not kept up to date by
+            a ``PoolStateTable``, is read again with ``sync`` before quoting.
+        :type max_state_age: int, optional
+
+        :return: The result of the swap parsed from the transaction receipt.
+        :rtype: ``SwapExecution``
+        """
+        if amount_out_min is None and slippage_bps is None:
+            raise ValueError(
+                "Either `amount_out_min` or `slippage_bps` must be provided"
+            )
+        if deadline is None:
+            deadline = int(time.time() + 300)
+        token_in_checksum = self.web3.to_checksum_address(token_in)
+        account_checksum = self.web3.to_checksum_address(account)
+        self._check_tokens([token_in_checksum])
+        token_in_decimals = ERC20Token(self.web3, token_in_checksum).decimals
+        amount_in_raw = int(Decimal(amount_in) * Decimal(10**token_in_decimals))
+        if slippage_bps is None:
+            amount_out_min_wei = self.web3.to_wei(Decimal(amount_out_min), "ether")
+        else:
+            amount_out_min_wei = self._amount_out_min(
+                amount_in_raw,
+                token_in_checksum,
+                self.weth,
+                fee,
+                slippage_bps,
+                max_state_age,
+            )
+        params = {
+            "tokenIn": token_in_checksum,
+            "tokenOut": self.weth,
+            "fee": fee,
+            # The router keeps the output so that it can be unwrapped
+            "recipient": ADDRESS_THIS,
+            "amountIn": amount_in_raw,
+            "amountOutMinimum": amount_out_min_wei,
             "sqrtPriceLimitX96": 0,
         }
-        tx = self.contract.functions.exactOutputSingle(params).build_transaction(
+        swap = self.contract.functions.multicall(
+            deadline,
+            [
+                self.contract.encodeABI(fn_name="exactInputSingle", args=[params]),
+                self.contract.encodeABI(
+                    fn_name="unwrapWETH9",
+                    args=[
+                        amount_out_min_wei,
+                        self.web3.to_checksum_address(recipient),
+                    ],
+                ),
+            ],
+        )
+        receipt = self._send(swap, account_checksum, private_key, gas, gas_price)
+        return parse_swap_receipt(
+            self.web3,
+            receipt,
+            token_in_checksum,
+            self.weth,
+            account_checksum,
+            recipient,
+            native_out=True,
+        )
+
+    def _check_tokens(self, tokens: List[str]) -> None:
+        # Rejects honeypots and tokens that take a fee before building a transaction
+        if self.classifier is not None:
+            self.classifier.check(tokens)
+
+    def _send(
+        self,
+        function: ContractFunction,
+        account: str,
+        private_key: str,
+        gas: Optional[int],
+        gas_price: Optional[int],
+        value: int = 0,
+    ) -> TxReceipt:
+        if gas_price is None:
+            gas_price = self.web3.eth.gas_price
+        tx = function.build_transaction(
             {
-                "from": account_checksum,
-                "nonce": self.web3.eth.get_transaction_count(account_checksum),
+                "from": account,
+                "nonce": self.web3.eth.get_transaction_count(account),
                 "gasPrice": gas_price,
+                "value": value,
             }
         )
         if gas is None:
@@ -200,3 +568,138 @@ class UniswapV3Router:
         signed_tx = self.web3.eth.account.sign_transaction(tx, private_key=private_key)
         tx_hash = self.web3.eth.send_raw_transaction(signed_tx.rawTransaction)
         return self.web3.eth.wait_for_transaction_receipt(tx_hash)
+
+    def _cached_pool(
+        self, token_a: str, token_b: str, fee: int, max_state_age: int
+    ) -> UniswapV3Pool:
+        key = (token_a, token_b, fee) if token_a < token_b else (token_b, token_a, fee)
+        if key not in self._pools:
+            address = UniswapV3Factory(self.web3).get_pool(token_a, token_b, fee)
+            if int(address, 16) == 0:
+                raise ValueError(
+                    f"No Uniswap V3 pool for {token_a} and {token_b} with fee {fee}"
+                )
+            self._pools[key] = UniswapV3Pool(self.web3, address)
+        pool = self._pools[key]
+        block_number = self.web3.eth.block_number
+        fresh = (
+            pool.block_number is not None
+            and block_number - pool.block_number <= max_state_age
+        )
+        record_cache("UniswapV3Router.pool_state", fresh)
+        if not fresh:
+            pool.sync(block_number)
+        return pool
+
+    def _amount_out_min(
+        self,
+        amount_in: int,
+        token_in: str,
+        token_out: str,
+        fee: int,
+        slippage_bps: int,
+        max_state_age: int,
+    ) -> int:
+        if not 0 <= slippage_bps <= 10_000:
+            raise ValueError("`slippage_bps` must be between 0 and 10,000")
+        pool = self._cached_pool(token_in, token_out, fee, max_state_age)
+        amount_out = pool._amount_out(amount_in, token_in == pool.token_0.address)
+        return amount_out * (10_000 - slippage_bps) // 10_000
+
+    def _amount_in_max(
+        self,
+        amount_out: int,
+        token_in: str,
+        token_out: str,
+        fee: int,
+        slippage_bps: int,
+        max_state_age: int,
+    ) -> int:
+        if not 0 <= slippage_bps <= 10_000:
+            raise ValueError("`slippage_bps` must be between 0 and 10,000")
+        pool = self._cached_pool(token_in, token_out, fee, max_state_age)
+        amount_in = pool._amount_in(amount_out, token_in == pool.token_0.address)
+        return -(-amount_in * (10_000 + slippage_bps) // 10_000)
+
+    def _with_permit(
+        self,
+        swap: ContractFunction,
+        token: str,
+        value: Decimal,
+        account: str,
+        private_key: str,
+        deadline: int,
+    ) -> ContractFunction:
+        # Bundles the permit and the swap with ``multicall``. ``selfPermitIfNecessary``
+        # skips the permit if the allowance is already sufficient.
+        permit = ERC20Token(self.web3, token).sign_permit(
+            self.contract.address, value, account, private_key, deadline
+        )
+        return self.contract.functions.multicall(
+            deadline,
+            [
+                self.contract.encodeABI(
+                    fn_name="selfPermitIfNecessary",
+                    args=[
+                        token,
+                        permit.value,
+                        permit.deadline,
+                        permit.v,
+                        permit.r,
+                        permit.s,
+                    ],
+                ),
+                self.contract.encodeABI(fn_name=swap.fn_name, args=list(swap.args)),
+            ],
+        )
+
+    @timed
+    def simulate_exact_input_single(
+        self,
+        candidates: Sequence[Tuple[Decimal, str, str, int]],
+        account: Optional[str] = None,
+        block_identifier: BlockIdentifier = "latest",
+        max_workers: int = 8,
+    ) -> List[SwapSimulation]:
+        """
+        Simulates ``exactInputSingle`` for many candidate swaps with ``eth_call``
+        without sending transactions, returning the amount of output tokens and the gas
+        used by each swap, or the revert reason. The candidates are simulated
+        concurrently on top of the same block and independently of each other. The
+        balance and allowance of the input token are overridden in the simulation, so
+        the account does not need to hold the input tokens or have approved the router.
+
+        :param candidates: The amount of input tokens, the address of the input token,
+            the address of the output token, and the pool's fee of each swap, as in
+            ``exact_input_single``.
+        :type candidates: Sequence[Tuple[``Decimal``, str, str, int]]
+        :param account: The account from which the swaps are simulated. The output
+            tokens are sent to the same account. If not provided, a placeholder account
+            is used.
+        :type account: str, optional
+        :param block_identifier: The block on top of which the swaps are simulated.
+        :type block_identifier: ``BlockIdentifier``, optional
+        :param max_workers: The maximum number of concurrent ``eth_call`` requests.
+        :type max_workers: int, optional
+
+        :return: The results of the simulations in the same order as ``candidates``.
+        :rtype: List[``SwapSimulation``]
+        """
+        account_checksum = self.web3.to_checksum_address(
+            SIMULATION_ACCOUNT if account is None else account
+        )
+        swaps = []
+        for amount_in, token_in_address, token_out_address, fee in candidates:
+            token_in = ERC20Token(self.web3, token_in_address)
+            token_out = ERC20Token(self.web3, token_out_address)
+            amount_in_raw = int(Decimal(amount_in) * Decimal(10**token_in.decimals))
+            # (tokenIn, tokenOut, fee, recipient, amountIn, amountOutMinimum,
+            # sqrtPriceLimitX96)
+            params = (token_in.address, token_out.address, fee, account_checksum)
+            call = self.contract.functions.exactInputSingle(
+                params + (amount_in_raw, 0, 0)
+            )
+            swaps.append((call, token_in, amount_in_raw, token_out))
+        return simulate_swaps(
+            self.web3, account_checksum, swaps, block_identifier, max_workers
+        )
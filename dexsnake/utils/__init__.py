@@ -1 +1,24 @@
-from .erc20_token import ERC20Token
+import importlib
+
+_ATTRIBUTES = {
+    "ERC20Token": ".erc20_token",
+    "LoadBalancedProvider": ".provider",
+    "Multicall3": ".multicall",
+    "Permit": ".erc20_token",
+    "PortfolioManager": ".portfolio",
+    "RpcCassette": ".cassette",
+    "SwapExecution": ".execution",
+    "SwapSimulation": ".simulation",
+    "TokenClassification": ".classifier",
+    "TokenClassifier": ".classifier",
+    "TwapOracle": ".oracle",
+}
+
+__all__ = list(_ATTRIBUTES)
+
+
+def __getattr__(name):
+    # The modules are imported on first access
+    if name in _ATTRIBUTES:
+        return getattr(importlib.import_module(_ATTRIBUTES[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,18 @@
+import functools
+import json
+from typing import Any, Dict, List
+
+
+@functools.lru_cache(maxsize=None)
+def load_abi(path: str) -> List[Dict[str, Any]]:
+    """
+    Returns the ABI in the JSON file at ``path``. Each file is read only once.
+
+    :param path: The path of the JSON file.
+    :type path: str
+
+    :return: The ABI.
+    :rtype: List[Dict[str, Any]]
+    """
+    with open(path, "r") as file:
+        return json.load(file)
@@ -0,0 +1,183 @@
+import gzip
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from web3 import Web3
+from web3.types import RPCEndpoint, RPCResponse
+
+CASSETTE_VERSION = 1
+MODES = ("record", "replay", "auto")
+
+
+def _default(value: Any) -> Any:
+    # Most parameters are already hex strings when they reach the innermost layer,
+    # but raw bytes can be passed to ``make_request`` directly
+    if isinstance(value, (bytes, bytearray)):
+        return "0x" + bytes(value).hex()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _key(method: RPCEndpoint, params: Any) -> str:
+    # The block number or tag of a request is one of its parameters, so the key
+    # distinguishes the same call at different blocks
+    return json.dumps(
+        [method, params], separators=(",", ":"), sort_keys=True, default=_default
+    )
+
+
+class RpcCassette:
+    def __init__(self, path: str, mode: str = "auto"):
+        """
+        Initializes a new instance of the ``RpcCassette`` class.
+
+        The cassette records the JSON-RPC responses received through a ``Web3``
+        instance and replays them without a node, so that backtests and benchmarks can
+        be re-run deterministically and at memory speed with every class in Dexsnake.
+        The responses are keyed by method and parameters, which include the block
+        number or tag, and stored in a gzipped JSON file. Because the responses to
+        requests for the latest block change over time, every key holds the responses
+        in the order in which they were received, and the n-th identical request in a
+        replay receives the n-th recorded response, or the last one if fewer were
+        recorded. Consecutive identical responses are stored once with a count, so
+        repeated requests for a fixed block take no extra space.
+
+        In ``"record"`` mode, every request is sent to the node and its response is
+        recorded, replacing earlier recordings of the same requests. In ``"replay"``
+        mode, nothing is sent to the node and a request without a recording raises a
+        ``ValueError``. In ``"auto"`` mode, recorded requests are replayed and the
+        others are sent to the node and recorded. Replays are deterministic only if
+        the requests are made in the same order, i.e., from a single thread. A request
+        is only replayed if its parameters are identical to the recorded ones, so
+        parameters that are otherwise derived from the clock, such as the default
+        ``deadline`` of swaps, which ends up in the calldata of ``eth_estimateGas`` and
+        ``eth_sendRawTransaction``, must be given fixed values.
+
+        The cassette is added to a ``Web3`` instance with ``install``, e.g.,
+        ``RpcCassette("run.json.gz").install(web3)``, and is written to ``path`` with
+        ``save`` or on leaving a ``with`` block.
+
+        :param path: The path of the cassette file, which is loaded if it exists.
+        :type path: str
+        :param mode: ``"record"``, ``"replay"``, or ``"auto"``.
+        :type mode: str, optional
+        """
+        if mode not in MODES:
+            raise ValueError(f"`mode` must be one of {', '.join(MODES)}")
+        self.path: str = path
+        self.mode: str = mode
+        # The runs of identical responses to each request, as [count, response]
+        self._runs: Dict[str, List[List[Any]]] = {}
+        # The number of times each request has been made since the cassette was
+        # loaded or rewound
+        self._counts: Dict[str, int] = {}
+        self._recorded: Set[str] = set()
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with gzip.open(path, "rt") as file:
+                data = json.load(file)
+            if data["version"] != CASSETTE_VERSION:
+                raise ValueError(
+                    f"Unsupported cassette version {data['version']} (expected "
+                    f"{CASSETTE_VERSION})"
+                )
+            self._runs = data["requests"]
+        elif mode == "replay":
+            raise FileNotFoundError(f"No cassette at {path}")
+
+    def __str__(self) -> str:
+        return f"RpcCassette({self.path}, {self.mode})"
+
+    def __len__(self) -> int:
+        return len(self._runs)
+
+    def __enter__(self) -> "RpcCassette":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.save()
+
+    def install(self, web3: Web3) -> Web3:
+        """
+        Adds the cassette to ``web3`` as the innermost middleware, so that it records
+        and replays the raw responses of the provider.
+
+        :param web3: A ``Web3`` instance. In ``"replay"`` mode, its provider is never
+            used, e.g., ``Web3(Web3.HTTPProvider())`` works without a node.
+        :type web3: ``Web3``
+
+        :return: The same ``Web3`` instance.
+        :rtype: ``Web3``
+        """
+        if "dexsnake_cassette" not in web3.middleware_onion:
+            web3.middleware_onion.inject(
+                self._middleware, name="dexsnake_cassette", layer=0
+            )
+        return web3
+
+    def rewind(self) -> None:
+        """
+        Replays the recorded responses from the start, e.g., before re-running a
+        backtest with the same ``Web3`` instance.
+        """
+        with self._lock:
+            self._counts.clear()
+            self._recorded.clear()
+
+    def save(self) -> None:
+        """
+        Writes the recorded responses to ``path``.
+        """
+        with self._lock:
+            data = {"version": CASSETTE_VERSION, "requests": self._runs}
+            # The file is replaced atomically so that an interrupted save does not
+            # corrupt an existing cassette
+            temporary_path = f"{self.path}.tmp"
+            with gzip.open(temporary_path, "wt") as file:
+                json.dump(data, file, separators=(",", ":"))
+            os.replace(temporary_path, self.path)
+
+    def _lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        runs = self._runs.get(key)
+        if runs is None:
+            return None
+        index = self._counts.get(key, 0)
+        self._counts[key] = index + 1
+        for count, response in runs:
+            if index < count:
+                return response
+            index -= count
+        return runs[-1][1]
+
+    def _record(self, key: str, response: Dict[str, Any]) -> None:
+        if key not in self._recorded:
+            # The first response in a recording replaces the earlier recordings
+            self._recorded.add(key)
+            self._runs[key] = []
+        runs = self._runs[key]
+        if runs and runs[-1][1] == response:
+            runs[-1][0] += 1
+        else:
+            runs.append([1, response])
+
+    def _middleware(
+        self, make_request: Callable[[RPCEndpoint, Any], RPCResponse], web3: Web3
+    ) -> Callable[[RPCEndpoint, Any], RPCResponse]:
+        def middleware(method: RPCEndpoint, params: Any) -> RPCResponse:
+            key = _key(method, params)
+            if self.mode != "record":
+                with self._lock:
+                    response = None if key in self._recorded else self._lookup(key)
+                if response is not None:
+                    return {"jsonrpc": "2.0", "id": 0, **response}
+                if self.mode == "replay":
+                    raise ValueError(f"No recorded response to {method} {params}")
+            response = make_request(method, params)
+            # Only the result or the error is stored to keep the cassette compact
+            stored = {k: v for k, v in response.items() if k in ("result", "error")}
+            with self._lock:
+                self._record(key, stored)
+            return response
+
+        return middleware
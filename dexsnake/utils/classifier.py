@@ -0,0 +1,447 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import eth_abi
+from eth_abi.exceptions import DecodingError
+from web3 import Web3
+from web3.contract import Contract
+from web3.types import BlockIdentifier
+
+from ..uniswap_v2.config import CONFIG as UNISWAP_V2_CONFIG
+from ..uniswap_v2.factory import UniswapV2Factory
+from ..uniswap_v2.pair import UniswapV2Pair
+from .abi import load_abi
+from .erc20_token import ERC20Token
+from .metrics import record_cache, timed
+from .registry import get_chain_id
+from .simulation import (
+    MAX_UINT256,
+    SIMULATION_ACCOUNT,
+    revert_reason,
+    simulate_sequence,
+    token_state_override,
+)
+
+CLASSIFIER_VERSION = 1
+
+
+@dataclass
+class TokenClassification:
+    """
+    The result of classifying a token with ``TokenClassifier``.
+
+    :ivar token: The address of the token.
+    :ivar chain_id: The chain ID.
+    :ivar classified: Whether the round trip could be simulated. If not, ``error``
+        tells why, e.g., the token has no Uniswap V2 pair with the base token.
+    :ivar honeypot: Whether buying or selling the token reverted or returned nothing.
+    :ivar buy_tax: The fraction of the bought tokens that was not received.
+    :ivar sell_tax: The fraction of the sold tokens that did not reach the pair.
+    :ivar block_number: The block on top of which the round trip was simulated.
+    :ivar error: The reason why the token is a honeypot or could not be classified.
+    """
+
+    token: str
+    chain_id: int
+    classified: bool
+    honeypot: bool
+    buy_tax: Decimal
+    sell_tax: Decimal
+    block_number: int
+    error: Optional[str]
+
+    @property
+    def fee_on_transfer(self) -> bool:
+        """
+        Returns whether the token takes a fee when it is bought or sold.
+
+        :return: Whether the token takes a fee on transfer.
+        :rtype: bool
+        """
+        return self.buy_tax > 0 or self.sell_tax > 0
+
+
+class TokenClassifier:
+    def __init__(
+        self,
+        web3: Web3,
+        path: Optional[str] = None,
+        base_token: Optional[str] = None,
+        max_tax: Decimal = Decimal(0),
+        allow_unclassified: bool = True,
+    ):
+        """
+        Initializes a new instance of the ``TokenClassifier`` class.
+
+        The classifier detects tokens that take a fee on transfer and honeypots, i.e.,
+        tokens that can be bought but not sold, before any transaction is built. A
+        token is classified by simulating a round trip through its Uniswap V2 pair
+        with ``base_token``: 0.1% of the pair's reserve of ``base_token`` is swapped
+        for the token and the received tokens are swapped back, all in one
+        ``eth_call`` whose state override gives a placeholder account the input
+        tokens. The taxes are measured by comparing the amounts received with the
+        amounts quoted by the router. The classifications are cached per chain and
+        token, and saved to ``path`` so that they persist across runs.
+
+        ``UniswapV2Router``, ``UniswapV3Router``, and ``ArbitrageScanner`` consult the
+        classifier if it is given to them, e.g.,
+        ``UniswapV2Router(web3, classifier=TokenClassifier(web3, "tokens.json"))``.
+
+        :param web3: A ``Web3`` instance connected to a blockchain node.
+        :type web3: ``Web3``
+        :param path: The path of the JSON file in which the classifications are saved.
+            It is loaded if it exists. If not provided, the classifications are only
+            cached in memory.
+        :type path: str, optional
+        :param base_token: The address of the token for which the tokens are bought
+            and sold. If not provided, the wrapped native token (e.g., WETH) is used.
+        :type base_token: str, optional
+        :param max_tax: The maximum buy and sell tax of an allowed token as a
+            fraction, e.g., ``Decimal("0.01")`` for 1%. By default, every token that
+            takes a fee on transfer is rejected.
+        :type max_tax: ``Decimal``, optional
+        :param allow_unclassified: Whether tokens that could not be classified are
+            allowed.
+        :type allow_unclassified: bool, optional
+        """
+        chain_id = get_chain_id(web3)
+        if str(chain_id) not in UNISWAP_V2_CONFIG.keys():
+            raise ValueError(f"Unsupported chain (chain ID = {chain_id})")
+        self.web3: Web3 = web3
+        self.chain_id: int = chain_id
+        self.path: Optional[str] = path
+        self.max_tax: Decimal = Decimal(max_tax)
+        self.allow_unclassified: bool = allow_unclassified
+        self.router: Contract = self.web3.eth.contract(
+            address=UNISWAP_V2_CONFIG[str(chain_id)]["router_02"],
+            abi=load_abi(
+                os.path.join(
+                    os.path.dirname(os.path.dirname(__file__)),
+                    "uniswap_v2",
+                    "abi",
+                    "UniswapV2Router02.json",
+                )
+            ),
+        )
+        self.base_token: str = self.web3.to_checksum_address(
+            self.router.functions.WETH().call() if base_token is None else base_token
+        )
+        self._classifications: Dict[Tuple[int, str], TokenClassification] = {}
+        self._lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            self._load(path)
+
+    def __str__(self) -> str:
+        return f"TokenClassifier({self.base_token})"
+
+    def _load(self, path: str) -> None:
+        with open(path, "r") as file:
+            data = json.load(file)
+        if data["version"] != CLASSIFIER_VERSION:
+            raise ValueError(
+                f"Unsupported classifier version {data['version']} (expected "
+                f"{CLASSIFIER_VERSION})"
+            )
+        for key, value in data["tokens"].items():
+            chain_id, token = key.split(":")
+            self._classifications[(int(chain_id), token)] = TokenClassification(
+                token=token,
+                chain_id=int(chain_id),
+                classified=True,
+                honeypot=value["honeypot"],
+                buy_tax=Decimal(value["buy_tax"]),
+                sell_tax=Decimal(value["sell_tax"]),
+                block_number=value["block_number"],
+                error=value["error"],
+            )
+
+    def _save(self) -> None:
+        # Tokens that could not be classified are not saved, so that they are tried
+        # again in later runs, e.g., once they have a pair. The other chains in an
+        # existing file are kept.
+        tokens = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r") as file:
+                tokens = json.load(file)["tokens"]
+        for classification in self._classifications.values():
+            if classification.classified:
+                tokens[f"{classification.chain_id}:{classification.token}"] = {
+                    "honeypot": classification.honeypot,
+                    "buy_tax": str(classification.buy_tax),
+                    "sell_tax": str(classification.sell_tax),
+                    "block_number": classification.block_number,
+                    "error": classification.error,
+                }
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w") as file:
+            json.dump({"version": CLASSIFIER_VERSION, "tokens": tokens}, file)
+        os.replace(temporary_path, self.path)
+
+    @timed
+    def classify(
+        self,
+        token: str,
+        refresh: bool = False,
+        block_identifier: BlockIdentifier = "latest",
+    ) -> TokenClassification:
+        """
+        Returns the cached classification of ``token``, or classifies it by simulating
+        a round trip if it has not been classified yet.
+
+        :param token: The address of the token.
+        :type token: str
+        :param refresh: Whether to classify the token again even if it is cached, e.g.,
+            because the owner of the token can change its taxes.
+        :type refresh: bool, optional
+        :param block_identifier: The block on top of which the round trip is simulated.
+        :type block_identifier: ``BlockIdentifier``, optional
+
+        :return: The classification.
+        :rtype: ``TokenClassification``
+        """
+        classification, computed = self._classify(token, refresh, block_identifier)
+        # The file is only written when a new verdict has been simulated, so that
+        # lookups of cached tokens stay in memory
+        if self.path is not None and computed and classification.classified:
+            with self._lock:
+                self._save()
+        return classification
+
+    @timed
+    def classify_all(
+        self,
+        tokens: Iterable[str],
+        block_identifier: BlockIdentifier = "latest",
+        max_workers: int = 8,
+    ) -> Dict[str, TokenClassification]:
+        """
+        Classifies many tokens concurrently with ``classify``.
+
+        :param tokens: The addresses of the tokens.
+        :type tokens: Iterable[str]
+        :param block_identifier: The block on top of which the round trips are
+            simulated.
+        :type block_identifier: ``BlockIdentifier``, optional
+        :param max_workers: The maximum number of tokens classified concurrently.
+        :type max_workers: int, optional
+
+        :return: The classifications keyed by token address.
+        :rtype: Dict[str, ``TokenClassification``]
+        """
+        tokens = list({self.web3.to_checksum_address(token) for token in tokens})
+        if block_identifier == "latest":
+            block_identifier = self.web3.eth.block_number
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(
+                executor.map(
+                    lambda token: self._classify(token, False, block_identifier),
+                    tokens,
+                )
+            )
+        # The file is written once rather than after every token, and only if a new
+        # verdict has been simulated
+        if self.path is not None and any(
+            computed and classification.classified
+            for classification, computed in results
+        ):
+            with self._lock:
+                self._save()
+        return {
+            token: classification for token, (classification, _) in zip(tokens, results)
+        }
+
+    def _classify(
+        self, token: str, refresh: bool, block_identifier: BlockIdentifier
+    ) -> Tuple[TokenClassification, bool]:
+        # Returns the classification and whether it was computed rather than cached
+        token = self.web3.to_checksum_address(token)
+        key = (self.chain_id, token)
+        with self._lock:
+            classification = self._classifications.get(key)
+        record_cache(
+            "TokenClassifier.classification", classification is not None and not refresh
+        )
+        if classification is not None and not refresh:
+            return classification, False
+        if block_identifier == "latest":
+            block_identifier = self.web3.eth.block_number
+        if token == self.base_token:
+            classification = TokenClassification(
+                token,
+                self.chain_id,
+                True,
+                False,
+                Decimal(0),
+                Decimal(0),
+                block_identifier,
+                None,
+            )
+        else:
+            classification = self._simulate(token, block_identifier)
+        with self._lock:
+            self._classifications[key] = classification
+        return classification, True
+
+    def is_allowed(self, token: str) -> bool:
+        """
+        Returns whether ``token`` is neither a honeypot nor takes a fee above
+        ``max_tax``, classifying it first if needed.
+
+        :param token: The address of the token.
+        :type token: str
+
+        :return: Whether the token is allowed.
+        :rtype: bool
+        """
+        return self._rejection(self.classify(token)) is None
+
+    def check(self, tokens: Iterable[str]) -> None:
+        """
+        Raises a ``ValueError`` if any of ``tokens`` is not allowed (see
+        ``is_allowed``).
+
+        :param tokens: The addresses of the tokens.
+        :type tokens: Iterable[str]
+        """
+        for token in tokens:
+            reason = self._rejection(self.classify(token))
+            if reason is not None:
+                raise ValueError(f"Token {token} is rejected: {reason}")
+
+    def _rejection(self, classification: TokenClassification) -> Optional[str]:
+        if not classification.classified:
+            if self.allow_unclassified:
+                return None
+            return f"it could not be classified ({classification.error})"
+        if classification.honeypot:
+            return f"it is a honeypot ({classification.error})"
+        if max(classification.buy_tax, classification.sell_tax) > self.max_tax:
+            return (
+                f"it takes a fee on transfer (buy tax = {classification.buy_tax:.4f}, "
+                f"sell tax = {classification.sell_tax:.4f})"
+            )
+        return None
+
+    def _simulate(self, token: str, block_number: int) -> TokenClassification:
+        def result(
+            classified: bool,
+            honeypot: bool = False,
+            buy_tax: Decimal = Decimal(0),
+            sell_tax: Decimal = Decimal(0),
+            error: Optional[str] = None,
+        ) -> TokenClassification:
+            return TokenClassification(
+                token,
+                self.chain_id,
+                classified,
+                honeypot,
+                buy_tax,
+                sell_tax,
+                block_number,
+                error,
+            )
+
+        base = self.base_token
+        pair_address = UniswapV2Factory(self.web3).get_pair(base, token)
+        if int(pair_address, 16) == 0:
+            return result(False, error=f"No Uniswap V2 pair for {token} and {base}")
+        pair = UniswapV2Pair(self.web3, pair_address)
+        pair.sync(block_number)
+        reserve = pair.reserve_0 if pair.token_0.address == base else pair.reserve_1
+        amount = reserve // 1000
+        if amount == 0:
+            return result(False, error=f"No liquidity in {pair_address}")
+        state_override = token_state_override(
+            ERC20Token(self.web3, base),
+            SIMULATION_ACCOUNT,
+            amount,
+            self.router.address,
+            block_number,
+        )
+        if not state_override:
+            return result(False, error=f"The balance of {base} can not be overridden")
+
+        token_contract = ERC20Token(self.web3, token).contract
+        base_contract = ERC20Token(self.web3, base).contract
+        deadline = int(time.time() + 300)
+
+        def encode(contract: Contract, fn_name: str, args: List) -> Tuple[str, bytes]:
+            data = contract.encodeABI(fn_name=fn_name, args=args)
+            return contract.address, bytes.fromhex(data[2:])
+
+        buy = encode(
+            self.router,
+            "swapExactTokensForTokensSupportingFeeOnTransferTokens",
+            [amount, 0, [base, token], SIMULATION_ACCOUNT, deadline],
+        )
+        # The amount bought is needed to sell it, so the buy is simulated first on its
+        # own and then again followed by the sell
+        try:
+            results = simulate_sequence(
+                self.web3,
+                SIMULATION_ACCOUNT,
+                [
+                    encode(self.router, "getAmountsOut", [amount, [base, token]]),
+                    buy,
+                    encode(token_contract, "balanceOf", [SIMULATION_ACCOUNT]),
+                ],
+                state_override,
+                block_number,
+            )
+            expected = eth_abi.decode(["uint256[]"], results[0][1])[0][-1]
+            if expected == 0:
+                return result(False, error=f"No output quoted for {amount} of {base}")
+            if not results[1][0]:
+                reason = revert_reason(results[1][1])
+                return result(True, True, error=f"Buy reverted: {reason}")
+            bought = eth_abi.decode(["uint256"], results[2][1])[0]
+            if bought == 0:
+                return result(True, True, error="Nothing received when buying")
+            buy_tax = max(Decimal(0), 1 - Decimal(bought) / Decimal(expected))
+            results = simulate_sequence(
+                self.web3,
+                SIMULATION_ACCOUNT,
+                [
+                    buy,
+                    encode(
+                        token_contract, "approve", [self.router.address, MAX_UINT256]
+                    ),
+                    encode(self.router, "getAmountsOut", [bought, [token, base]]),
+                    encode(base_contract, "balanceOf", [SIMULATION_ACCOUNT]),
+                    encode(
+                        self.router,
+                        "swapExactTokensForTokensSupportingFeeOnTransferTokens",
+                        [bought, 0, [token, base], SIMULATION_ACCOUNT, deadline],
+                    ),
+                    encode(base_contract, "balanceOf", [SIMULATION_ACCOUNT]),
+                ],
+                state_override,
+                block_number,
+            )
+            if not results[1][0]:
+                return result(True, True, buy_tax, error="Approve reverted")
+            if not results[4][0]:
+                reason = revert_reason(results[4][1])
+                return result(True, True, buy_tax, error=f"Sell reverted: {reason}")
+            expected_out = eth_abi.decode(["uint256[]"], results[2][1])[0][-1]
+            if expected_out == 0:
+                return result(False, error=f"No output quoted for {bought} of {token}")
+            received = (
+                eth_abi.decode(["uint256"], results[5][1])[0]
+                - eth_abi.decode(["uint256"], results[3][1])[0]
+            )
+            if received <= 0:
+                return result(
+                    True, True, buy_tax, error="Nothing received when selling"
+                )
+            sell_tax = max(Decimal(0), 1 - Decimal(received) / Decimal(expected_out))
+        except (DecodingError, ValueError) as error:
+            # E.g., the node does not support state overrides
+            return result(False, error=str(error))
+        return result(True, False, buy_tax, sell_tax)
@@ -0,0 +1,14 @@
+CONFIG = {
+    "1": {"multicall_3": "0xcA11bde05977b3631167028862bE2a173976CA11"},
+    "10": {"multicall_3": "0xcA11bde05977b3631167028862bE2a173976CA11"},
+    "56": {"multicall_3": "0xcA11bde05977b3631167028862bE2a173976CA11"},
+    "137": {"multicall_3": "0xcA11bde05977b3631167028862bE2a173976CA11"},
+    "238": {"multicall_3": "0xcA11bde05977b3631167028862bE2a173976CA11"},
+    "324": {"multicall_3": "0xF9cda624FBC7e059355ce98a31693d299FACd963"},
+    "8453": {"multicall_3": "0xcA11bde05977b3631167028862bE2a173976CA11"},
+    "42161": {"multicall_3": "0xcA11bde05977b3631167028862bE2a173976CA11"},
+    "42220": {"multicall_3": "0xcA11bde05977b3631167028862bE2a173976CA11"},
+    "43114": {"multicall_3": "0xcA11bde05977b3631167028862bE2a173976CA11"},
+    "7777777": {"multicall_3": "0xcA11bde05977b3631167028862bE2a173976CA11"},
+    "11155111": {"multicall_3": "0xcA11bde05977b3631167028862bE2a173976CA11"},
+}
@@ -1,37 +1,109 @@
-import json
 import os
+import time
+from dataclasses import dataclass
 from decimal import Decimal
-from typing import Optional
+from typing import Any, Dict, Optional
 
+import eth_abi
+from eth_account.messages import encode_typed_data
 from web3 import Web3
 from web3.contract import Contract
 from web3.types import TxReceipt
 
+from .abi import load_abi
+from .metrics import record_cache, timed
+from .multicall import Multicall3
+from .registry import Shared, get_chain_id
+
+NULL_ADDRESS = "0x0000000000000000000000000000000000000000"
+EIP712_DOMAIN_TYPEHASH = Web3.keccak(
+    text="EIP712Domain(string name,string version,uint256 chainId,"
+    "address verifyingContract)"
+)
+PERMIT_TYPEHASH = Web3.keccak(
+    text="Permit(address owner,address spender,uint256 value,uint256 nonce,"
+    "uint256 deadline)"
+)
+
+
+@dataclass
+class Permit:
+    """
+    An EIP-2612 permit signed with ``ERC20Token.sign_permit``.
+
+    :ivar owner: The address of the token owner.
+    :ivar spender: The address of the spender.
+    :ivar value: The raw integer amount that the spender is allowed to withdraw.
+    :ivar deadline: The Unix timestamp after which the permit is invalid.
+    :ivar v: The recovery ID of the signature.
+    :ivar r: The first 32 bytes of the signature.
+    :ivar s: The second 32 bytes of the signature.
+    """
+
+    owner: str
+    spender: str
+    value: int
+    deadline: int
+    v: int
+    r: bytes
+    s: bytes
+
+
+class ERC20Token(metaclass=Shared):
+    __slots__ = (
+        "web3",
+        "address",
+        "_contract",
+        "_name",
+        "_symbol",
+        "_decimals",
+        "_permit_domain",
+        "__weakref__",
+    )
 
-class ERC20Token:
     def __init__(self, web3: Web3, address: str):
         """
         Initializes a new instance of the ``ERC20Token`` class.
 
         For details about the ERC20 standard, see https://eips.ethereum.org/EIPS/eip-20.
 
+        There is only one instance per token and ``Web3`` instance, i.e., creating an
+        instance for a token that is already in use returns the existing instance
+        together with its cached name, symbol, and decimals.
+
         :param web3: A ``Web3`` instance connected to a blockchain node.
         :type web3: ``Web3``
         :param address: The address of the ERC20 token contract.
         :type address: str
         """
         self.web3: Web3 = web3
-        address_checksum = self.web3.to_checksum_address(address)
-        self.address: str = address_checksum
-        abi_path = os.path.join(os.path.dirname(__file__), "abi", "ERC20Token.json")
-        with open(abi_path, "r") as file:
-            self.contract: Contract = self.web3.eth.contract(
-                address=address_checksum, abi=json.load(file)
-            )
+        self.address: str = self.web3.to_checksum_address(address)
+        self._contract: Optional[Contract] = None
         self._name: Optional[str] = None
         self._symbol: Optional[str] = None
         self._decimals: Optional[int] = None
+        # The EIP-712 domain of the token's permits, or an empty dictionary if the
+        # token does not support EIP-2612 permits
+        self._permit_domain: Optional[Dict[str, Any]] = None
+
+    @property
+    def contract(self) -> Contract:
+        """
+        Returns the ``Contract`` instance of the token, which is created on first use.
 
+        :return: The token contract.
+        :rtype: ``Contract``
+        """
+        if self._contract is None:
+            self._contract = self.web3.eth.contract(
+                address=self.address,
+                abi=load_abi(
+                    os.path.join(os.path.dirname(__file__), "abi", "ERC20Token.json")
+                ),
+            )
+        return self._contract
+
+    @timed
     def allowance(self, owner: str, spender: str) -> Decimal:
         """
         Returns the amount which ``spender`` is allowed to withdraw from ``owner``.
@@ -51,6 +123,7 @@ class ERC20Token:
             ).call()
         ) / (Decimal(10**self.decimals))
 
+    @timed
     def approve(
         self,
         spender: str,
@@ -102,6 +175,7 @@ class ERC20Token:
         tx_hash = self.web3.eth.send_raw_transaction(signed_tx.rawTransaction)
         return self.web3.eth.wait_for_transaction_receipt(tx_hash)
 
+    @timed
     def balance_of(self, account: str) -> Decimal:
         """
         Returns the balance of the specified account.
@@ -125,6 +199,7 @@ class ERC20Token:
 
         :return: The number of decimals.
         """
+        record_cache("ERC20Token.decimals", self._decimals is not None)
         if self._decimals is None:
             self._decimals = self.contract.functions.decimals().call()
         return self._decimals
@@ -136,6 +211,7 @@ class ERC20Token:
 
         :return: The token name.
         """
+        record_cache("ERC20Token.name", self._name is not None)
         if self._name is None:
             self._name = self.contract.functions.name().call()
         return self._name
@@ -147,10 +223,169 @@ class ERC20Token:
 
         :return: The token symbol.
         """
+        record_cache("ERC20Token.symbol", self._symbol is not None)
         if self._symbol is None:
             self._symbol = self.contract.functions.symbol().call()
         return self._symbol
 
+    @property
+    def supports_permit(self) -> bool:
+        """
+        Returns whether the token supports EIP-2612 permits, i.e., approvals signed
+        off-chain by the token owner that anyone can submit with ``permit``. For
+        details, see https://eips.ethereum.org/EIPS/eip-2612.
+
+        Support is detected with a single batched call by checking that the token has
+        ``nonces`` and that its ``DOMAIN_SEPARATOR`` matches the EIP-712 domain with the
+        token's name and version, so that ``sign_permit`` produces signatures that the
+        token accepts. Tokens that expose a ``PERMIT_TYPEHASH`` other than the EIP-2612
+        one, such as DAI, use a different ``permit`` and are reported as unsupported.
+        The result is cached.
+
+        :return: Whether the token supports permits.
+        :rtype: bool
+        """
+        record_cache("ERC20Token.supports_permit", self._permit_domain is not None)
+        if self._permit_domain is None:
+            functions = self.contract.functions
+            outputs = Multicall3(self.web3).aggregate(
+                [
+                    functions.PERMIT_TYPEHASH(),
+                    functions.DOMAIN_SEPARATOR(),
+                    functions.nonces(NULL_ADDRESS),
+                    functions.name(),
+                    functions.version(),
+                ]
+            )
+            typehash, domain_separator, nonce, name, version = outputs
+            self._permit_domain = {}
+            if (
+                typehash in (None, PERMIT_TYPEHASH)
+                and domain_separator is not None
+                and nonce is not None
+                and name is not None
+            ):
+                chain_id = get_chain_id(self.web3)
+                for candidate in [version] if version is not None else ["1", "2"]:
+                    separator = Web3.keccak(
+                        eth_abi.encode(
+                            ["bytes32", "bytes32", "bytes32", "uint256", "address"],
+                            [
+                                EIP712_DOMAIN_TYPEHASH,
+                                Web3.keccak(text=name),
+                                Web3.keccak(text=candidate),
+                                chain_id,
+                                self.address,
+                            ],
+                        )
+                    )
+                    if separator == domain_separator:
+                        self._permit_domain = {
+                            "name": name,
+                            "version": candidate,
+                            "chainId": chain_id,
+                            "verifyingContract": self.address,
+                        }
+                        break
+        return bool(self._permit_domain)
+
+    @timed
+    def nonces(self, owner: str) -> int:
+        """
+        Returns the current EIP-2612 permit nonce of ``owner``.
+
+        :param owner: The address of the token owner.
+        :type owner: str
+
+        :return: The nonce.
+        :rtype: int
+        """
+        return self.contract.functions.nonces(
+            self.web3.to_checksum_address(owner)
+        ).call()
+
+    @timed
+    def sign_permit(
+        self,
+        spender: str,
+        value: Decimal,
+        account: str,
+        private_key: str,
+        deadline: Optional[int] = None,
+        nonce: Optional[int] = None,
+    ) -> Permit:
+        """
+        Signs an EIP-2612 permit locally that allows ``spender`` to spend ``value``
+        tokens on behalf of ``account``. The permit can be submitted in the same
+        transaction as the swap that uses it, e.g., with the ``permit`` option of
+        ``UniswapV3Router``, so no separate approval transaction is needed.
+
+        :param spender: The address of the spender.
+        :type spender: str
+        :param value: The amount of tokens to approve.
+        :type value: ``Decimal``
+        :param account: The address of the token owner.
+        :type account: str
+        :param private_key: The private key of the account.
+        :type private_key: str
+        :param deadline: The Unix timestamp after which the permit is invalid. If not
+            provided, it will be set to five minutes from the current time.
+        :type deadline: int, optional
+        :param nonce: The permit nonce of the account. If not provided, it is read
+            from the token.
+        :type nonce: int, optional
+
+        :return: The signed permit.
+        :rtype: ``Permit``
+        """
+        if not self.supports_permit:
+            raise ValueError(f"{self.address} does not support EIP-2612 permits")
+        if deadline is None:
+            deadline = int(time.time() + 300)
+        owner = self.web3.to_checksum_address(account)
+        if nonce is None:
+            nonce = self.nonces(owner)
+        message = {
+            "owner": owner,
+            "spender": self.web3.to_checksum_address(spender),
+            "value": int(Decimal(value) * Decimal(10**self.decimals)),
+            "nonce": nonce,
+            "deadline": deadline,
+        }
+        signable = encode_typed_data(
+            full_message={
+                "types": {
+                    "EIP712Domain": [
+                        {"name": "name", "type": "string"},
+                        {"name": "version", "type": "string"},
+                        {"name": "chainId", "type": "uint256"},
+                        {"name": "verifyingContract", "type": "address"},
+                    ],
+                    "Permit": [
+                        {"name": "owner", "type": "address"},
+                        {"name": "spender", "type": "address"},
+                        {"name": "value", "type": "uint256"},
+                        {"name": "nonce", "type": "uint256"},
+                        {"name": "deadline", "type": "uint256"},
+                    ],
+                },
+                "primaryType": "Permit",
+                "domain": self._permit_domain,
+                "message": message,
+            }
+        )
+        signed = self.web3.eth.account.sign_message(signable, private_key=private_key)
+        return Permit(
+            owner=owner,
+            spender=message["spender"],
+            value=message["value"],
+            deadline=deadline,
+            v=signed.v,
+            r=signed.r.to_bytes(32, "big"),
+            s=signed.s.to_bytes(32, "big"),
+        )
+
+    @timed
     def total_supply(self) -> Decimal:
         """
         Returns the total supply of the token.
@@ -162,6 +397,7 @@ class ERC20Token:
             10**self.decimals
         )
 
+    @timed
     def transfer(
         self,
         to: str,
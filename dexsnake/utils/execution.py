@@ -0,0 +1,120 @@
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Optional
+
+from web3 import Web3
+from web3.types import TxReceipt
+
+from .erc20_token import ERC20Token
+
+TRANSFER_TOPIC = bytes(Web3.keccak(text="Transfer(address,address,uint256)"))
+# Emitted by WETH when the native token is wrapped and unwrapped
+DEPOSIT_TOPIC = bytes(Web3.keccak(text="Deposit(address,uint256)"))
+WITHDRAWAL_TOPIC = bytes(Web3.keccak(text="Withdrawal(address,uint256)"))
+
+
+@dataclass
+class SwapExecution:
+    """
+    The result of a swap parsed from the receipt of its transaction.
+
+    :ivar success: Whether the transaction succeeded.
+    :ivar amount_in: The amount of input tokens paid.
+    :ivar amount_out: The amount of output tokens received by the recipient.
+    :ivar price: The effective price, i.e., the amount of output tokens received per
+        input token, or ``None`` if nothing was paid.
+    :ivar gas_used: The gas used by the transaction.
+    :ivar gas_cost: The cost of the gas in the native token (e.g., ETH).
+    :ivar block_number: The block in which the transaction was included.
+    :ivar transaction_hash: The hash of the transaction.
+    :ivar receipt: The transaction receipt.
+    """
+
+    success: bool
+    amount_in: Decimal
+    amount_out: Decimal
+    price: Optional[Decimal]
+    gas_used: int
+    gas_cost: Decimal
+    block_number: int
+    transaction_hash: str
+    receipt: TxReceipt
+
+
+def parse_swap_receipt(
+    web3: Web3,
+    receipt: TxReceipt,
+    token_in: str,
+    token_out: str,
+    payer: str,
+    recipient: str,
+    native_in: bool = False,
+    native_out: bool = False,
+) -> SwapExecution:
+    """
+    Parses the result of a swap from the ``Transfer`` logs in its transaction receipt
+    without reading anything from the node, except for the token decimals on first use.
+    The amount in is the amount of ``token_in`` transferred from ``payer`` and the
+    amount out is the amount of ``token_out`` transferred to ``recipient``, so amounts
+    taken by tokens with a fee on transfer are taken into account. If the native token
+    is paid or received, the amount is instead parsed from the ``Deposit`` or
+    ``Withdrawal`` logs of the wrapped native token, which is ``token_in`` or
+    ``token_out``, respectively.
+
+    :param web3: A ``Web3`` instance connected to a blockchain node.
+    :type web3: ``Web3``
+    :param receipt: The transaction receipt of the swap.
+    :type receipt: TxReceipt
+    :param token_in: The address of the input token.
+    :type token_in: str
+    :param token_out: The address of the output token.
+    :type token_out: str
+    :param payer: The address from which the input tokens were transferred.
+    :type payer: str
+    :param recipient: The address to which the output tokens were transferred.
+    :type recipient: str
+    :param native_in: Whether the native token was paid.
+    :type native_in: bool, optional
+    :param native_out: Whether the native token was received.
+    :type native_out: bool, optional
+
+    :return: The result of the swap.
+    :rtype: ``SwapExecution``
+    """
+    token_in = web3.to_checksum_address(token_in)
+    token_out = web3.to_checksum_address(token_out)
+    payer_bytes = bytes.fromhex(payer[2:].lower()).rjust(32, b"\0")
+    recipient_bytes = bytes.fromhex(recipient[2:].lower()).rjust(32, b"\0")
+    raw_in = raw_out = 0
+    for log in receipt["logs"]:
+        topics = [bytes(topic) for topic in log["topics"]]
+        if not topics:
+            continue
+        address = web3.to_checksum_address(log["address"])
+        amount = int.from_bytes(bytes(log["data"])[-32:], "big")
+        # Transfers from tokens that do not index the addresses are not counted
+        transfer = topics[0] == TRANSFER_TOPIC and len(topics) == 3
+        if address == token_in:
+            if native_in:
+                raw_in += amount if topics[0] == DEPOSIT_TOPIC else 0
+            elif transfer and topics[1] == payer_bytes:
+                raw_in += amount
+        if address == token_out:
+            if native_out:
+                raw_out += amount if topics[0] == WITHDRAWAL_TOPIC else 0
+            elif transfer and topics[2] == recipient_bytes:
+                raw_out += amount
+    amount_in = Decimal(raw_in) / Decimal(10 ** ERC20Token(web3, token_in).decimals)
+    amount_out = Decimal(raw_out) / Decimal(10 ** ERC20Token(web3, token_out).decimals)
+    gas_price = receipt.get("effectiveGasPrice", 0)
+    return SwapExecution(
+        success=receipt["status"] == 1,
+        amount_in=amount_in,
+        amount_out=amount_out,
+        price=amount_out / amount_in if amount_in > 0 else None,
+        gas_used=receipt["gasUsed"],
+        gas_cost=Decimal(receipt["gasUsed"] * gas_price) / Decimal(10**18),
+        block_number=receipt["blockNumber"],
+        transaction_hash="0x" + bytes(receipt["transactionHash"]).hex(),
+        receipt=receipt,
+    )
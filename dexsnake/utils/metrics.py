@@ -0,0 +1,339 @@
+import functools
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from web3 import Web3
+from web3.types import RPCEndpoint, RPCResponse
+
+F = TypeVar("F", bound=Callable[..., Any])
+Labels = Tuple[Tuple[str, str], ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# The number of sent transactions whose send time is kept until their receipt is read
+MAX_PENDING_TRANSACTIONS = 10000
+
+
+class MetricsSink(ABC):
+    """
+    Base class of metrics sinks. Subclasses implement ``increment`` and ``observe``.
+    """
+
+    @abstractmethod
+    def increment(self, name: str, labels: Dict[str, str], value: float = 1) -> None:
+        """
+        Increments the counter ``name`` with ``labels`` by ``value``.
+
+        :param name: The name of the counter.
+        :type name: str
+        :param labels: The labels of the counter.
+        :type labels: Dict[str, str]
+        :param value: The increment.
+        :type value: float, optional
+        """
+
+    @abstractmethod
+    def observe(self, name: str, labels: Dict[str, str], value: float) -> None:
+        """
+        Records ``value`` in the histogram ``name`` with ``labels``.
+
+        :param name: The name of the histogram.
+        :type name: str
+        :param labels: The labels of the histogram.
+        :type labels: Dict[str, str]
+        :param value: The observed value.
+        :type value: float
+        """
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        """
+        Initializes a new instance of the ``Histogram`` class.
+
+        :param buckets: The upper bounds of the buckets.
+        :type buckets: Tuple[float, ...], optional
+        """
+        self.buckets: Tuple[float, ...] = buckets
+        self.counts: List[int] = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.sum: float = 0.0
+        self.count: int = 0
+
+    def observe(self, value: float) -> None:
+        """
+        Records ``value`` in the histogram.
+
+        :param value: The observed value.
+        :type value: float
+        """
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class InMemorySink(MetricsSink):
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        """
+        Initializes a new instance of the ``InMemorySink`` class, which keeps the
+        metrics in ``counters`` and ``histograms`` keyed by name and labels.
+
+        :param buckets: The upper bounds of the histogram buckets in seconds.
+        :type buckets: Tuple[float, ...], optional
+        """
+        self.buckets: Tuple[float, ...] = buckets
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, labels: Dict[str, str], value: float = 1) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, labels: Dict[str, str], value: float) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(self.buckets)
+            self.histograms[key].observe(value)
+
+    def counter(self, name: str, **labels: str) -> float:
+        """
+        Returns the value of the counter ``name`` with ``labels``.
+
+        :param name: The name of the counter.
+        :type name: str
+
+        :return: The value of the counter, or 0 if nothing has been recorded.
+        :rtype: float
+        """
+        return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def reset(self) -> None:
+        """
+        Removes all recorded metrics.
+        """
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+
+class PrometheusSink(InMemorySink):
+    """
+    An ``InMemorySink`` that can render the metrics in the Prometheus text exposition
+    format.
+    """
+
+    def render(self) -> str:
+        """
+        Returns the metrics in the Prometheus text exposition format, e.g., to be
+        served from a ``/metrics`` endpoint.
+
+        :return: The metrics.
+        :rtype: str
+        """
+        lines = []
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(
+                (key, list(h.counts), h.sum, h.count)
+                for key, h in self.histograms.items()
+            )
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        for (name, labels), counts, total, count in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(
+                    f"{name}_bucket{_format_labels(labels + (('le', le),))} "
+                    f"{cumulative}"
+                )
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+class LoggingSink(MetricsSink):
+    def __init__(
+        self, logger: Optional[logging.Logger] = None, level: int = logging.DEBUG
+    ):
+        """
+        Initializes a new instance of the ``LoggingSink`` class, which writes every
+        recorded value to a logger.
+
+        :param logger: The logger. If not provided, the ``dexsnake.metrics`` logger is
+            used.
+        :type logger: ``logging.Logger``, optional
+        :param level: The logging level.
+        :type level: int, optional
+        """
+        self.logger: logging.Logger = logger or logging.getLogger("dexsnake.metrics")
+        self.level: int = level
+
+    def increment(self, name: str, labels: Dict[str, str], value: float = 1) -> None:
+        self.logger.log(self.level, "%s %s +%s", name, labels, value)
+
+    def observe(self, name: str, labels: Dict[str, str], value: float) -> None:
+        self.logger.log(self.level, "%s %s %.6f", name, labels, value)
+
+
+_sink: Optional[MetricsSink] = None
+_local = threading.local()  # the Dexsnake methods being executed by each thread
+
+
+def set_sink(sink: Optional[MetricsSink]) -> None:
+    """
+    Sets the sink to which metrics are sent. Passing ``None`` disables the metrics.
+
+    The public methods of the factories, pairs, pools, tokens, and routers record the
+    number of calls and their duration, and cached properties record whether the
+    cached value was used. Nothing is recorded while no sink is set. RPC requests are
+    recorded only for ``Web3`` instances passed to ``instrument``.
+
+    :param sink: The metrics sink.
+    :type sink: ``MetricsSink``, optional
+    """
+    global _sink
+    _sink = sink
+
+
+def get_sink() -> Optional[MetricsSink]:
+    """
+    Returns the sink to which metrics are sent.
+
+    :return: The metrics sink, or ``None`` if metrics are disabled.
+    :rtype: ``MetricsSink``, optional
+    """
+    return _sink
+
+
+def timed(func: F) -> F:
+    """
+    Decorates a method to record ``dexsnake_calls_total``,
+    ``dexsnake_call_duration_seconds``, and ``dexsnake_local_duration_seconds``, i.e.,
+    the part of the duration not spent waiting for RPC requests, such as ABI encoding
+    and decoding.
+    """
+    method = func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        sink = _sink
+        if sink is None:
+            return func(*args, **kwargs)
+        frames = getattr(_local, "frames", None)
+        if frames is None:
+            frames = _local.frames = []
+        frame = [method, 0.0]  # [method, seconds spent in RPC requests]
+        frames.append(frame)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            duration = time.perf_counter() - start
+            frames.pop()
+            labels = {"method": method}
+            sink.increment("dexsnake_calls_total", labels)
+            sink.observe("dexsnake_call_duration_seconds", labels, duration)
+            sink.observe("dexsnake_local_duration_seconds", labels, duration - frame[1])
+
+    return wrapper  # type: ignore
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    """
+    Records a lookup of a cached value in ``dexsnake_cache_lookups_total``.
+
+    :param cache: The name of the cached value.
+    :type cache: str
+    :param hit: Whether the cached value was used.
+    :type hit: bool
+    """
+    if _sink is not None:
+        _sink.increment(
+            "dexsnake_cache_lookups_total",
+            {"cache": cache, "result": "hit" if hit else "miss"},
+        )
+
+
+def _rpc_middleware(
+    make_request: Callable[[RPCEndpoint, Any], RPCResponse], web3: Web3
+) -> Callable[[RPCEndpoint, Any], RPCResponse]:
+    # Transactions whose receipts are never read through this ``Web3`` instance are
+    # evicted oldest first
+    sent_at: "OrderedDict[str, float]" = OrderedDict()
+    lock = threading.Lock()
+
+    def middleware(method: RPCEndpoint, params: Any) -> RPCResponse:
+        sink = _sink
+        if sink is None:
+            return make_request(method, params)
+        start = time.perf_counter()
+        response = make_request(method, params)
+        end = time.perf_counter()
+        frames = getattr(_local, "frames", None) or [["", 0.0]]
+        for frame in frames:
+            frame[1] += end - start
+        labels = {"method": frames[-1][0], "rpc_method": method}
+        sink.increment("dexsnake_rpc_requests_total", labels)
+        sink.observe("dexsnake_rpc_duration_seconds", labels, end - start)
+        result = response.get("result")
+        if method == "eth_sendRawTransaction" and result is not None:
+            with lock:
+                sent_at[result] = start
+                if len(sent_at) > MAX_PENDING_TRANSACTIONS:
+                    sent_at.popitem(last=False)
+        elif method == "eth_getTransactionReceipt" and result is not None:
+            with lock:
+                sent = sent_at.pop(params[0], None)
+            if sent is not None:
+                sink.observe(
+                    "dexsnake_time_to_receipt_seconds",
+                    {"method": frames[-1][0]},
+                    end - sent,
+                )
+        return response
+
+    return middleware
+
+
+def instrument(web3: Web3) -> Web3:
+    """
+    Adds a middleware to ``web3`` that records the RPC requests made through it in
+    ``dexsnake_rpc_requests_total`` and ``dexsnake_rpc_duration_seconds``, labeled by
+    the Dexsnake method that made them, and the time from sending a transaction to
+    receiving its receipt in ``dexsnake_time_to_receipt_seconds``.
+
+    :param web3: A ``Web3`` instance connected to a blockchain node.
+    :type web3: ``Web3``
+
+    :return: The same ``Web3`` instance.
+    :rtype: ``Web3``
+    """
+    if "dexsnake_metrics" not in web3.middleware_onion:
+        web3.middleware_onion.inject(_rpc_middleware, name="dexsnake_metrics", layer=0)
+    return web3
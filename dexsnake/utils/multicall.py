@@ -0,0 +1,81 @@
+import os
+from typing import Any, List, Sequence
+
+from eth_abi.exceptions import DecodingError
+from eth_utils.abi import collapse_if_tuple
+from web3 import Web3
+from web3.contract import Contract
+from web3.contract.contract import ContractFunction
+from web3.types import BlockIdentifier
+
+from .abi import load_abi
+from .config import CONFIG
+
+
+class Multicall3:
+    def __init__(self, web3: Web3):
+        """
+        Initializes a new instance of the ``Multicall3`` class.
+
+        Multicall3 is a contract that executes a batch of read-only calls in a single
+        ``eth_call``, which makes reading the state of many contracts cost one round
+        trip to the node. For details, see https://github.com/mds1/multicall.
+
+        :param web3: A ``Web3`` instance connected to a blockchain node.
+        :type web3: ``Web3``
+        """
+        if str(web3.eth.chain_id) not in CONFIG.keys():
+            raise ValueError(f"Unsupported chain (chain ID = {web3.eth.chain_id})")
+        self.web3: Web3 = web3
+        self.contract: Contract = self.web3.eth.contract(
+            address=CONFIG[str(self.web3.eth.chain_id)]["multicall_3"],
+            abi=load_abi(
+                os.path.join(os.path.dirname(__file__), "abi", "Multicall3.json")
+            ),
+        )
+
+    def aggregate(
+        self,
+        calls: Sequence[ContractFunction],
+        block_identifier: BlockIdentifier = "latest",
+        batch_size: int = 500,
+    ) -> List[Any]:
+        """
+        Executes the given contract function calls and returns their decoded outputs.
+
+        The calls are sent in batches of ``batch_size`` calls per ``eth_call``. A call
+        that reverts does not make the batch revert, and its output is ``None``.
+
+        :param calls: The contract function calls, e.g.,
+            ``token.contract.functions.balanceOf(account)``.
+        :type calls: Sequence[``ContractFunction``]
+        :param block_identifier: The block at which the calls are executed.
+        :type block_identifier: ``BlockIdentifier``, optional
+        :param batch_size: The maximum number of calls per ``eth_call``.
+        :type batch_size: int, optional
+
+        :return: The outputs of the calls, in the same order as ``calls``. Functions
+            with a single output return the value itself and functions with multiple
+            outputs return a tuple.
+        :rtype: List[Any]
+        """
+        outputs = []
+        for start in range(0, len(calls), batch_size):
+            batch = calls[start : start + batch_size]
+            results = self.contract.functions.aggregate3(
+                [
+                    (call.address, True, call._encode_transaction_data())
+                    for call in batch
+                ]
+            ).call(block_identifier=block_identifier)
+            for call, (success, data) in zip(batch, results):
+                outputs.append(self._decode(call, data) if success else None)
+        return outputs
+
+    def _decode(self, call: ContractFunction, data: bytes) -> Any:
+        types = [collapse_if_tuple(output) for output in call.abi["outputs"]]
+        try:
+            values = self.web3.codec.decode(types, data)
+        except DecodingError:  # e.g., the call was made to an address without code
+            return None
+        return values[0] if len(values) == 1 else tuple(values)
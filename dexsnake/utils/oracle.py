@@ -0,0 +1,174 @@
+from collections import deque
+from decimal import Decimal
+from typing import Deque, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from web3 import Web3
+from web3.types import BlockIdentifier
+
+from ..uniswap_v2.pair import UniswapV2Pair
+from ..uniswap_v3.pool import UniswapV3Pool
+from .erc20_token import ERC20Token
+from .metrics import timed
+from .multicall import Multicall3
+
+Pool = Union[UniswapV2Pair, UniswapV3Pool]
+Snapshot = Tuple[int, int]  # (block timestamp, price0CumulativeLast)
+
+Q112 = 2**112
+
+
+class TwapOracle:
+    def __init__(self, web3: Web3, pools: Iterable[Pool], max_snapshots: int = 1024):
+        """
+        Initializes a new instance of the ``TwapOracle`` class.
+
+        The oracle reads the time-weighted average prices (TWAPs) of many Uniswap V2
+        pairs and Uniswap V3 pools in a single batched call using ``Multicall3``. For
+        Uniswap V3 pools, the TWAPs are computed from the pools' own price oracles with
+        ``observe``, which works for any window covered by the stored observations. For
+        Uniswap V2 pairs, the cumulative prices are read every time ``get_twaps`` is
+        called and kept as snapshots, and the TWAPs are computed from the difference
+        between the current cumulative price and the latest snapshot that is at least
+        ``window`` seconds old. Therefore, TWAPs of Uniswap V2 pairs are only available
+        once the oracle has been used for ``window`` seconds, or after ``get_twaps`` has
+        been called with a block that is at least ``window`` seconds old, which
+        requires an archive node.
+
+        :param web3: A ``Web3`` instance connected to a blockchain node.
+        :type web3: ``Web3``
+        :param pools: The ``UniswapV2Pair`` and ``UniswapV3Pool`` instances.
+        :type pools: Iterable[Union[``UniswapV2Pair``, ``UniswapV3Pool``]]
+        :param max_snapshots: The maximum number of snapshots kept per Uniswap V2 pair.
+            The oldest snapshots are dropped first, so the longest window that a TWAP
+            of a Uniswap V2 pair can cover is about ``max_snapshots`` times the
+            interval between calls of ``get_twaps``.
+        :type max_snapshots: int, optional
+        """
+        self.web3: Web3 = web3
+        self.pools: List[Pool] = list(dict.fromkeys(pools))
+        self.multicall: Multicall3 = Multicall3(web3)
+        self.snapshots: Dict[str, Deque[Snapshot]] = {
+            pool.address: deque(maxlen=max_snapshots)
+            for pool in self.pools
+            if isinstance(pool, UniswapV2Pair)
+        }
+        # The addresses of the pairs and pools whose tokens, token decimals, or state
+        # could not be read by the last ``get_twaps``
+        self.failed: Set[str] = set()
+        self._unreadable: Set[str] = set()
+        self._metadata_loaded = False
+
+    def _load_metadata(self) -> None:
+        # Reads the tokens and their decimals in two batched calls instead of one call
+        # per pool and token
+        unknown = [pool for pool in self.pools if pool._token_0 is None]
+        outputs = iter(
+            self.multicall.aggregate(
+                [
+                    call
+                    for pool in unknown
+                    for call in (
+                        pool.contract.functions.token0(),
+                        pool.contract.functions.token1(),
+                    )
+                ]
+            )
+        )
+        for pool in unknown:
+            token_0, token_1 = next(outputs), next(outputs)
+            if token_0 is None or token_1 is None:
+                self._unreadable.add(pool.address)
+                continue
+            pool._token_0 = ERC20Token(self.web3, token_0)
+            pool._token_1 = ERC20Token(self.web3, token_1)
+        readable = [pool for pool in self.pools if pool.address not in self._unreadable]
+        tokens = {
+            token.address: token
+            for pool in readable
+            for token in (pool._token_0, pool._token_1)
+            if token._decimals is None
+        }
+        decimals = self.multicall.aggregate(
+            [token.contract.functions.decimals() for token in tokens.values()]
+        )
+        for token, value in zip(tokens.values(), decimals):
+            token._decimals = value
+        for pool in readable:
+            if pool._token_0._decimals is None or pool._token_1._decimals is None:
+                self._unreadable.add(pool.address)
+        self._metadata_loaded = True
+
+    @timed
+    def get_twaps(
+        self, window: int, block_identifier: BlockIdentifier = "latest"
+    ) -> Dict[str, Optional[Decimal]]:
+        """
+        Returns the time-weighted average price of ``token_0`` denominated in
+        ``token_1`` over the last ``window`` seconds in every pair and pool, taking into
+        account the token decimals. Everything is read with a single batched call,
+        except for the tokens and their decimals, which are read on first use.
+
+        :param window: The length of the averaging window in seconds, which must be
+            positive.
+        :type window: int
+        :param block_identifier: The block at which the prices are read.
+        :type block_identifier: ``BlockIdentifier``, optional
+
+        :return: The prices keyed by pair and pool address. The price is ``None`` for
+            Uniswap V2 pairs without a snapshot that is old enough, for Uniswap V3
+            pools whose observations do not cover the window, and for pairs and pools
+            whose tokens, token decimals, or state cannot be read, whose addresses are
+            stored in ``failed``.
+        :rtype: Dict[str, ``Decimal``]
+        """
+        if window <= 0:
+            raise ValueError("`window` must be positive")
+        if not self._metadata_loaded:
+            self._load_metadata()
+        pools = [pool for pool in self.pools if pool.address not in self._unreadable]
+        calls = [self.multicall.contract.functions.getCurrentBlockTimestamp()]
+        for pool in pools:
+            if isinstance(pool, UniswapV2Pair):
+                calls.append(pool.contract.functions.price0CumulativeLast())
+                calls.append(pool.contract.functions.getReserves())
+            else:
+                calls.append(pool.contract.functions.observe([window, 0]))
+        outputs = iter(self.multicall.aggregate(calls, block_identifier))
+        timestamp = next(outputs)
+        twaps: Dict[str, Optional[Decimal]] = {
+            pool.address: None for pool in self.pools
+        }
+        self.failed = set(self._unreadable)
+        for pool in pools:
+            if isinstance(pool, UniswapV3Pool):
+                observation = next(outputs)
+                twaps[pool.address] = (
+                    None if observation is None else pool._twap(observation[0], window)
+                )
+                continue
+            cumulative, reserves = next(outputs), next(outputs)
+            if cumulative is None or reserves is None:
+                self.failed.add(pool.address)
+                continue
+            reserve_0, reserve_1, updated_at = reserves
+            # The cumulative price is only updated by the first transaction in a block,
+            # so the time since then is accumulated at the current price. The
+            # timestamp is stored modulo 2**32 by the pair.
+            elapsed = (timestamp - updated_at) % 2**32
+            if elapsed > 0 and reserve_0 > 0:
+                cumulative += (reserve_1 * Q112 // reserve_0) * elapsed
+            snapshots = self.snapshots[pool.address]
+            for then, cumulative_then in reversed(snapshots):
+                if timestamp - then >= window:
+                    price = (
+                        Decimal((cumulative - cumulative_then) % 2**256)
+                        / Decimal(timestamp - then)
+                        / Decimal(Q112)
+                    )
+                    twaps[pool.address] = price * Decimal(10) ** (
+                        pool.token_0.decimals - pool.token_1.decimals
+                    )
+                    break
+            if not snapshots or snapshots[-1][0] < timestamp:
+                snapshots.append((timestamp, cumulative))
+        return twaps
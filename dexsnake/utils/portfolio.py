@@ -0,0 +1,206 @@
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from web3 import Web3
+from web3.types import BlockIdentifier, TxReceipt
+
+from ..uniswap_v2.config import CONFIG as UNISWAP_V2_CONFIG
+from ..uniswap_v3.config import CONFIG as UNISWAP_V3_CONFIG
+from .erc20_token import ERC20Token
+from .multicall import Multicall3
+
+MAX_UINT256 = 2**256 - 1
+
+
+class PortfolioManager:
+    def __init__(
+        self,
+        web3: Web3,
+        account: str,
+        tokens: Iterable[str],
+        spenders: Optional[Iterable[str]] = None,
+    ):
+        """
+        Initializes a new instance of the ``PortfolioManager`` class.
+
+        The portfolio manager keeps track of the balances of ``account`` and its
+        allowances to ``spenders`` for many tokens at once. The state of all tokens is
+        read with a single batched call using ``Multicall3``, and missing approvals are
+        sent back-to-back with locally assigned nonces.
+
+        :param web3: A ``Web3`` instance connected to a blockchain node.
+        :type web3: ``Web3``
+        :param account: The address of the account.
+        :type account: str
+        :param tokens: The addresses of the tokens.
+        :type tokens: Iterable[str]
+        :param spenders: The addresses that must be approved to spend the tokens. If not
+            provided, the Uniswap V2 and Uniswap V3 routers on the connected chain are
+            used.
+        :type spenders: Iterable[str], optional
+        """
+        self.web3: Web3 = web3
+        self.account: str = self.web3.to_checksum_address(account)
+        self.tokens: Dict[str, ERC20Token] = {}
+        for address in tokens:
+            token = ERC20Token(self.web3, address)
+            self.tokens[token.address] = token
+        if spenders is None:
+            chain_id = str(self.web3.eth.chain_id)
+            spenders = []
+            if chain_id in UNISWAP_V2_CONFIG:
+                spenders.append(UNISWAP_V2_CONFIG[chain_id]["router_02"])
+            if chain_id in UNISWAP_V3_CONFIG:
+                spenders.append(UNISWAP_V3_CONFIG[chain_id]["swap_router_02"])
+        self.spenders: List[str] = [
+            self.web3.to_checksum_address(spender) for spender in spenders
+        ]
+        self.multicall: Multicall3 = Multicall3(self.web3)
+        self.balances: Dict[str, Decimal] = {}
+        self.allowances: Dict[Tuple[str, str], Decimal] = {}
+        self.failed: Set[str] = set()
+
+    def refresh(self, block_identifier: BlockIdentifier = "latest") -> None:
+        """
+        Reads the balance of every token and the allowance of every spender with a
+        single batched call and stores them in ``balances`` (keyed by token address)
+        and ``allowances`` (keyed by token and spender address). The decimals of tokens
+        that have not been read yet are included in the same call. Tokens whose state
+        could not be read are left out of ``balances`` and ``allowances`` and stored in
+        ``failed``.
+
+        :param block_identifier: The block at which the state is read.
+        :type block_identifier: ``BlockIdentifier``, optional
+        """
+        tokens = list(self.tokens.values())
+        unknown = [token for token in tokens if token._decimals is None]
+        calls = [token.contract.functions.decimals() for token in unknown]
+        for token in tokens:
+            calls.append(token.contract.functions.balanceOf(self.account))
+            for spender in self.spenders:
+                calls.append(token.contract.functions.allowance(self.account, spender))
+        outputs = iter(self.multicall.aggregate(calls, block_identifier))
+        self.failed = set()
+        for token in unknown:
+            token._decimals = next(outputs)
+        for token in tokens:
+            balance = next(outputs)
+            allowances = [next(outputs) for _ in self.spenders]
+            # Calls that reverted, e.g., to a non-standard or destroyed token, return
+            # ``None``, and the state of the token is dropped instead of kept stale
+            if token._decimals is None or balance is None or None in allowances:
+                self.failed.add(token.address)
+                self.balances.pop(token.address, None)
+                for spender in self.spenders:
+                    self.allowances.pop((token.address, spender), None)
+                continue
+            scale = Decimal(10**token.decimals)
+            self.balances[token.address] = Decimal(balance) / scale
+            for spender, allowance in zip(self.spenders, allowances):
+                self.allowances[(token.address, spender)] = Decimal(allowance) / scale
+
+    def missing_approvals(
+        self, amounts: Optional[Dict[str, Decimal]] = None
+    ) -> List[Tuple[str, str]]:
+        """
+        Returns the token and spender pairs whose allowance is smaller than the
+        required amount. The state is read with ``refresh`` first if it has not been
+        read yet. A ``ValueError`` is raised if a token in ``amounts`` is not tracked or
+        its state could not be read.
+
+        :param amounts: The required allowance per token address. If not provided, the
+            current balance of each token is required.
+        :type amounts: Dict[str, ``Decimal``], optional
+
+        :return: A list of (token address, spender address) tuples.
+        :rtype: List[Tuple[str, str]]
+        """
+        if not self.balances:
+            self.refresh()
+        if amounts is None:
+            amounts = self.balances
+        else:
+            amounts = {
+                self.web3.to_checksum_address(token): amount
+                for token, amount in amounts.items()
+            }
+        for token in amounts:
+            if token not in self.tokens:
+                raise ValueError(f"Token {token} is not tracked by the manager")
+            if token in self.failed:
+                raise ValueError(f"The state of token {token} could not be read")
+        return [
+            (token, spender)
+            for token, amount in amounts.items()
+            for spender in self.spenders
+            if amount > 0 and self.allowances[(token, spender)] < amount
+        ]
+
+    def approve_missing(
+        self,
+        private_key: str,
+        amounts: Optional[Dict[str, Decimal]] = None,
+        value: Optional[Decimal] = None,
+        gas: Optional[int] = None,
+        gas_price: Optional[int] = None,
+    ) -> Dict[Tuple[str, str], TxReceipt]:
+        """
+        Sends an approval for every token and spender pair returned by
+        ``missing_approvals``. The transactions are signed with consecutive nonces and
+        sent without waiting for each other, after which the receipts are collected.
+
+        :param private_key: The private key of the account.
+        :type private_key: str
+        :param amounts: The required allowance per token address. If not provided, the
+            current balance of each token is required.
+        :type amounts: Dict[str, ``Decimal``], optional
+        :param value: The amount of tokens to approve. If not provided, the maximum
+            amount is approved so that the approval never needs to be renewed.
+        :type value: ``Decimal``, optional
+        :param gas: The gas limit of each transaction. If not provided, it will be
+            estimated automatically.
+        :type gas: int, optional
+        :param gas_price: The gas price for the transactions in wei. If not provided,
+            the current network gas price will be used.
+        :type gas_price: int, optional
+
+        :return: The transaction receipts keyed by token and spender address.
+        :rtype: Dict[Tuple[str, str], ``TxReceipt``]
+        """
+        if gas_price is None:
+            gas_price = self.web3.eth.gas_price
+        nonce = self.web3.eth.get_transaction_count(self.account, "pending")
+        tx_hashes = {}
+        for token_address, spender in self.missing_approvals(amounts):
+            token = self.tokens[token_address]
+            tx = token.contract.functions.approve(
+                spender,
+                (
+                    MAX_UINT256
+                    if value is None
+                    else int(Decimal(value) * Decimal(10**token.decimals))
+                ),
+            ).build_transaction(
+                {"from": self.account, "nonce": nonce, "gasPrice": gas_price}
+            )
+            tx["gas"] = self.web3.eth.estimate_gas(tx) if gas is None else gas
+            signed_tx = self.web3.eth.account.sign_transaction(
+                tx, private_key=private_key
+            )
+            tx_hashes[(token_address, spender)] = self.web3.eth.send_raw_transaction(
+                signed_tx.rawTransaction
+            )
+            nonce += 1
+        receipts = {
+            key: self.web3.eth.wait_for_transaction_receipt(tx_hash)
+            for key, tx_hash in tx_hashes.items()
+        }
+        for (token_address, spender), receipt in receipts.items():
+            if receipt["status"] == 1:
+                self.allowances[(token_address, spender)] = (
+                    Decimal(MAX_UINT256)
+                    / Decimal(10 ** self.tokens[token_address].decimals)
+                    if value is None
+                    else Decimal(value)
+                )
+        return receipts
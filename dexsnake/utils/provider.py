@@ -0,0 +1,186 @@
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, List, Optional, Set
+
+import requests
+from web3.providers import JSONBaseProvider
+from web3.types import RPCEndpoint, RPCResponse
+
+WRITE_METHODS = {"eth_sendRawTransaction", "eth_sendTransaction"}
+
+
+class _Endpoint:
+    def __init__(self, uri: str, rate_limit: Optional[float]):
+        self.uri = uri
+        self.session = requests.Session()  # reuses keep-alive connections
+        self.latency = 0.1  # exponential moving average in seconds
+        self.rate_limit = rate_limit
+        # The bucket holds at least one token so that limits below one request per
+        # second can be met
+        self.capacity = max(1.0, rate_limit) if rate_limit is not None else 0.0
+        self.tokens = self.capacity
+        self.refilled_at = time.monotonic()
+        self.failures = 0
+        self.open_until = 0.0
+
+    def available_in(self, now: float) -> float:
+        # Seconds until the endpoint can take a request under its rate limit
+        if self.rate_limit is None:
+            return 0.0
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.refilled_at) * self.rate_limit
+        )
+        self.refilled_at = now
+        return max(0.0, (1 - self.tokens) / self.rate_limit)
+
+
+class LoadBalancedProvider(JSONBaseProvider):
+    def __init__(
+        self,
+        endpoint_uris: List[str],
+        write_endpoint_uri: Optional[str] = None,
+        rate_limit: Optional[float] = None,
+        hedge_after: Optional[float] = None,
+        failure_threshold: int = 3,
+        recovery_time: float = 30.0,
+        timeout: float = 10.0,
+    ):
+        """
+        Initializes a new instance of the ``LoadBalancedProvider`` class.
+
+        The provider spreads JSON-RPC requests over several HTTP endpoints and can be
+        used in place of ``Web3.HTTPProvider`` with every class in Dexsnake, e.g.,
+        ``Web3(LoadBalancedProvider([uri_1, uri_2]))``. Reads are sent to an endpoint
+        chosen at random with a probability inversely proportional to its recent
+        latency. Transactions are always sent to ``write_endpoint_uri`` so that their
+        nonces are seen in order by a single node. Every endpoint keeps a persistent
+        HTTP session, and an endpoint that fails ``failure_threshold`` times in a row is
+        not used for ``recovery_time`` seconds.
+
+        :param endpoint_uris: The URIs of the HTTP endpoints used for reads.
+        :type endpoint_uris: List[str]
+        :param write_endpoint_uri: The URI of the HTTP endpoint used for sending
+            transactions. If not provided, the first endpoint is used.
+        :type write_endpoint_uri: str, optional
+        :param rate_limit: The maximum number of requests per second per endpoint. If
+            not provided, requests are not rate limited.
+        :type rate_limit: float, optional
+        :param hedge_after: The number of seconds after which a read that has not
+            completed is also sent to a second endpoint, and the first response is
+            used. If not provided, requests are not hedged.
+        :type hedge_after: float, optional
+        :param failure_threshold: The number of consecutive failures after which an
+            endpoint is taken out of use.
+        :type failure_threshold: int, optional
+        :param recovery_time: The number of seconds after which a failed endpoint is
+            tried again.
+        :type recovery_time: float, optional
+        :param timeout: The timeout of each HTTP request in seconds.
+        :type timeout: float, optional
+        """
+        super().__init__()
+        if len(endpoint_uris) == 0:
+            raise ValueError("At least one endpoint URI must be provided")
+        self.endpoints: List[_Endpoint] = [
+            _Endpoint(uri, rate_limit) for uri in endpoint_uris
+        ]
+        if write_endpoint_uri is None:
+            self.write_endpoint: _Endpoint = self.endpoints[0]
+        else:
+            self.write_endpoint = next(
+                (e for e in self.endpoints if e.uri == write_endpoint_uri),
+                _Endpoint(write_endpoint_uri, rate_limit),
+            )
+        self.hedge_after: Optional[float] = hedge_after
+        self.failure_threshold: int = failure_threshold
+        self.recovery_time: float = recovery_time
+        self.timeout: float = timeout
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2 * len(self.endpoints) + 1)
+
+    def __str__(self) -> str:
+        return f"LoadBalancedProvider({[e.uri for e in self.endpoints]})"
+
+    def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        request_data = self.encode_rpc_request(method, params)
+        if method in WRITE_METHODS:
+            self._acquire(self.write_endpoint)
+            return self._post(self.write_endpoint, request_data)
+        endpoint = self._select()
+        future = self._executor.submit(self._post, endpoint, request_data)
+        futures = {future}
+        # Hedge a slow request, or retry a failed one, on another endpoint
+        done, _ = wait(futures, timeout=self.hedge_after)
+        if not done or future.exception() is not None:
+            other = self._select(exclude=endpoint)
+            if other is not None:
+                futures.add(self._executor.submit(self._post, other, request_data))
+        return self._first_result(futures)
+
+    def _first_result(self, futures: Set[Future]) -> RPCResponse:
+        error = None
+        while futures:
+            done, futures = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _select(self, exclude: Optional[_Endpoint] = None) -> Optional[_Endpoint]:
+        # Returns None if ``exclude`` is the only endpoint in use, so that a hedged
+        # request does not take a token from the endpoint that it is hedging
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                candidates = [e for e in self.endpoints if e.open_until <= now]
+                if not candidates:  # every endpoint has failed, try them all again
+                    candidates = self.endpoints
+                if exclude is not None:
+                    candidates = [e for e in candidates if e is not exclude]
+                    if not candidates:
+                        return None
+                waits = [e.available_in(now) for e in candidates]
+                ready = [e for e, w in zip(candidates, waits) if w == 0]
+                if ready:
+                    endpoint = random.choices(
+                        ready, weights=[1 / e.latency for e in ready]
+                    )[0]
+                    if endpoint.rate_limit is not None:
+                        endpoint.tokens -= 1
+                    return endpoint
+                delay = min(waits)
+            time.sleep(delay)
+
+    def _acquire(self, endpoint: _Endpoint) -> None:
+        while True:
+            with self._lock:
+                delay = endpoint.available_in(time.monotonic())
+                if delay == 0:
+                    if endpoint.rate_limit is not None:
+                        endpoint.tokens -= 1
+                    return
+            time.sleep(delay)
+
+    def _post(self, endpoint: _Endpoint, request_data: bytes) -> RPCResponse:
+        start = time.monotonic()
+        try:
+            response = endpoint.session.post(
+                endpoint.uri,
+                data=request_data,
+                headers={"Content-Type": "application/json"},
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+        except requests.RequestException:
+            with self._lock:
+                endpoint.failures += 1
+                if endpoint.failures >= self.failure_threshold:
+                    endpoint.open_until = time.monotonic() + self.recovery_time
+            raise
+        with self._lock:
+            endpoint.failures = 0
+            endpoint.latency = 0.8 * endpoint.latency + 0.2 * (time.monotonic() - start)
+        return self.decode_rpc_response(response.content)
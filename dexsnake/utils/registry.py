@@ -0,0 +1,57 @@
+import threading
+import weakref
+
+from web3 import Web3
+
+_lock = threading.RLock()
+_instances: "weakref.WeakKeyDictionary[Web3, weakref.WeakValueDictionary]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+class Shared(type):
+    """
+    Metaclass of classes with one instance per contract and ``Web3`` instance. Calling
+    the class, e.g., ``ERC20Token(web3, address)``, returns the existing instance for
+    the contract at ``address`` on the chain of ``web3`` or creates it. An instance is
+    created and initialized while holding the registry lock, so other threads never see
+    a partially initialized instance, and it is not registered if ``__init__`` raises.
+    The chain ID is read before the lock is taken, so that ``__init__`` makes no RPC
+    calls and constructing instances in one thread does not wait for the network in
+    another.
+    The instances are referenced weakly, so an instance is freed once it is no longer
+    used elsewhere.
+    """
+
+    def __call__(cls, web3: Web3, address: str):
+        address = web3.to_checksum_address(address)
+        get_chain_id(web3)
+        with _lock:
+            if web3 not in _instances:
+                _instances[web3] = weakref.WeakValueDictionary()
+            instances = _instances[web3]
+            instance = instances.get((cls, address))
+            if instance is None:
+                instance = super().__call__(web3, address)
+                instances[(cls, address)] = instance
+            return instance
+
+
+_chain_ids: "weakref.WeakKeyDictionary[Web3, int]" = weakref.WeakKeyDictionary()
+
+
+def get_chain_id(web3: Web3) -> int:
+    """
+    Returns the chain ID of ``web3``. The chain ID is read from the node only once per
+    ``Web3`` instance.
+
+    :param web3: A ``Web3`` instance connected to a blockchain node.
+    :type web3: ``Web3``
+
+    :return: The chain ID.
+    :rtype: int
+    """
+    chain_id = _chain_ids.get(web3)
+    if chain_id is None:
+        chain_id = _chain_ids[web3] = web3.eth.chain_id
+    return chain_id
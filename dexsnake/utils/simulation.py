@@ -0,0 +1,387 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import eth_abi
+from eth_abi.exceptions import DecodingError
+from eth_utils.abi import collapse_if_tuple
+from web3 import Web3
+from web3.contract.contract import ContractFunction
+from web3.exceptions import ContractLogicError
+from web3.types import BlockIdentifier
+
+from .erc20_token import ERC20Token
+from .registry import get_chain_id
+
+MAX_UINT256 = 2**256 - 1
+
+# The account from which swaps are simulated unless an account is given. Its state is
+# replaced in the simulations, so it does not need to exist.
+SIMULATION_ACCOUNT = Web3.to_checksum_address(
+    "0x000000000000000000000000000000000051a1a7"
+)
+
+# Runtime code installed at the simulating account. It calls the address in the first
+# 32 bytes of the calldata with the rest of the calldata, and returns whether the call
+# succeeded, the gas used by the call, and the data returned by the call:
+#
+#   CALLDATASIZE PUSH1 32 SWAP1 SUB DUP1 PUSH1 32 PUSH1 0 CALLDATACOPY
+#   GAS PUSH1 0 PUSH1 0 DUP4 PUSH1 0 PUSH1 0 PUSH1 0 CALLDATALOAD GAS CALL
+#   GAS SWAP1 PUSH1 0 MSTORE SWAP1 SUB PUSH1 32 MSTORE POP
+#   RETURNDATASIZE PUSH1 0 PUSH1 64 RETURNDATACOPY
+#   RETURNDATASIZE PUSH1 64 ADD PUSH1 0 RETURN
+GAS_METER_CODE = (
+    "0x36602090038060206000375a6000600083600060006000355af15a90600052900360"
+    "2052503d600060403e3d6040016000f3"
+)
+
+# Runtime code that makes a sequence of calls in order, so that each call sees the
+# state changes of the previous ones. The calldata is the address, the length of the
+# calldata, and the calldata of each call, and the returned data is whether each call
+# succeeded, the length of its returned data, and its returned data:
+#
+#   PUSH1 0 PUSH1 0
+#   loop: JUMPDEST CALLDATASIZE DUP3 LT PUSH1 body JUMPI DUP1 PUSH1 0 RETURN
+#   body: JUMPDEST PUSH1 32 DUP3 ADD CALLDATALOAD
+#   DUP1 PUSH1 64 DUP5 ADD PUSH1 64 DUP5 ADD CALLDATACOPY
+#   PUSH1 0 PUSH1 0 DUP3 PUSH1 64 DUP6 ADD PUSH1 0 DUP8 CALLDATALOAD GAS CALL
+#   DUP3 MSTORE RETURNDATASIZE PUSH1 32 DUP4 ADD MSTORE
+#   RETURNDATASIZE PUSH1 0 PUSH1 64 DUP5 ADD RETURNDATACOPY
+#   SWAP1 PUSH1 64 ADD RETURNDATASIZE ADD SWAP2 ADD PUSH1 64 ADD SWAP1
+#   PUSH1 loop JUMP
+SEQUENCE_CODE = (
+    "0x600060005b368210600f57806000f35b602082013580604084016040840137600060008260"
+    "408501600087355af182523d60208301523d6000604084013e906040013d0191016040019060"
+    "0456"
+)
+
+# Storage slots searched for the balance and allowance mappings of tokens
+N_SLOTS = 100
+_MARKER = 2**128
+
+_slots_lock = threading.Lock()
+_slots: Dict[Tuple[int, str], Tuple[Optional[Tuple[int, bool]], ...]] = {}
+
+
+@dataclass
+class SwapSimulation:
+    """
+    The result of simulating a swap with ``eth_call``.
+
+    :ivar success: Whether the swap succeeded.
+    :ivar amount_out: The amount of output tokens, or ``None`` if the swap reverted.
+    :ivar gas_used: The gas used by the swap, including the intrinsic gas of the
+        transaction. It is an estimate that may differ from the gas used by the sent
+        transaction by a few hundred gas.
+    :ivar error: The revert reason, or ``None`` if the swap succeeded.
+    """
+
+    success: bool
+    amount_out: Optional[Decimal]
+    gas_used: int
+    error: Optional[str]
+
+
+def _mapping_key(key: str, slot: int, vyper: bool) -> bytes:
+    # Solidity stores mapping values at keccak(key . slot) and Vyper at
+    # keccak(slot . key)
+    key_bytes = bytes.fromhex(key[2:]).rjust(32, b"\0")
+    slot_bytes = slot.to_bytes(32, "big")
+    return Web3.keccak(slot_bytes + key_bytes if vyper else key_bytes + slot_bytes)
+
+
+def _allowance_key(owner: str, spender: str, slot: int, vyper: bool) -> bytes:
+    inner = _mapping_key(owner, slot, vyper)
+    spender_bytes = bytes.fromhex(spender[2:]).rjust(32, b"\0")
+    return Web3.keccak(inner + spender_bytes if vyper else spender_bytes + inner)
+
+
+def _find_slot(token: ERC20Token, function: Any, key: Any, block_identifier) -> Any:
+    # Writes a different marker value into each candidate slot and reads the value
+    # back through the token contract to see which slot was used
+    state_diff = {}
+    for slot in range(N_SLOTS):
+        for vyper in (False, True):
+            value = _MARKER + 2 * slot + vyper
+            state_diff["0x" + key(slot, vyper).hex()] = (
+                "0x" + value.to_bytes(32, "big").hex()
+            )
+    try:
+        value = function.call(
+            block_identifier=block_identifier,
+            state_override={token.address: {"stateDiff": state_diff}},
+        )
+    except (ContractLogicError, DecodingError):
+        return None
+    if _MARKER <= value < _MARKER + 2 * N_SLOTS:
+        slot, vyper = divmod(value - _MARKER, 2)
+        return slot, bool(vyper)
+    return None
+
+
+def token_state_override(
+    token: ERC20Token,
+    owner: str,
+    balance: int,
+    spender: Optional[str] = None,
+    block_identifier: BlockIdentifier = "latest",
+) -> Dict[str, Any]:
+    """
+    Returns an ``eth_call`` state override that sets the balance of ``owner`` to
+    ``balance`` and, if ``spender`` is given, the allowance of ``spender`` to the
+    maximum amount. The storage slots of the balance and allowance mappings are found
+    on first use with one ``eth_call`` each and cached per chain and token. Tokens whose
+    balances are not stored in a Solidity or Vyper mapping in one of the first 100
+    storage slots are not overridden, i.e., the returned override is empty.
+
+    :param token: The token.
+    :type token: ``ERC20Token``
+    :param owner: The address of the owner.
+    :type owner: str
+    :param balance: The raw integer balance.
+    :type balance: int
+    :param spender: The address of the spender.
+    :type spender: str, optional
+    :param block_identifier: The block at which the storage slots are searched.
+    :type block_identifier: ``BlockIdentifier``, optional
+
+    :return: The state override keyed by token address.
+    :rtype: Dict[str, Any]
+    """
+    cache_key = (get_chain_id(token.web3), token.address)
+    with _slots_lock:
+        slots = _slots.get(cache_key)
+    if slots is None:
+        functions = token.contract.functions
+        slots = (
+            _find_slot(
+                token,
+                functions.balanceOf(SIMULATION_ACCOUNT),
+                lambda slot, vyper: _mapping_key(SIMULATION_ACCOUNT, slot, vyper),
+                block_identifier,
+            ),
+            _find_slot(
+                token,
+                functions.allowance(SIMULATION_ACCOUNT, SIMULATION_ACCOUNT),
+                lambda slot, vyper: _allowance_key(
+                    SIMULATION_ACCOUNT, SIMULATION_ACCOUNT, slot, vyper
+                ),
+                block_identifier,
+            ),
+        )
+        with _slots_lock:
+            _slots[cache_key] = slots
+    balance_slot, allowance_slot = slots
+    state_diff = {}
+    if balance_slot is not None:
+        key = _mapping_key(owner, *balance_slot)
+        state_diff["0x" + key.hex()] = "0x" + balance.to_bytes(32, "big").hex()
+    if spender is not None and allowance_slot is not None:
+        key = _allowance_key(owner, spender, *allowance_slot)
+        state_diff["0x" + key.hex()] = "0x" + MAX_UINT256.to_bytes(32, "big").hex()
+    return {token.address: {"stateDiff": state_diff}} if state_diff else {}
+
+
+def _intrinsic_gas(data: bytes) -> int:
+    return 21000 + sum(4 if byte == 0 else 16 for byte in data)
+
+
+def simulate_calls(
+    web3: Web3,
+    account: str,
+    calls: Sequence[Tuple[str, bytes, Dict[str, Any]]],
+    block_identifier: BlockIdentifier = "latest",
+    max_workers: int = 8,
+) -> List[Tuple[bool, int, bytes]]:
+    """
+    Executes calls from ``account`` with ``eth_call`` and measures the gas used by each
+    of them. Every call is executed on top of the same block independently of the
+    others, and the calls are sent concurrently. The code of ``account`` is replaced in
+    the simulations by a contract that makes the call and measures its gas usage.
+
+    :param web3: A ``Web3`` instance connected to a blockchain node.
+    :type web3: ``Web3``
+    :param account: The address from which the calls are made.
+    :type account: str
+    :param calls: The address called, the calldata, and the state override of each
+        call.
+    :type calls: Sequence[Tuple[str, bytes, Dict[str, Any]]]
+    :param block_identifier: The block on top of which the calls are executed.
+    :type block_identifier: ``BlockIdentifier``, optional
+    :param max_workers: The maximum number of concurrent ``eth_call`` requests.
+    :type max_workers: int, optional
+
+    :return: Whether each call succeeded, the gas it used including the intrinsic gas
+        of a transaction, and the data it returned.
+    :rtype: List[Tuple[bool, int, bytes]]
+    """
+    account = web3.to_checksum_address(account)
+    if block_identifier == "latest":
+        block_identifier = web3.eth.block_number
+
+    def simulate(call: Tuple[str, bytes, Dict[str, Any]]) -> Tuple[bool, int, bytes]:
+        to, data, state_override = call
+        state_override = dict(state_override)
+        state_override[account] = {
+            **state_override.get(account, {}),
+            "code": GAS_METER_CODE,
+        }
+        output = web3.eth.call(
+            {
+                "to": account,
+                "data": bytes.fromhex(to[2:]).rjust(32, b"\0") + data,
+            },
+            block_identifier,
+            state_override,
+        )
+        return (
+            int.from_bytes(output[0:32], "big") == 1,
+            int.from_bytes(output[32:64], "big") + _intrinsic_gas(data),
+            bytes(output[64:]),
+        )
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(simulate, calls))
+
+
+def simulate_sequence(
+    web3: Web3,
+    account: str,
+    calls: Sequence[Tuple[str, bytes]],
+    state_override: Optional[Dict[str, Any]] = None,
+    block_identifier: BlockIdentifier = "latest",
+) -> List[Tuple[bool, bytes]]:
+    """
+    Executes calls from ``account`` one after another in a single ``eth_call``, so that
+    each call is executed on top of the state changes of the previous ones, e.g., a
+    swap followed by a ``balanceOf`` call. A call that reverts does not stop the
+    sequence. The code of ``account`` is replaced in the simulation by a contract that
+    makes the calls.
+
+    :param web3: A ``Web3`` instance connected to a blockchain node.
+    :type web3: ``Web3``
+    :param account: The address from which the calls are made.
+    :type account: str
+    :param calls: The address called and the calldata of each call.
+    :type calls: Sequence[Tuple[str, bytes]]
+    :param state_override: The state override applied before the first call.
+    :type state_override: Dict[str, Any], optional
+    :param block_identifier: The block on top of which the calls are executed.
+    :type block_identifier: ``BlockIdentifier``, optional
+
+    :return: Whether each call succeeded and the data it returned.
+    :rtype: List[Tuple[bool, bytes]]
+    """
+    account = web3.to_checksum_address(account)
+    state_override = dict(state_override or {})
+    state_override[account] = {
+        **state_override.get(account, {}),
+        "code": SEQUENCE_CODE,
+    }
+    data = b"".join(
+        bytes.fromhex(to[2:]).rjust(32, b"\0")
+        + len(calldata).to_bytes(32, "big")
+        + calldata
+        for to, calldata in calls
+    )
+    output = bytes(
+        web3.eth.call({"to": account, "data": data}, block_identifier, state_override)
+    )
+    results = []
+    offset = 0
+    while offset < len(output):
+        size = int.from_bytes(output[offset + 32 : offset + 64], "big")
+        results.append(
+            (
+                int.from_bytes(output[offset : offset + 32], "big") == 1,
+                output[offset + 64 : offset + 64 + size],
+            )
+        )
+        offset += 64 + size
+    return results
+
+
+def revert_reason(data: bytes) -> str:
+    """
+    Returns the reason of a revert from the data returned by the reverted call.
+
+    :param data: The returned data.
+    :type data: bytes
+
+    :return: The message of an ``Error(string)`` revert, or the returned data as a hex
+        string.
+    :rtype: str
+    """
+    if data[:4] == bytes.fromhex("08c379a0"):
+        try:
+            return eth_abi.decode(["string"], data[4:])[0]
+        except DecodingError:
+            pass
+    return "0x" + data.hex()
+
+
+def simulate_swaps(
+    web3: Web3,
+    account: str,
+    swaps: Sequence[Tuple[ContractFunction, ERC20Token, int, ERC20Token]],
+    block_identifier: BlockIdentifier = "latest",
+    max_workers: int = 8,
+) -> List[SwapSimulation]:
+    """
+    Simulates router swaps from ``account`` with ``simulate_calls``. For each swap, the
+    balance of ``account`` is set to the input amount and the router is approved to
+    spend it using ``token_state_override``, so the account does not need to hold the
+    tokens.
+
+    :param web3: A ``Web3`` instance connected to a blockchain node.
+    :type web3: ``Web3``
+    :param account: The address from which the swaps are made.
+    :type account: str
+    :param swaps: The router function call, the input token, the raw integer input
+        amount, and the output token of each swap. The last output of the function must
+        be the output amount or a list of amounts that ends with it.
+    :type swaps: Sequence[Tuple[``ContractFunction``, ``ERC20Token``, int,
+        ``ERC20Token``]]
+    :param block_identifier: The block on top of which the swaps are executed.
+    :type block_identifier: ``BlockIdentifier``, optional
+    :param max_workers: The maximum number of concurrent ``eth_call`` requests.
+    :type max_workers: int, optional
+
+    :return: The results of the simulations.
+    :rtype: List[``SwapSimulation``]
+    """
+    account = web3.to_checksum_address(account)
+    if block_identifier == "latest":
+        block_identifier = web3.eth.block_number
+    calls = [
+        (
+            call.address,
+            bytes.fromhex(call._encode_transaction_data()[2:]),
+            token_state_override(
+                token_in, account, amount_in, call.address, block_identifier
+            ),
+        )
+        for call, token_in, amount_in, _ in swaps
+    ]
+    results = []
+    for (call, _, _, token_out), (success, gas_used, data) in zip(
+        swaps, simulate_calls(web3, account, calls, block_identifier, max_workers)
+    ):
+        if not success:
+            results.append(SwapSimulation(False, None, gas_used, revert_reason(data)))
+            continue
+        types = [collapse_if_tuple(output) for output in call.abi["outputs"]]
+        amount_out = eth_abi.decode(types, data)[-1]
+        if isinstance(amount_out, (list, tuple)):
+            amount_out = amount_out[-1]
+        results.append(
+            SwapSimulation(
+                True,
+                Decimal(amount_out) / Decimal(10**token_out.decimals),
+                gas_used,
+                None,
+            )
+        )
+    return results